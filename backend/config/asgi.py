@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, as it loads models
+from my_projects.realtime import NotificationStreamApp  # noqa: E402
+
+NOTIFICATION_STREAM_PATH = '/api/notifications/stream/'
+
+notification_stream = NotificationStreamApp()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == NOTIFICATION_STREAM_PATH:
+        await notification_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
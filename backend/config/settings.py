@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'my_projects.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -63,9 +65,32 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests, checked before reuse
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas: aliases that read-only API actions may read from (see
+# my_projects/db.py). With SQLite in WAL mode each one is simply another
+# connection to the same file, so reads stop queueing behind the one
+# connection that writes; point them at real replicas on other backends.
+for n in range(1, int(os.environ.get('DB_READ_REPLICAS', 1)) + 1):
+    DATABASES[f'replica{n}'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['my_projects.db.ReadWriteRouter']
+# After writing, a user reads from the primary for this long (replication lag)
+DATABASE_REPLICA_PIN_SECONDS = 10
+
+# Applied to every new SQLite connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',  # durable at checkpoints; safe from corruption in WAL mode
+    'cache_size': -64000,  # KiB, i.e. 64 MB
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,  # ms
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -105,12 +130,12 @@ AUTH_USER_MODEL = 'my_projects.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'my_projects.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'my_projects.pagination.StandardPagination',
     'PAGE_SIZE': 10
 }
 
@@ -136,4 +161,95 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # What web workers and run_jobs must see of each other's writes: API
+    # responses and their data versions, dashboard stats, who is listening to
+    # the notification stream. Files serve the processes of one host, point it
+    # at Redis or Memcached for several. Response caching is off, and run_jobs
+    # refuses to start, on a local-memory cache.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SHARED_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'my_projects_shared')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Tests get file-based caches of their own, see my_projects/test_runner.py
+TEST_RUNNER = 'my_projects.test_runner.IsolatedCacheRunner'
+
+# Per-user response cache for the GET routes listed (URL names). Entries are
+# versioned per user and bumped on writes the user can see, see signals.py.
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_ALIAS = 'shared'
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+RESPONSE_CACHE_ROUTES = ['project-list', 'team-list', 'user-profile', 'notification-unread-count']
+
+# Dashboard stats snapshot (seconds); invalidated on writes, see my_projects/signals.py
+DASHBOARD_STATS_CACHE_ALIAS = 'shared'
+DASHBOARD_STATS_CACHE_TIMEOUT = 60 * 5
+
+# Notification push stream (served by config/asgi.py). DatabaseBroadcast relays
+# events through the database to the clients of every process, run_jobs
+# workers included; InProcessBroadcast only reaches clients connected to the
+# process that publishes, so it suits a single process running no jobs.
+NOTIFICATIONS_BROADCAST_BACKEND = 'my_projects.realtime.DatabaseBroadcast'
+NOTIFICATIONS_BROADCAST_CACHE_ALIAS = 'shared'
+NOTIFICATIONS_BROADCAST_POLL_INTERVAL = 0.5
+NOTIFICATIONS_BROADCAST_RETENTION = 60
+NOTIFICATIONS_STREAM_HEARTBEAT = 15
+
+# Users resolved from JWTs, see my_projects/authentication.py. Set the alias
+# to a shared cache (e.g. Redis) to let processes reuse each other's lookups.
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TIMEOUT = 60
+AUTH_USER_CACHE_ALIAS = None
+
+# Resized profile images, see my_projects/images.py. Set the worker count to
+# 0 to process uploads inline after commit instead of in a thread pool.
+PROFILE_IMAGE_VARIANTS = {'small': 64, 'medium': 256}
+PROFILE_IMAGE_FORMAT = 'WEBP'
+PROFILE_IMAGE_QUALITY = 80
+PROFILE_IMAGE_WORKERS = 2
+
+# Background jobs (my_projects/jobs.py, run by `manage.py run_jobs`). A queue
+# is worked on by at most `concurrency` workers at a time.
+JOB_QUEUES = {
+    'default': {'concurrency': 4},
+    'notifications': {'concurrency': 2},
+    'activity': {'concurrency': 2},
+}
+JOB_LOCK_TIMEOUT = 300
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+
+# Notification retention, applied by `manage.py purge_notifications` (see
+# my_projects/retention.py). None disables a rule. Archived rows stay
+# readable at /api/notifications/?archived=true.
+NOTIFICATION_RETENTION = {
+    'read_max_age_days': 90,
+    'unread_max_age_days': 365,
+    'max_per_user': 1000,
+    'archive': True,
+}
+
+# Activity feeds (my_projects/activity.py): entries kept per user at most
+ACTIVITY_FEED_MAX_PER_USER = 500
+
+# Per-endpoint request metrics, scraped from /metrics (see my_projects/metrics.py)
+# with "Authorization: Bearer <METRICS_TOKEN>"; without a token nobody can
+# scrape them. Behind a reverse proxy every client shares its address, so the
+# address is never enough. Requests over either budget are logged with their
+# SQL; None disables a budget.
+METRICS_ENABLED = True
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_QUERY_BUDGET = 50
+METRICS_LATENCY_BUDGET = 1.0
+
+# Serve the dashboard stats, notification list and unread count from the
+# async views under ASGI (see my_projects/async_views.py)
+ASYNC_API_VIEWS = True
@@ -0,0 +1,143 @@
+"""
+Per-user activity feeds, materialized on write.
+
+Changes to projects, tasks, comments and teams are recorded with
+``record()``, which only queues a job, or ``record_many()`` for the bulk
+task updates and imports, which bypass the model signals. A ``run_jobs`` worker copies each
+event to every affected user: the users named by the event plus, resolved
+at that point, the members of its team or the assignees of its project's
+tasks. Events are written in batches and each user keeps at most
+``ACTIVITY_FEED_MAX_PER_USER`` entries, the oldest being dropped.
+
+``/api/activity/`` then reads a user's feed with one range scan on
+``(user, -created_at, -id)``, without touching the tables the events came
+from.
+"""
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .jobs import enqueue, enqueue_many, handler
+from .models import User, Task, Team, ActivityEntry
+from .response_cache import bump
+
+ACTIVITY_BATCH_SIZE = 500
+DEFAULT_MAX_PER_USER = 500
+SUMMARY_LENGTH = ActivityEntry._meta.get_field('summary').max_length
+
+
+def event(verb, target_type, target_id, summary, user_ids=(), actor_id=None, team_id=None, project_id=None):
+    """The job payload of an event, see ``record()``."""
+    return {
+        'verb': verb,
+        'target_type': target_type,
+        'target_id': target_id,
+        'summary': summary[:SUMMARY_LENGTH],
+        'actor_id': actor_id,
+        'created_at': timezone.now().isoformat(),
+        'user_ids': sorted({user_id for user_id in user_ids if user_id is not None}),
+        'team_id': team_id,
+        'project_id': project_id,
+    }
+
+
+def record(verb, target_type, target_id, summary, user_ids=(), actor_id=None, team_id=None, project_id=None):
+    """
+    Queue an event for the feeds of ``user_ids``, of the members of
+    ``team_id`` and of the assignees of ``project_id``'s tasks.
+    """
+    enqueue('activity.fan_out', event(
+        verb, target_type, target_id, summary, user_ids, actor_id=actor_id, team_id=team_id, project_id=project_id
+    ))
+
+
+def record_many(events):
+    """Queue the ``event()`` payloads ``events`` at once, for the writes that bypass the signals."""
+    enqueue_many('activity.fan_out', events)
+
+
+def task_verb(old, new):
+    """The verb of a change to a task, from its ``status`` and ``assigned_to_id`` before (if known) and after."""
+    if old is not None and old['status'] != new['status'] and new['status'] == 'completed':
+        return 'completed'
+    if old is not None and old['assigned_to_id'] != new['assigned_to_id']:
+        return 'assigned'
+    return 'updated'
+
+
+def max_per_user():
+    return getattr(settings, 'ACTIVITY_FEED_MAX_PER_USER', DEFAULT_MAX_PER_USER)
+
+
+def recipients(payloads):
+    """The users each event goes to, in the order of ``payloads``."""
+    team_ids = {payload['team_id'] for payload in payloads if payload['team_id'] is not None}
+    project_ids = {payload['project_id'] for payload in payloads if payload['project_id'] is not None}
+    members = {}
+    for team_id, user_id in Team.members.through.objects.filter(team_id__in=team_ids).values_list(
+        'team_id', 'user_id'
+    ):
+        members.setdefault(team_id, set()).add(user_id)
+    assignees = {}
+    for project_id, user_id in Task.objects.filter(project_id__in=project_ids).order_by().values_list(
+        'project_id', 'assigned_to_id'
+    ).distinct():
+        assignees.setdefault(project_id, set()).add(user_id)
+
+    users = [
+        set(payload['user_ids']) |
+        members.get(payload['team_id'], set()) |
+        assignees.get(payload['project_id'], set())
+        for payload in payloads
+    ]
+    # Users deleted since the job was queued are skipped
+    existing = set(User.objects.filter(pk__in=set().union(*users)).values_list('pk', flat=True))
+    return [user_ids & existing for user_ids in users]
+
+
+@handler('activity.fan_out', queue='activity', batch=True)
+def fan_out(payloads):
+    entries = []
+    for payload, user_ids in zip(payloads, recipients(payloads)):
+        created_at = parse_datetime(payload['created_at'])
+        # Actors are among the recipients of their events, unless deleted since
+        actor_id = payload['actor_id'] if payload['actor_id'] in user_ids else None
+        entries.extend(
+            ActivityEntry(
+                user_id=user_id, actor_id=actor_id, verb=payload['verb'],
+                target_type=payload['target_type'], target_id=payload['target_id'],
+                summary=payload['summary'], created_at=created_at,
+            )
+            for user_id in sorted(user_ids)
+        )
+    ActivityEntry.objects.bulk_create(entries, batch_size=ACTIVITY_BATCH_SIZE)
+    user_ids = {entry.user_id for entry in entries}
+    trim(user_ids)
+    bump(*user_ids)
+
+
+def trim(user_ids, keep=None):
+    """Drop the entries of ``user_ids`` past the newest ``keep``; returns how many went."""
+    keep = max_per_user() if keep is None else keep
+    if keep is None or not user_ids:
+        return 0
+    user_ids = sorted(user_ids)
+    crowded = []
+    for start in range(0, len(user_ids), ACTIVITY_BATCH_SIZE):
+        crowded.extend(
+            ActivityEntry.objects.filter(user_id__in=user_ids[start:start + ACTIVITY_BATCH_SIZE])
+            .order_by().values('user_id').annotate(total=Count('id')).filter(total__gt=keep)
+            .values_list('user_id', flat=True)
+        )
+    removed = 0
+    for user_id in crowded:
+        # The newest entry past the cap: it and everything older goes
+        boundary = ActivityEntry.objects.filter(user_id=user_id).order_by('-created_at', '-id').values(
+            'created_at', 'id'
+        )[keep]
+        removed += (
+            ActivityEntry.objects.filter(user_id=user_id, created_at__lt=boundary['created_at']) |
+            ActivityEntry.objects.filter(user_id=user_id, created_at=boundary['created_at'], id__lte=boundary['id'])
+        ).delete()[0]
+    return removed
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Project, Task, Comment, Team, Notification
+from .models import User, Project, Task, Comment, Team, Notification, ArchivedNotification, ActivityEntry, Job
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -54,3 +54,24 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter = ('read', 'user')
     search_fields = ('message',)
     date_hierarchy = 'created_at'
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'message', 'read', 'timestamp', 'archived_at')
+    list_filter = ('read',)
+    search_fields = ('message',)
+    date_hierarchy = 'timestamp'
+
+@admin.register(ActivityEntry)
+class ActivityEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'verb', 'target_type', 'target_id', 'summary', 'created_at')
+    list_filter = ('verb', 'target_type')
+    search_fields = ('summary',)
+    raw_id_fields = ('user', 'actor')
+    date_hierarchy = 'created_at'
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'queue', 'status', 'attempts', 'run_at', 'locked_by')
+    list_filter = ('queue', 'status', 'kind')
+    readonly_fields = ('created_at', 'updated_at')
@@ -0,0 +1,116 @@
+"""
+Async handlers for the hottest read endpoints.
+
+DRF views are synchronous, so under ASGI each request holds a thread for
+its whole duration. The handlers here serve ``GET`` on the dashboard stats,
+the notification list and the unread count with the async ORM instead,
+waiting on the database without holding a thread; ``dashboard_stats`` runs
+its queries concurrently.
+
+Each one sits in front of the router's route of the same name (see
+``urls.py``) and hands everything it does not serve (other methods,
+``?expand=``, ``?archived=``, dotted ``?fields=``, format suffixes) to that
+sync view, so the API is unchanged. ``ASYNC_API_VIEWS = False`` sends every request there.
+"""
+import logging
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from .authentication import CachedJWTAuthentication
+from .db import achoose_replica, routing
+from .models import Notification
+from .renderers import render_json
+from .stats import aget_dashboard_stats
+from .views import NotificationViewSet
+
+logger = logging.getLogger(__name__)
+
+
+async def authenticate(request):
+    # APIClient.force_authenticate(), honoured as DRF's Request does
+    forced = getattr(request, '_force_auth_user', None)
+    if forced is not None:
+        return forced
+    result = await CachedJWTAuthentication().aauthenticate(request)
+    if result is None:
+        raise NotAuthenticated()
+    return result[0]
+
+
+def async_get(fallback, supports=None):
+    """
+    Serve authenticated ``GET`` requests with the decorated handler and any
+    other request with the sync view ``fallback``.
+    """
+    def decorator(handler):
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if (
+                request.method != 'GET' or not getattr(settings, 'ASYNC_API_VIEWS', True) or
+                (supports is not None and not supports(request))
+            ):
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+            try:
+                user = await authenticate(request)
+                with routing(await achoose_replica(user)):
+                    return await handler(request, user)
+            except APIException as exc:
+                response = exception_handler(exc, {'request': request})
+                if response.status_code == status.HTTP_401_UNAUTHORIZED:
+                    response['WWW-Authenticate'] = CachedJWTAuthentication().authenticate_header(request)
+                return render_json(response)
+
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+def dashboard_stats(fallback):
+    @async_get(fallback)
+    async def view(request, user):
+        try:
+            return render_json(Response(await aget_dashboard_stats(user)))
+        except Exception as e:
+            logger.exception("Error in dashboard_stats for user %s", user.id)
+            return render_json(Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR))
+    return view
+
+
+def notification_list(fallback):
+    def supports(request):
+        # Expanded relations need the serializers; archives are rare
+        return not ({'expand', 'archived'} & request.GET.keys())
+
+    @async_get(fallback, supports)
+    async def view(request, user):
+        drf_request = Request(request)
+        drf_request.user = user
+        viewset = NotificationViewSet(request=drf_request, action='list', args=(), kwargs={}, format_kwarg=None)
+        plan = viewset.get_fast_plan()
+        if plan is None:
+            # E.g. dotted ?fields=, which expand relations too
+            return await sync_to_async(fallback)(request)
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+
+        etag, last_modified = await viewset.aget_validators(queryset)
+        response = viewset.not_modified(request, etag, last_modified)
+        if response is None:
+            rows = plan.values(queryset, *viewset.pagination_columns())
+            page = await viewset.paginator.apaginate_queryset(rows, drf_request, view=viewset)
+            response = render_json(viewset.paginator.get_paginated_response(plan.render_many(page)))
+        return viewset.add_validators(response, etag, last_modified)
+    return view
+
+
+def unread_count(fallback):
+    @async_get(fallback)
+    async def view(request, user):
+        return render_json(Response({'count': await Notification.objects.filter(user=user, read=False).acount()}))
+    return view
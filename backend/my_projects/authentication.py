@@ -0,0 +1,160 @@
+"""
+JWT authentication that resolves the token's user from a cache.
+
+``JWTAuthentication`` loads the user row on every request. Here users are
+kept in a bounded in-process LRU and, when ``AUTH_USER_CACHE_ALIAS`` names a
+Django cache, in that shared tier behind it. Entries are dropped when the
+user is saved or deleted (see ``signals.py``); the LRU timeout bounds how
+long another process can serve a user changed elsewhere.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+class UserCache:
+    """Thread-safe LRU of user instances with an optional shared cache tier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.reset_stats()
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024)
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+
+    @property
+    def shared(self):
+        alias = getattr(settings, 'AUTH_USER_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    def key(self, user_id):
+        return f'auth_user:{user_id}'
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return copy.copy(entry[0])
+
+        shared = self.shared
+        user = shared.get(self.key(user_id)) if shared is not None else None
+        with self._lock:
+            if user is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self._store(user_id, user)
+        return copy.copy(user)
+
+    def set(self, user_id, user):
+        self._store(user_id, user)
+        shared = self.shared
+        if shared is not None:
+            shared.set(self.key(user_id), user, self.timeout)
+
+    def _store(self, user_id, user):
+        with self._lock:
+            self._entries[user_id] = (copy.copy(user), time.monotonic() + self.timeout)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                if self._entries.pop(user_id, None) is not None:
+                    self.invalidations += 1
+        shared = self.shared
+        if shared is not None:
+            shared.delete_many([self.key(user_id) for user_id in user_ids])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset_stats(self):
+        self.hits = self.shared_hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if lookups else None,
+            }
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """Drop-in replacement for ``JWTAuthentication`` backed by ``user_cache``."""
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            # Raises for unknown or inactive users, which are never cached
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+            return user
+        return self.check_cached_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        """``authenticate()`` for async views: only a cache miss leaves the event loop."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        user = user_cache.get(self.get_user_id(validated_token))
+        if user is None:
+            user = await sync_to_async(self.get_user)(validated_token)
+        else:
+            user = self.check_cached_user(user, validated_token)
+        return user, validated_token
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def check_cached_user(self, user, validated_token):
+        # The token-specific checks still run against the cached user
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False) and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
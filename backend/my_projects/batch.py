@@ -0,0 +1,166 @@
+"""
+``POST /api/batch/``: several API requests in one.
+
+The body lists sub-requests, ``{"requests": [{"method": "GET", "path":
+"/api/projects/?page=2"}, {"method": "PATCH", "path": "/api/tasks/3/",
+"body": {...}}]}``, and the response holds one ``{"status": ..., "body":
+...}`` per sub-request, in the same order. Each one is resolved against
+``my_projects/urls.py`` and handled by the same view as on its own, but
+without the middleware and without authenticating again: the batch's
+user is handed to every view.
+
+Consecutive reads run concurrently, each sync view in a worker thread with
+its own connection (one after the other inside a transaction, where they
+must share its connection). A write waits for what comes before it and
+holds back what comes after.
+"""
+import asyncio
+import json
+import logging
+from functools import partial
+from io import BytesIO
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import Resolver404, resolve, reverse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, ParseError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.views import exception_handler
+
+from .authentication import CachedJWTAuthentication
+from .db import in_transaction, in_worker
+from .renderers import render_json
+from .response_cache import authenticated
+from .serializers import BatchSerializer
+
+logger = logging.getLogger(__name__)
+
+URLCONF = 'my_projects.urls'
+# Headers of the batch request that are not passed on: conditional headers
+# and the body's metadata belong to the batch itself
+SKIPPED_HEADERS = ('HTTP_IF_', 'HTTP_CONTENT_')
+
+
+def error(status_code, detail):
+    return {'status': status_code, 'body': {'detail': detail}}
+
+
+def sub_request(request, item):
+    """A request for ``item`` carrying the batch request's client headers and user."""
+    path, _, query = item['path'].partition('?')
+    body = json.dumps(item['body']).encode() if 'body' in item else b''
+    environ = {
+        name: value for name, value in request.META.items()
+        if name.startswith('HTTP_') and not name.startswith(SKIPPED_HEADERS)
+    }
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        # JSON unless the path asks for a format (?format=)
+        'HTTP_ACCEPT': 'application/json, */*',
+        'REMOTE_ADDR': request.META.get('REMOTE_ADDR', ''),
+        'SERVER_NAME': request.META.get('SERVER_NAME', 'localhost'),
+        'SERVER_PORT': request.META.get('SERVER_PORT', '80'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.url_scheme': request.scheme,
+    })
+    sub = WSGIRequest(environ)
+    sub._force_auth_user = request._force_auth_user
+    sub._force_auth_token = getattr(request, '_force_auth_token', None)
+    return sub
+
+
+def result(response):
+    if response.streaming:
+        if hasattr(response, 'close'):
+            response.close()
+        return error(status.HTTP_400_BAD_REQUEST, 'Streamed responses (exports) cannot be batched.')
+    if hasattr(response, 'data'):
+        # DRF responses, before rendering
+        return {'status': response.status_code, 'body': response.data}
+    if not response.content:
+        return {'status': response.status_code, 'body': None}
+    try:
+        body = json.loads(response.content)
+    except ValueError:
+        body = response.content.decode(response.charset, 'replace')
+    return {'status': response.status_code, 'body': body}
+
+
+async def dispatch(request, item, concurrent):
+    prefix = reverse('api-root')
+    path = item['path'].partition('?')[0]
+    if not path.startswith(prefix):
+        return error(status.HTTP_404_NOT_FOUND, f'Only paths under {prefix} can be batched.')
+    try:
+        match = resolve('/' + path[len(prefix):], urlconf=URLCONF)
+    except Resolver404:
+        return error(status.HTTP_404_NOT_FOUND, 'Not found.')
+    if match.url_name == 'batch':
+        return error(status.HTTP_400_BAD_REQUEST, 'Batches cannot be nested.')
+
+    sub = sub_request(request, item)
+    sub.resolver_match = match
+    view = partial(match.func, sub, *match.args, **match.kwargs)
+    try:
+        if iscoroutinefunction(match.func):
+            response = await view()
+        elif concurrent:
+            response = await sync_to_async(in_worker, thread_sensitive=False)(view)
+        else:
+            response = await sync_to_async(view)()
+    except Exception:
+        logger.exception('Batched request %s %s failed', item['method'], item['path'])
+        return error(status.HTTP_500_INTERNAL_SERVER_ERROR, 'Server error.')
+    return result(response)
+
+
+async def run(request, items):
+    """The results of ``items``, reads gathered, writes one at a time."""
+    concurrent = not await sync_to_async(in_transaction)()
+    results = []
+    reads = []
+    for item in items:
+        if item['method'] in SAFE_METHODS:
+            reads.append(item)
+            continue
+        results += await asyncio.gather(*(dispatch(request, read, concurrent) for read in reads))
+        reads = []
+        results.append(await dispatch(request, item, concurrent))
+    results += await asyncio.gather(*(dispatch(request, read, concurrent) for read in reads))
+    return results
+
+
+async def batch(request):
+    try:
+        if request.method != 'POST':
+            return render_json(Response(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED, headers={'Allow': 'POST'},
+            ))
+        if getattr(request, '_force_auth_user', None) is None:
+            # Once for the whole batch; the user is handed on to each view
+            if authenticated(request, await CachedJWTAuthentication().aauthenticate(request)) is None:
+                raise NotAuthenticated()
+        try:
+            data = json.loads(request.body or b'null')
+        except ValueError as e:
+            raise ParseError(f'JSON parse error - {e}')
+        serializer = BatchSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        results = await run(request, serializer.validated_data['requests'])
+        return render_json(Response({'responses': results}))
+    except APIException as exc:
+        response = exception_handler(exc, {'request': request})
+        if response.status_code == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = CachedJWTAuthentication().authenticate_header(request)
+        return render_json(response)
+
+
+batch.csrf_exempt = True
@@ -0,0 +1,93 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .serializers import requested_shape
+
+
+class ConditionalGetMixin:
+    """
+    ETag / Last-Modified support for ``list`` and ``retrieve``.
+
+    The validator is the newest ``updated_at`` across ``validator_fields``
+    (by default the row itself plus every relation the requested shape
+    embeds, as derived from the serializer) and the row count of the scoped
+    queryset, read with one aggregate query. When the
+    client's ``If-None-Match`` or ``If-Modified-Since`` still matches, a 304
+    is returned before anything is fetched or serialized.
+
+    Lists carry no ``Last-Modified``: deleting a row changes a list without
+    moving any timestamp on, so only the ETag, which counts the rows, can
+    validate one.
+    """
+    # None: DynamicFieldsMixin.timestamp_lookups() of the serializer
+    validator_fields = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(queryset, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        return self.conditional_response(queryset, super().retrieve, request, *args, **kwargs)
+
+    def get_validators(self, queryset):
+        return self.make_validators(queryset.order_by().aggregate(**self.validator_aggregates()))
+
+    async def aget_validators(self, queryset):
+        return self.make_validators(await queryset.order_by().aaggregate(**self.validator_aggregates()))
+
+    def get_validator_fields(self):
+        if self.validator_fields is not None:
+            return self.validator_fields
+        serializer_class = self.get_serializer_class()
+        if not hasattr(serializer_class, 'timestamp_lookups'):
+            return ('updated_at',)
+        return serializer_class.timestamp_lookups(serializer_class.Meta.model, *requested_shape(self.request))
+
+    def validator_aggregates(self):
+        aggregates = {f'field_{i}': Max(field) for i, field in enumerate(self.get_validator_fields())}
+        aggregates['row_count'] = Count('pk', distinct=True)
+        return aggregates
+
+    def make_validators(self, values):
+        row_count = values.pop('row_count')
+        timestamps = [value for value in values.values() if value is not None]
+        last_modified = max(timestamps) if timestamps else None
+
+        key = '|'.join([
+            self.request.get_full_path(),
+            str(self.request.user.pk),
+            str(row_count),
+            last_modified.isoformat() if last_modified else '',
+        ])
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        if self.action == 'list':
+            last_modified = None
+        return etag, last_modified
+
+    def conditional_response(self, queryset, render, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(queryset)
+        response = self.not_modified(request, etag, last_modified)
+        if response is None:
+            response = render(request, *args, **kwargs)
+        return self.add_validators(response, etag, last_modified)
+
+    def not_modified(self, request, etag, last_modified):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    def add_validators(self, response, etag, last_modified):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(int(last_modified.timestamp()))
+            # Revalidate on every use; the payload is private to the user
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Authorization',))
+        return response
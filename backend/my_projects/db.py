@@ -0,0 +1,164 @@
+"""
+Database layer: SQLite connection tuning and read/write routing.
+
+Every new SQLite connection gets ``SQLITE_PRAGMAS`` (WAL journal, relaxed
+``synchronous``, bigger page cache, memory-mapped I/O, a busy timeout), see
+``configure_connection``. In WAL mode readers no longer wait for the writer,
+so read traffic can be spread over more connections.
+
+``ReadWriteRouter`` sends every write to ``default``. Reads go to ``default``
+too, except inside a read-only viewset action (``ReplicaReadMixin``), where
+they go to one of ``DATABASE_REPLICAS``. A request reads from the primary
+again as soon as it has written, and so does the writing user for
+``DATABASE_REPLICA_PIN_SECONDS`` afterwards, so nobody reads a replica that
+has not caught up with their own write yet.
+"""
+import asyncio
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from rest_framework.permissions import SAFE_METHODS
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+}
+
+
+def sqlite_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_PRAGMAS)
+
+
+def configure_connection(connection):
+    """Apply ``SQLITE_PRAGMAS`` to a freshly opened SQLite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+@dataclass
+class Routing:
+    """How the current request reads: from ``replica``, unless it has ``wrote``."""
+    replica: str = None
+    wrote: bool = False
+
+
+_routing = ContextVar('db_routing', default=None)
+
+
+@contextmanager
+def routing(replica=None):
+    """Route the reads of the enclosed block to ``replica``; yields the Routing state."""
+    state = Routing(replica)
+    token = _routing.set(state)
+    try:
+        yield state
+    finally:
+        _routing.reset(token)
+
+
+def pin_key(user_id):
+    return f'db_pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    seconds = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10)
+    if seconds:
+        cache.set(pin_key(user_id), True, seconds)
+
+
+def choose_replica(user):
+    """The replica a read-only request of ``user`` reads from, if any."""
+    available = replicas()
+    if not available or (user.is_authenticated and cache.get(pin_key(user.pk)) is not None):
+        return None
+    return random.choice(available)
+
+
+async def achoose_replica(user):
+    available = replicas()
+    if not available or (user.is_authenticated and await cache.aget(pin_key(user.pk)) is not None):
+        return None
+    return random.choice(available)
+
+
+def in_transaction():
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def in_worker(func, *args):
+    """Call ``func`` in a worker thread of ``sync_to_async(thread_sensitive=False)``."""
+    # Worker threads keep their connections between calls; drop the ones
+    # past CONN_MAX_AGE or broken, as Django does at each request
+    close_old_connections()
+    return func(*args)
+
+
+async def run_concurrently(*calls):
+    """
+    Run the ``(func, *args)`` calls at once, each in a worker thread with its
+    own database connection, and return their results in order. Inside a
+    transaction they run one after the other on its connection instead, so
+    they see its writes.
+    """
+    if await sync_to_async(in_transaction)():
+        return [await sync_to_async(func)(*args) for func, *args in calls]
+    return await asyncio.gather(*(
+        sync_to_async(in_worker, thread_sensitive=False)(func, *args) for func, *args in calls
+    ))
+
+
+class ReadWriteRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.replica is None or state.wrote:
+            return None
+        if in_transaction():
+            # Reads in a transaction must see its own writes
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in replicas() else None
+
+
+class ReplicaReadMixin:
+    """
+    Serve read-only (safe method) actions from a replica, unless the user
+    wrote recently. A user who writes is pinned to the primary for a while.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with routing() as state:
+            response = super().dispatch(request, *args, **kwargs)
+        if state.wrote and self.request.user.is_authenticated:
+            pin_to_primary(self.request.user.pk)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            _routing.get().replica = choose_replica(request.user)
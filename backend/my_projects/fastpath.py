@@ -0,0 +1,165 @@
+"""
+Read-only serialization straight from ``QuerySet.values()``.
+
+``compile_plan()`` inspects a configured ModelSerializer once and turns every
+field into a ``(key, column, converter)`` triple. Rendering a row is then a
+single dict comprehension over those triples, with no model instances and no
+per-field ``get_attribute``/``to_representation`` dispatch. The output is the
+same JSON the serializer produces; serializers with nested or computed
+fields are not compiled and callers fall back to the regular path.
+"""
+from datetime import timezone as dt_timezone
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from .pagination import KeysetPagination
+
+# DRF fields whose to_representation() is the identity for values read
+# from the matching model column
+IDENTITY_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class NotCompilable(Exception):
+    pass
+
+
+def is_utc(tz):
+    return tz is dt_timezone.utc or getattr(tz, 'key', getattr(tz, 'zone', None)) in ('UTC', 'Etc/UTC')
+
+
+def datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    enforce_timezone = field.enforce_timezone
+    output_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    utc_output = is_utc(output_timezone)
+
+    def convert(value):
+        # Aware UTC values, as the database backends return them, need no conversion
+        if utc_output and value.tzinfo is dt_timezone.utc:
+            return value.isoformat()[:-6] + 'Z'
+        value = enforce_timezone(value).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def date_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    return lambda value: value.isoformat()
+
+
+def field_plan(model, name, field):
+    if isinstance(field, (serializers.BaseSerializer, serializers.ManyRelatedField)) or '.' in field.source:
+        raise NotCompilable(name)
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        raise NotCompilable(name)
+    if model_field.many_to_many or model_field.one_to_many or model_field.one_to_one and not model_field.concrete:
+        raise NotCompilable(name)
+
+    if isinstance(field, serializers.DateTimeField):
+        converter = datetime_converter(field)
+    elif isinstance(field, serializers.DateField):
+        converter = date_converter(field)
+    elif isinstance(field, IDENTITY_FIELDS):
+        converter = None
+    else:
+        converter = field.to_representation
+    return name, model_field.attname, converter
+
+
+class CompiledPlan:
+    def __init__(self, steps):
+        self.steps = tuple(steps)
+        self.columns = tuple(dict.fromkeys(column for _, column, _ in self.steps))
+
+    def render(self, row):
+        data = {}
+        for key, column, converter in self.steps:
+            value = row[column]
+            data[key] = converter(value) if converter is not None and value is not None else value
+        return data
+
+    def render_many(self, rows):
+        render = self.render
+        return [render(row) for row in rows]
+
+    def values(self, queryset, *extra):
+        # Joins and prefetches set up for instance serialization are not needed
+        return queryset.select_related(None).prefetch_related(None).values(*self.columns, *extra)
+
+
+def compile_plan(serializer, flat_only=False):
+    """
+    Compile a configured serializer instance, or return None when it cannot
+    be. With ``flat_only`` fields that cannot be read from a column (nested
+    serializers, computed values) are left out instead.
+    """
+    model = serializer.Meta.model
+    steps = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        try:
+            steps.append(field_plan(model, name, field))
+        except NotCompilable:
+            if not flat_only:
+                return None
+    return CompiledPlan(steps)
+
+
+class FastReadMixin:
+    """
+    Serve ``list`` and ``retrieve`` from ``values()`` rows when the requested
+    shape is flat. Requests with ``?expand=`` use the regular serializers.
+    """
+
+    def get_fast_plan(self):
+        if self.request.query_params.get('expand'):
+            return None
+        return compile_plan(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_fast_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = plan.values(self.filter_queryset(self.get_queryset()), *self.pagination_columns())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.render_many(page))
+        return Response(plan.render_many(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        plan = self.get_fast_plan()
+        if plan is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        # Object permissions are not consulted: these viewsets scope access
+        # through get_queryset() alone
+        row = get_object_or_404(
+            plan.values(self.filter_queryset(self.get_queryset())),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        return Response(plan.render(row))
+
+    def pagination_columns(self):
+        # Keyset pagination reads the cursor key from each row
+        return ('id', getattr(self, 'cursor_ordering_field', KeysetPagination.ordering_field))
@@ -0,0 +1,151 @@
+"""
+Resized variants of ``User.profile_image``.
+
+Uploads are processed after the saving transaction commits, in a small
+thread pool (Pillow releases the GIL while decoding, resizing and encoding),
+so the request that uploaded the image never waits for it. Each variant is a
+square crop written next to the original under ``MEDIA_ROOT``; the paths are
+recorded in ``User.profile_image_variants`` together with the name of the
+source image they were made from.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .authentication import user_cache
+from .models import Task, Team, User
+from .response_cache import bump
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'profile_images/variants'
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def variant_sizes():
+    return getattr(settings, 'PROFILE_IMAGE_VARIANTS', {'small': 64, 'medium': 256})
+
+
+def variant_format():
+    return getattr(settings, 'PROFILE_IMAGE_FORMAT', 'WEBP').upper()
+
+
+def is_current(user):
+    """Whether the recorded variants were made from the user's current image."""
+    variants = user.profile_image_variants or {}
+    return variants.get('source') == (user.profile_image.name or None)
+
+
+def render_variant(image, size, image_format):
+    variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    if image_format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(buffer, image_format, quality=getattr(settings, 'PROFILE_IMAGE_QUALITY', 80))
+    return buffer.getvalue()
+
+
+def process_profile_image(user_id):
+    """Write the variants of a user's current profile image and record them."""
+    user = User.objects.filter(pk=user_id).only('profile_image', 'profile_image_variants').first()
+    if user is None or is_current(user):
+        return
+    source = user.profile_image.name or None
+    stale = [path for name, path in (user.profile_image_variants or {}).items() if name != 'source']
+
+    variants = {'source': source}
+    if source:
+        image_format = variant_format()
+        stem = os.path.splitext(os.path.basename(source))[0]
+        with default_storage.open(source, 'rb') as file:
+            image = ImageOps.exif_transpose(Image.open(file))
+            image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for name, size in variant_sizes().items():
+            path = f'{VARIANTS_DIR}/{stem}_{size}.{EXTENSIONS[image_format]}'
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variants[name] = default_storage.save(path, ContentFile(render_variant(image, size, image_format)))
+
+    # Only record the result if the image was not replaced in the meantime.
+    # update() skips User signals, so drop the cached copy and move the data
+    # versions on by hand.
+    updated = User.objects.filter(pk=user_id, profile_image=user.profile_image.name).update(
+        profile_image_variants=variants, updated_at=timezone.now()
+    )
+    if updated:
+        user_cache.invalidate(user_id)
+        bump_viewers(user_id)
+        Team.objects.filter(members=user_id).touch()
+        for path in set(stale) - set(variants.values()):
+            default_storage.delete(path)
+
+
+def bump_viewers(user_id):
+    """Bump the user and everyone who sees them: teammates, team creators and the owners of their tasks' projects."""
+    teams = Team.objects.filter(members=user_id).values('id')
+    bump(
+        user_id,
+        *Team.members.through.objects.filter(team__in=teams).values_list('user_id', flat=True),
+        *Team.objects.filter(pk__in=teams).values_list('created_by_id', flat=True),
+        *Task.objects.filter(assigned_to=user_id).values_list('project__user_id', flat=True).distinct(),
+    )
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PROFILE_IMAGE_WORKERS', 2),
+                    thread_name_prefix='profile-images',
+                )
+    return _executor
+
+
+def run_logged(user_id):
+    try:
+        process_profile_image(user_id)
+    except Exception:
+        logger.exception('Processing the profile image of user %s failed', user_id)
+
+
+def run_in_worker(user_id):
+    try:
+        run_logged(user_id)
+    finally:
+        # Pool threads get their own connections; don't leave them open
+        connections.close_all()
+
+
+def schedule_profile_image(user_id):
+    """Process the user's image once the current transaction commits."""
+    if getattr(settings, 'PROFILE_IMAGE_WORKERS', 2) > 0:
+        transaction.on_commit(lambda: get_executor().submit(run_in_worker, user_id))
+    else:
+        transaction.on_commit(lambda: run_logged(user_id))
+
+
+def variant_urls(user, request=None):
+    urls = {}
+    if is_current(user):
+        for name, path in user.profile_image_variants.items():
+            if name != 'source':
+                url = default_storage.url(path)
+                urls[name] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,207 @@
+"""
+Bulk task import from CSV or JSON.
+
+Records are validated a batch at a time: project ownership and assignees are
+checked with one query per batch, choices and dates in Python, and valid
+rows are written with ``bulk_create``. ``bulk_create`` sends no signals, so
+the work the Task signal handlers would do (rollups, search index, activity
+feeds, assignment notifications, dashboard stats) is done here once per batch
+or once per import.
+"""
+import csv
+import io
+import json
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from . import activity, search
+from .models import User, Project, Task
+from .notifications import notify
+from .rollups import rebuild_rollups
+from .stats import invalidate_dashboard_stats
+
+IMPORT_FORMATS = ('csv', 'json')
+PRIORITIES = {value for value, _ in Task.PRIORITY_CHOICES}
+STATUSES = {value for value, _ in Task.STATUS_CHOICES}
+TITLE_MAX_LENGTH = Task._meta.get_field('title').max_length
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(name):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    if extension not in IMPORT_FORMATS:
+        raise ImportFormatError(f"Cannot tell the format of '{name}'; use one of: {', '.join(IMPORT_FORMATS)}")
+    return extension
+
+
+def read_records(file, import_format):
+    """
+    Iterate the records of a binary CSV or JSON file as dicts (JSON: a list
+    of objects). CSV is read lazily: an undecodable or malformed row raises
+    ImportFormatError once reached.
+    """
+    if import_format == 'csv':
+        return csv_records(file)
+    if import_format == 'json':
+        try:
+            records = json.load(file)
+        except ValueError as e:
+            raise ImportFormatError(f'Invalid JSON: {e}')
+        if not isinstance(records, list):
+            raise ImportFormatError('Expected a JSON list of task objects')
+        return records
+    raise ImportFormatError(f"Unknown format '{import_format}'")
+
+
+def csv_records(file):
+    try:
+        yield from csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    except UnicodeDecodeError:
+        raise ImportFormatError('CSV files must be UTF-8 encoded')
+    except csv.Error as e:
+        raise ImportFormatError(f'Invalid CSV: {e}')
+
+
+def parse_id(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class TaskImport:
+    """
+    Import task records on behalf of ``user``.
+
+    Records name their project as ``project`` or ``project_id`` (it must be
+    one of the user's projects) and may name an ``assigned_to`` user, which
+    defaults to the importing user as in the API. Other columns, such as the
+    ``id`` and timestamps of an export, are ignored.
+
+    Unless ``partial`` is set the import is all-or-nothing: any invalid
+    record rolls every batch back. ``errors`` lists ``{'row': n, 'errors':
+    {field: [message]}}`` with rows numbered from 1.
+    """
+
+    def __init__(self, user, batch_size=1000, partial=False):
+        self.user = user
+        self.batch_size = batch_size
+        self.partial = partial
+        self.created = 0
+        self.errors = []
+        self.project_ids = set()
+        self.assignee_ids = set()
+        # Tasks given to others, per assignee, who are told once the import is in
+        self.assigned = Counter()
+
+    def run(self, records):
+        numbered = enumerate(records, 1)
+        with transaction.atomic():
+            while True:
+                batch = list(islice(numbered, self.batch_size))
+                if not batch:
+                    break
+                tasks = self.validate(batch)
+                if tasks and (self.partial or not self.errors):
+                    self.insert(tasks)
+
+            if self.errors and not self.partial:
+                transaction.set_rollback(True)
+                self.created = 0
+                return self
+            rebuild_rollups(self.project_ids)
+            for assignee_id, count in self.assigned.items():
+                notify([assignee_id], f'You were assigned {count} task{"s" if count > 1 else ""}')
+        invalidate_dashboard_stats(self.user.pk, *self.assignee_ids)
+        return self
+
+    def validate(self, batch):
+        records = [(number, record) for number, record in batch if isinstance(record, dict)]
+        for number, record in batch:
+            if not isinstance(record, dict):
+                self.errors.append({'row': number, 'errors': {'non_field_errors': ['Expected an object.']}})
+
+        project_ids = {parse_id(record.get('project_id', record.get('project'))) for _, record in records}
+        owned = set(
+            Project.objects.filter(user=self.user, pk__in=project_ids - {None}).values_list('pk', flat=True)
+        )
+        assignee_ids = {parse_id(record.get('assigned_to')) for _, record in records} - {None}
+        users = set(User.objects.filter(pk__in=assignee_ids).values_list('pk', flat=True))
+
+        tasks = []
+        for number, record in records:
+            errors = {}
+            values = self.clean(record, owned, users, errors)
+            if errors:
+                self.errors.append({'row': number, 'errors': errors})
+            else:
+                tasks.append(Task(**values))
+        return tasks
+
+    def clean(self, record, owned, users, errors):
+        values = {}
+
+        title = record.get('title')
+        if blank(title):
+            errors['title'] = ['This field is required.']
+        elif len(str(title)) > TITLE_MAX_LENGTH:
+            errors['title'] = [f'Ensure this field has no more than {TITLE_MAX_LENGTH} characters.']
+        else:
+            values['title'] = str(title)
+        description = record.get('description')
+        values['description'] = '' if description is None else str(description)
+
+        due_date = record.get('due_date')
+        try:
+            values['due_date'] = parse_date(due_date) if isinstance(due_date, str) else None
+        except ValueError:
+            values['due_date'] = None
+        if values['due_date'] is None:
+            errors['due_date'] = ['Enter a valid date in YYYY-MM-DD format.']
+
+        for field, choices, default in (('priority', PRIORITIES, 'medium'), ('status', STATUSES, 'todo')):
+            value = record.get(field)
+            if blank(value):
+                values[field] = default
+            elif isinstance(value, str) and value in choices:
+                values[field] = value
+            else:
+                errors[field] = [f'"{value}" is not a valid choice.']
+
+        project_id = parse_id(record.get('project_id', record.get('project')))
+        if project_id not in owned:
+            errors['project'] = ['Unknown project or not one of your projects.']
+        values['project_id'] = project_id
+
+        assigned_to = record.get('assigned_to')
+        if blank(assigned_to):
+            values['assigned_to_id'] = self.user.pk
+        elif parse_id(assigned_to) in users:
+            values['assigned_to_id'] = parse_id(assigned_to)
+        else:
+            errors['assigned_to'] = ['Unknown user.']
+        return values
+
+    def insert(self, tasks):
+        created = Task.objects.bulk_create(tasks)
+        self.created += len(created)
+        self.project_ids.update(task.project_id for task in created)
+        self.assignee_ids.update(task.assigned_to_id for task in created)
+        self.assigned.update(task.assigned_to_id for task in created if task.assigned_to_id != self.user.pk)
+        search.index_objects('task', Task.objects.filter(pk__in=[task.pk for task in created]))
+        activity.record_many([
+            activity.event('created', 'task', task.pk, task.title, [self.user.pk, task.assigned_to_id])
+            for task in created
+        ])
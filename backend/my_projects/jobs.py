@@ -0,0 +1,207 @@
+"""
+A small job queue kept in the ``Job`` table, so no broker is needed.
+
+Handlers are registered with ``@handler(kind, ...)`` and work is queued with
+``enqueue(kind, payload)``, normally inside the transaction that caused it,
+so a job exists exactly when its cause was committed. ``run_jobs`` workers
+claim due jobs per queue:
+
+* a claim is one conditional ``UPDATE ... WHERE status = 'pending'`` (or
+  ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database has it), so no
+  two workers run the same job;
+* a queue is worked on by at most ``concurrency`` workers at once
+  (``JOB_QUEUES``): the claiming ``UPDATE`` itself counts the other workers
+  running jobs of the queue, and the claim's first statement is a write, so
+  on SQLite claims are serialized and the limit is exact. Databases that let
+  ``UPDATE`` of different rows run side by side (PostgreSQL, MySQL) may let
+  concurrent claims through together: there the limit is a soft one;
+* jobs of the same kind claimed together go to a batch handler in one call.
+  If that call fails its jobs are run again one at a time, so one bad
+  payload fails only its own job;
+* a failing job is retried with exponential backoff until ``max_attempts``,
+  then left as ``failed``. Jobs of a worker that died are reclaimed once
+  their lock is older than ``JOB_LOCK_TIMEOUT``.
+
+Successful jobs are deleted.
+"""
+import logging
+import random
+import traceback
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Handler:
+    kind: str
+    func: object
+    queue: str
+    batch: bool
+    max_attempts: int
+
+
+_handlers = {}
+
+
+def handler(kind, queue='default', batch=False, max_attempts=5):
+    """
+    Register ``func`` to run jobs of ``kind``. A ``batch`` handler is called
+    with a list of payloads, otherwise with one payload per call.
+    """
+    def register(func):
+        _handlers[kind] = Handler(kind, func, queue, batch, max_attempts)
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, delay=None, run_at=None):
+    registered = _handlers.get(kind)
+    if registered is None:
+        raise LookupError(f"No job handler registered for '{kind}'")
+    if run_at is None:
+        run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.create(
+        queue=registered.queue, kind=kind, payload=payload or {},
+        max_attempts=registered.max_attempts, run_at=run_at,
+    )
+
+
+def enqueue_many(kind, payloads):
+    """``enqueue()`` one job per payload, in one ``bulk_create``."""
+    registered = _handlers.get(kind)
+    if registered is None:
+        raise LookupError(f"No job handler registered for '{kind}'")
+    run_at = timezone.now()
+    return Job.objects.bulk_create([
+        Job(queue=registered.queue, kind=kind, payload=payload, max_attempts=registered.max_attempts, run_at=run_at)
+        for payload in payloads
+    ])
+
+
+def queue_settings(queue):
+    queues = getattr(settings, 'JOB_QUEUES', {})
+    return {'concurrency': 1, **queues.get(queue, {})}
+
+
+def lock_timeout():
+    return timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 300))
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: doubling from JOB_RETRY_DELAY, capped, with jitter."""
+    base = getattr(settings, 'JOB_RETRY_DELAY', 10)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_MAX_DELAY', 3600))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim(queue, worker_id, limit):
+    """Claim up to ``limit`` due jobs of ``queue`` for ``worker_id``, unless the queue is at its concurrency."""
+    now = timezone.now()
+    stale = Q(status='running', locked_at__lt=now - lock_timeout())
+    with transaction.atomic():
+        # Abandoned jobs that used up their attempts are given up on
+        Job.objects.filter(stale, queue=queue, attempts__gte=F('max_attempts')).update(
+            status='failed', locked_by='', locked_at=None, last_error='Worker lost', updated_at=now,
+        )
+        due = Job.objects.filter(Q(status='pending', run_at__lte=now) | stale, queue=queue).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+        else:
+            candidates = list(due.values_list('pk', flat=True)[:limit])
+        # The UPDATE itself checks the status and the queue's concurrency: a
+        # job taken by another worker since the SELECT is simply not claimed
+        # here, and nothing is while other workers fill the queue's slots
+        others = Job.objects.filter(queue=queue, status='running').exclude(stale).exclude(locked_by=worker_id)
+        workers = others.order_by().values('queue').annotate(count=Count('locked_by', distinct=True)).values('count')
+        Job.objects.alias(busy=Coalesce(Subquery(workers), 0)).filter(
+            Q(status='pending') | stale, pk__in=candidates, busy__lt=queue_settings(queue)['concurrency'],
+        ).update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1, updated_at=now,
+        )
+    return list(Job.objects.filter(pk__in=candidates, locked_by=worker_id, locked_at=now).order_by('run_at', 'id'))
+
+
+def complete(jobs):
+    Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+
+
+def fail(jobs, error):
+    now = timezone.now()
+    for job in jobs:
+        if job.attempts >= job.max_attempts:
+            changes = {'status': 'failed'}
+        else:
+            changes = {'status': 'pending', 'run_at': now + backoff(job.attempts)}
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            locked_by='', locked_at=None, last_error=error, updated_at=now, **changes
+        )
+
+
+def attempt(registered, jobs):
+    """Run ``jobs`` in one handler call; returns the traceback if it failed, else ``None``."""
+    try:
+        if registered is None:
+            raise LookupError(f"No job handler registered for '{jobs[0].kind}'")
+        # The jobs are deleted in the handler's transaction: they either
+        # took effect and are gone, or neither
+        with transaction.atomic():
+            if registered.batch:
+                registered.func([job.payload for job in jobs])
+            else:
+                registered.func(jobs[0].payload)
+            complete(jobs)
+    except Exception:
+        logger.exception('Job %s failed', ', '.join(str(job) for job in jobs))
+        return traceback.format_exc()
+    return None
+
+
+def run(jobs):
+    """Run claimed jobs, one handler call per job or per kind for batch handlers. Returns the failure count."""
+    groups = defaultdict(list)
+    for job in jobs:
+        registered = _handlers.get(job.kind)
+        if registered is not None and registered.batch:
+            groups[job.kind].append(job)
+        else:
+            groups[job.pk].append(job)
+
+    failed = 0
+    for group in groups.values():
+        registered = _handlers.get(group[0].kind)
+        error = attempt(registered, group)
+        if error is None:
+            continue
+        if len(group) > 1:
+            # Find the jobs that fail on their own; the rest can go through
+            for job in group:
+                error = attempt(registered, [job])
+                if error is not None:
+                    fail([job], error)
+                    failed += 1
+        else:
+            fail(group, error)
+            failed += 1
+    return failed
+
+
+def run_once(queues, worker_id, batch_size=100):
+    """Claim and run one round of jobs from each queue; returns ``(ran, failed)``."""
+    ran = failed = 0
+    for queue in queues:
+        jobs = claim(queue, worker_id, batch_size)
+        if jobs:
+            ran += len(jobs)
+            failed += run(jobs)
+    return ran, failed
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from my_projects.models import User
+from my_projects.urls import async_routes
+
+from .benchmark_endpoints import percentile
+
+# Before: every request served by the router's sync views. After: GETs on
+# the routes of ``async_routes`` served by the async views.
+MODES = {
+    'sync': {'ASYNC_API_VIEWS': False},
+    'async': {'ASYNC_API_VIEWS': True},
+}
+
+
+class ASGIDriver:
+    """Requests straight to the ASGI application, as many at a time as asked."""
+
+    def __init__(self, application, token):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host and host[0] not in '.*']
+        self.application = application
+        self.headers = [
+            (b'host', (hosts[0] if hosts else 'localhost').encode()),
+            (b'authorization', f'Bearer {token}'.encode()),
+        ]
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.peak_threads = 0
+
+    async def request(self, path):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+            'root_path': '', 'headers': self.headers, 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        received = asyncio.Event()
+        status = None
+
+        async def receive():
+            if received.is_set():
+                # No disconnect until the response is sent
+                await asyncio.Future()
+            received.set()
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            await self.application(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+        return status, time.perf_counter() - start
+
+    async def run(self, path, count, concurrency):
+        results = []
+        remaining = iter(range(count))
+
+        async def client():
+            for _ in remaining:
+                results.append(await self.request(path))
+
+        async def watch_threads():
+            while True:
+                self.peak_threads = max(self.peak_threads, threading.active_count())
+                await asyncio.sleep(0.005)
+
+        self.peak_in_flight = self.peak_threads = 0
+        watcher = asyncio.create_task(watch_threads())
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        watcher.cancel()
+        return results, elapsed
+
+
+class Command(BaseCommand):
+    help = 'Measure the routes with async views under concurrent load, through the ASGI application'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email or id of the user the requests are made as (default: the busiest)')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per route and mode')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at a time')
+        parser.add_argument('--mode', action='append', choices=MODES, help='Runs to make (default: all)')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        from config.asgi import application
+
+        user = self.get_user(options['user'])
+        driver = ASGIDriver(application, str(AccessToken.for_user(user)))
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            for mode in options['mode'] or MODES:
+                with override_settings(**MODES[mode]):
+                    for _, _, name in async_routes:
+                        asyncio.run(self.benchmark(driver, mode, reverse(name), name, options))
+        finally:
+            request_logger.setLevel(level)
+
+    def get_user(self, value):
+        if value is not None:
+            lookup = {'pk': value} if value.isdigit() else {'email': value}
+            user = User.objects.filter(**lookup).first()
+        else:
+            user = (
+                User.objects.filter(is_active=True).annotate(notification_count=Count('notifications'))
+                .order_by('-notification_count', 'pk').first()
+            )
+        if user is None:
+            raise CommandError('No such user; generate some with `manage.py generate_data`')
+        return user
+
+    async def benchmark(self, driver, mode, path, name, options):
+        await driver.run(path, options['concurrency'], options['concurrency'])
+        results, elapsed = await driver.run(path, options['requests'], options['concurrency'])
+        statuses, latencies = zip(*results)
+        ordered = sorted(latencies)
+        line = (
+            f'{mode:<6} {name:<28} {len(results) / elapsed:>8.1f} req/s  '
+            f'p50 {percentile(ordered, 0.50) * 1000:>8.2f}ms  p95 {percentile(ordered, 0.95) * 1000:>8.2f}ms  '
+            f'{driver.peak_in_flight} in flight  {driver.peak_threads} threads'
+        )
+        if set(statuses) != {200}:
+            line += f'  status {sorted(set(statuses))}'
+        self.stdout.write(line)
@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.db.models import Count
+from django.test.utils import override_settings
+
+from my_projects.db import routing
+from my_projects.models import User, Task, Notification
+
+# Before: Django's defaults, where a writer locks readers out of the file
+# (rollback journal). After: the configured pragmas and read replicas.
+MODES = {
+    'baseline': lambda: {'SQLITE_PRAGMAS': {'journal_mode': 'delete'}, 'DATABASE_REPLICAS': []},
+    'tuned': lambda: {'SQLITE_PRAGMAS': settings.SQLITE_PRAGMAS, 'DATABASE_REPLICAS': settings.DATABASE_REPLICAS},
+}
+READ_LIMIT = 50
+
+
+class Worker(threading.Thread):
+    def __init__(self, work, deadline):
+        super().__init__(daemon=True)
+        self.work = work
+        self.deadline = deadline
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        try:
+            while time.perf_counter() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    self.work()
+                except OperationalError:
+                    # "database is locked" once the busy timeout runs out
+                    self.errors += 1
+                else:
+                    self.latencies.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Measure concurrent read and write throughput with and without the tuned database layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Concurrent reading threads')
+        parser.add_argument('--writers', type=int, default=1, help='Concurrent writing threads')
+        parser.add_argument('--seconds', type=float, default=5, help='Duration of each run')
+        parser.add_argument('--mode', action='append', choices=MODES, help='Runs to make (default: all)')
+
+    def handle(self, *args, **options):
+        if options['readers'] < 1 or options['writers'] < 0 or options['seconds'] <= 0:
+            raise CommandError('--readers and --seconds must be positive, --writers not negative')
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('The baseline run only applies to SQLite')
+
+        reader = (
+            User.objects.annotate(task_count=Count('assigned_tasks')).order_by('-task_count', 'pk').first()
+        )
+        if reader is None:
+            raise CommandError('No users; generate some with `manage.py generate_data`')
+        writer = User.objects.create_user(
+            email='db-benchmark@example.com', username='db-benchmark', password=None,
+            first_name='Bench', last_name='Mark'
+        )
+        try:
+            for mode in options['mode'] or MODES:
+                self.run(mode, reader, writer, options)
+        finally:
+            writer.delete()
+
+    def run(self, mode, reader, writer, options):
+        def read():
+            replicas = settings.DATABASE_REPLICAS
+            with routing(random.choice(replicas) if replicas else None):
+                list(Task.objects.visible_to(reader).order_by('-id').values()[:READ_LIMIT])
+                Notification.objects.filter(user=reader, read=False).count()
+
+        def write():
+            Notification.objects.create(user=writer, message='Benchmark write')
+
+        # Reconnect so every connection is opened with the mode's pragmas
+        connections.close_all()
+        with override_settings(**MODES[mode]()):
+            deadline = time.perf_counter() + options['seconds']
+            readers = [Worker(read, deadline) for _ in range(options['readers'])]
+            writers = [Worker(write, deadline) for _ in range(options['writers'])]
+            for worker in readers + writers:
+                worker.start()
+            for worker in readers + writers:
+                worker.join()
+            connections.close_all()
+
+        for label, workers in (('reads', readers), ('writes', writers)):
+            latencies = sorted(latency for worker in workers for latency in worker.latencies)
+            if not workers:
+                continue
+            errors = sum(worker.errors for worker in workers)
+            p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan')
+            self.stdout.write(
+                f"{mode:<9} {label:<6} {len(latencies) / options['seconds']:>9,.0f}/s  "
+                f'p95 {p95:>8.2f}ms  {errors} locked'
+            )
@@ -0,0 +1,258 @@
+import json
+import logging
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_started
+from django.db import connections, reset_queries
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from my_projects.models import User, Task
+from my_projects.urls import router
+
+# Query strings some routes need to do representative work
+ROUTE_PARAMS = {
+    'search-list': {'q': 'report'},
+    'task-export': {'format': 'csv'},
+    'project-export': {'format': 'csv'},
+    'comment-export': {'format': 'csv'},
+}
+
+
+def get_routes():
+    """``(url name, list url name or None, viewset)`` per GET route of the API router, detail routes last."""
+    routes = []
+    for prefix, viewset, basename in router.registry:
+        for route in router.get_routes(viewset):
+            # Extra actions' mappings are MethodMappers, whose get() is a decorator
+            action = dict.get(route.mapping, 'get')
+            if action is None or not hasattr(viewset, action):
+                continue
+            name = route.name.format(basename=basename)
+            routes.append((name, f'{basename}-list' if route.detail else None, viewset))
+    return sorted(routes, key=lambda route: route[1] is not None)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(path, latencies, statuses, queries, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'path': path,
+        'requests': len(latencies),
+        'status': sorted(set(statuses)),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'throughput': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'queries': round(sum(queries) / len(queries), 1) if queries else None,
+    }
+
+
+class QueriesOfAlias(CaptureQueriesContext):
+    """
+    CaptureQueriesContext without connecting first: aliases a request does
+    not use stay closed. The statements a connection runs on opening
+    (``SQLITE_PRAGMAS``) are counted with the request that opened it.
+    """
+
+    def __enter__(self):
+        self.force_debug_cursor = self.connection.force_debug_cursor
+        self.connection.force_debug_cursor = True
+        self.initial_queries = len(self.connection.queries_log)
+        self.final_queries = None
+        request_started.disconnect(reset_queries)
+        return self
+
+
+class InProcessDriver:
+    """Requests through Django's test client, with the SQL of each one counted."""
+    mode = 'test-client'
+
+    def __init__(self, token):
+        hosts = [host for host in settings.ALLOWED_HOSTS if host and host[0] not in '.*']
+        self.client = Client(raise_request_exception=False, HTTP_HOST=hosts[0] if hosts else 'localhost')
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def request(self, path):
+        # Read-only actions read from the replicas, so every alias is counted
+        with ExitStack() as stack:
+            captured = [stack.enter_context(QueriesOfAlias(connections[alias])) for alias in connections]
+            start = time.perf_counter()
+            response = self.client.get(path, **self.headers)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - start
+        return response.status_code, body, elapsed, sum(len(queries) for queries in captured)
+
+    def run(self, path, count, concurrency):
+        return [self.request(path) for _ in range(count)]
+
+
+class HTTPDriver:
+    """Requests to a running server (e.g. ``uvicorn config.asgi:application``); queries are not counted."""
+    mode = 'http'
+
+    def __init__(self, token, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def request(self, path):
+        request = urllib.request.Request(self.base_url + path, headers=self.headers)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+        return status, body, time.perf_counter() - start, None
+
+    def run(self, path, count, concurrency):
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(lambda _: self.request(path), range(count)))
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, throughput and queries per request of every GET route in my_projects/urls.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email or id of the user the requests are made as (default: the busiest)')
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per route')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per route first')
+        parser.add_argument('--route', action='append', help='Only routes whose URL name contains this (repeatable)')
+        parser.add_argument('--url', help='Base URL of a running server; by default requests go through the test client')
+        parser.add_argument('--concurrency', type=int, default=1, help='Parallel requests, with --url only')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['warmup'] < 0 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive, --warmup not negative')
+        if options['concurrency'] > 1 and not options['url']:
+            raise CommandError('--concurrency needs --url')
+        baseline = self.load(options['compare']) if options['compare'] else None
+
+        user = self.get_user(options['user'])
+        token = str(AccessToken.for_user(user))
+        driver = HTTPDriver(token, options['url']) if options['url'] else InProcessDriver(token)
+
+        # Expected 4xx responses (e.g. admin-only routes) would log every request
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            results = self.benchmark(driver, options, baseline)
+        finally:
+            request_logger.setLevel(level)
+
+        run = {
+            'finished_at': timezone.now().isoformat(),
+            'mode': driver.mode,
+            'url': options['url'],
+            'user': user.pk,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'dataset': {'tasks': Task.objects.count(), 'users': User.objects.count()},
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(run, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def benchmark(self, driver, options, baseline):
+        results = {}
+        detail_ids = {}
+        for name, list_name, viewset in get_routes():
+            if options['route'] and not any(part in name for part in options['route']):
+                continue
+            path = self.path_for(name, list_name, viewset, driver, detail_ids)
+            if path is None:
+                self.stderr.write(f'{name}: skipped, no object to request')
+                continue
+            for _ in range(options['warmup']):
+                driver.request(path)
+            start = time.perf_counter()
+            responses = driver.run(path, options['requests'], options['concurrency'])
+            elapsed = time.perf_counter() - start
+            statuses, _, latencies, queries = zip(*responses)
+            results[name] = summarize(
+                path, latencies, statuses, [count for count in queries if count is not None], elapsed
+            )
+            self.report(name, results[name], baseline)
+        return results
+
+    def get_user(self, value):
+        if value is None:
+            user = (
+                User.objects.filter(is_active=True).annotate(task_count=Count('projects__tasks'))
+                .order_by('-task_count', 'pk').first()
+            )
+            if user is None:
+                raise CommandError('No users; generate some with `manage.py generate_data`')
+            return user
+        lookup = {'pk': value} if value.isdigit() else {'email': value}
+        try:
+            return User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"No user '{value}'")
+
+    def path_for(self, name, list_name, viewset, driver, detail_ids):
+        kwargs = {}
+        if list_name is not None:
+            if list_name not in detail_ids:
+                detail_ids[list_name] = self.first_id(list_name, driver)
+            if detail_ids[list_name] is None:
+                return None
+            kwargs[viewset.lookup_url_kwarg or viewset.lookup_field] = detail_ids[list_name]
+        try:
+            path = reverse(name, kwargs=kwargs)
+        except NoReverseMatch:
+            return None
+        params = ROUTE_PARAMS.get(name)
+        return f'{path}?{urlencode(params)}' if params else path
+
+    def first_id(self, list_name, driver):
+        try:
+            status, body, _, _ = driver.request(reverse(list_name))
+            data = json.loads(body)
+        except (NoReverseMatch, ValueError):
+            return None
+        rows = data.get('results', []) if isinstance(data, dict) else data
+        return rows[0]['id'] if status == 200 and rows and 'id' in rows[0] else None
+
+    def load(self, path):
+        try:
+            with open(path) as file:
+                return json.load(file)['routes']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+
+    def report(self, name, result, baseline):
+        queries = '-' if result['queries'] is None else f"{result['queries']:g}"
+        line = (
+            f"{name:<32} p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+            f"p99 {result['p99_ms']:>8.2f}ms  {result['throughput']:>8.1f} req/s  {queries:>5} queries"
+        )
+        previous = (baseline or {}).get(name)
+        if previous and previous['p95_ms']:
+            change = (result['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+            line += f'  p95 {change:+.0f}%'
+        if result['status'] != [200]:
+            line += f"  status {result['status']}"
+        self.stdout.write(line)
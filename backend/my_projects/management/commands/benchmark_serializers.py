@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from my_projects.fastpath import compile_plan
+from my_projects.models import User, Project, Task, Notification
+from my_projects.serializers import TaskSerializer, NotificationSerializer
+
+SUBJECTS = {
+    'task': (Task, TaskSerializer),
+    'notification': (Notification, NotificationSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of the DRF serializers and the values() fast path on generated rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Rows generated per model')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the best is reported')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        if rows < 1 or repeat < 1:
+            raise CommandError('--rows and --repeat must be positive')
+
+        # Everything generated here is rolled back
+        with transaction.atomic():
+            self.generate(rows)
+            for name, (model, serializer_class) in SUBJECTS.items():
+                self.benchmark(name, model, serializer_class, repeat)
+            transaction.set_rollback(True)
+
+    def generate(self, rows):
+        user = User.objects.create_user(
+            email='benchmark@example.com', username='benchmark-user', password=None,
+            first_name='Bench', last_name='Mark'
+        )
+        today = timezone.localdate()
+        project = Project.objects.create(
+            title='Benchmark', description='', start_date=today, end_date=today, user=user
+        )
+        Task.objects.bulk_create(
+            Task(
+                title=f'Task {n}', description='Generated for benchmarking', due_date=today,
+                project=project, assigned_to=user
+            )
+            for n in range(rows)
+        )
+        Notification.objects.bulk_create(
+            Notification(user=user, message=f'Notification {n}') for n in range(rows)
+        )
+
+    def benchmark(self, name, model, serializer_class, repeat):
+        plan = compile_plan(serializer_class())
+        queryset = model.objects.order_by('pk')
+
+        def serializer_path():
+            return serializer_class(queryset.all(), many=True).data
+
+        def fast_path():
+            return plan.render_many(plan.values(queryset.all()))
+
+        expected, actual = serializer_path(), fast_path()
+        if [dict(row) for row in expected] != actual:
+            raise CommandError(f'{name}: fast path output differs from {serializer_class.__name__}')
+
+        count = len(actual)
+        for label, path in (('serializer', serializer_path), ('fast path', fast_path)):
+            best = min(self.time(path) for _ in range(repeat))
+            self.stdout.write(f'{name:<13} {label:<11} {count / best:>12,.0f} rows/sec')
+
+    def time(self, path):
+        start = time.perf_counter()
+        path()
+        return time.perf_counter() - start
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from my_projects.synthetic import SCALES, generate
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic dataset (users, teams, projects, tasks, comments, notifications) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small', help='Preset sizes, see my_projects/synthetic.py')
+        parser.add_argument('--users', type=int, help='Overrides the preset')
+        parser.add_argument('--teams', type=int, help='Overrides the preset')
+        parser.add_argument('--team-size', type=int, help='Mean members per team; overrides the preset')
+        parser.add_argument('--projects-per-user', type=int, help='Overrides the preset')
+        parser.add_argument('--tasks', type=int, help='Overrides the preset')
+        parser.add_argument('--comments', type=int, help='Overrides the preset')
+        parser.add_argument('--notifications', type=int, help='Overrides the preset')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create')
+        parser.add_argument('--seed', type=int, help='Seed for a reproducible dataset')
+        parser.add_argument('--prefix', default='user', help='Username prefix of the generated users')
+        parser.add_argument('--password', default='password', help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        sizes = ('users', 'teams', 'team_size', 'projects_per_user', 'tasks', 'comments', 'notifications')
+        if any(options[name] is not None and options[name] < 0 for name in sizes) or options['batch_size'] < 1:
+            raise CommandError('Sizes must not be negative and --batch-size must be positive')
+        if options['users'] == 0:
+            raise CommandError('--users must be positive')
+        resolved = {**SCALES[options['scale']], **{name: options[name] for name in sizes if options[name] is not None}}
+        if resolved['projects_per_user'] == 0 and resolved['tasks'] > 0:
+            raise CommandError('Tasks need projects: pass --tasks 0 along with --projects-per-user 0')
+
+        counts, elapsed = generate(
+            options['scale'],
+            **{name: options[name] for name in sizes},
+            batch_size=options['batch_size'], seed=options['seed'], prefix=options['prefix'],
+            password=options['password'], progress=self.progress if options['verbosity'] > 1 else None,
+        )
+        summary = ', '.join(f'{count:,} {name}s' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Generated {summary} in {elapsed:.1f}s'))
+
+    def progress(self, model, written):
+        self.stdout.write(f'  {model}: {written:,}')
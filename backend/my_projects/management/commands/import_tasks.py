@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from my_projects.imports import IMPORT_FORMATS, ImportFormatError, TaskImport, detect_format, read_records
+from my_projects.models import User
+
+
+class Command(BaseCommand):
+    help = 'Import tasks from a CSV or JSON file on behalf of a user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file of tasks')
+        parser.add_argument('--user', required=True, help='Email or id of the user importing the tasks')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows validated and inserted per batch')
+        parser.add_argument('--partial', action='store_true', help='Import the valid rows even if some are rejected')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        started = time.perf_counter()
+        try:
+            import_format = options['format'] or detect_format(options['path'])
+            with open(options['path'], 'rb') as file:
+                result = TaskImport(user, options['batch_size'], options['partial']).run(
+                    read_records(file, import_format)
+                )
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        for error in result.errors:
+            messages = '; '.join(f"{field}: {' '.join(msgs)}" for field, msgs in error['errors'].items())
+            self.stderr.write(f"Row {error['row']}: {messages}")
+        if result.errors and not options['partial']:
+            raise CommandError(f'{len(result.errors)} invalid rows, nothing imported')
+        style = self.style.WARNING if result.errors else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Imported {result.created} tasks in {elapsed:.1f}s ({len(result.errors)} rows rejected)'
+        ))
+
+    def get_user(self, value):
+        lookup = {'pk': value} if value.isdigit() else {'email': value}
+        try:
+            return User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"No user '{value}'")
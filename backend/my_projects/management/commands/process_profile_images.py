@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from my_projects.images import is_current, process_profile_image
+from my_projects.models import User
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized variants of profile images that do not have current ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate the variants of every image')
+        parser.add_argument('--workers', type=int, default=4, help='Images processed in parallel')
+        parser.add_argument('--batch-size', type=int, default=500, help='Users read per query')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        users = User.objects.exclude(profile_image='').exclude(profile_image__isnull=True).only(
+            'profile_image', 'profile_image_variants'
+        ).order_by('pk')
+        pending = [
+            user.pk for user in users.iterator(chunk_size=options['batch_size'])
+            if options['force'] or not is_current(user)
+        ]
+        if options['force']:
+            users.update(profile_image_variants={})
+
+        failed = 0
+        if options['workers'] == 1:
+            errors = map(self.process, pending)
+        else:
+            pool = ThreadPoolExecutor(max_workers=options['workers'])
+            errors = pool.map(self.process_in_worker, pending)
+        for user_id, error in zip(pending, errors):
+            if error:
+                failed += 1
+                self.stderr.write(f'User {user_id}: {error}')
+        if options['workers'] > 1:
+            pool.shutdown()
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f'Processed {len(pending) - failed} profile images ({failed} failed)'))
+
+    def process(self, user_id):
+        try:
+            process_profile_image(user_id)
+        except Exception as e:
+            return str(e) or e.__class__.__name__
+        return None
+
+    def process_in_worker(self, user_id):
+        try:
+            return self.process(user_id)
+        finally:
+            connections.close_all()
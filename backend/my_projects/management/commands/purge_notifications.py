@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from my_projects.retention import purge, retention_policy
+
+
+class Command(BaseCommand):
+    help = 'Apply the NOTIFICATION_RETENTION policy, deleting or archiving notifications in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows removed per transaction')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows the policy would remove')
+        parser.add_argument('--read-max-age-days', type=int, help='Override the policy for read notifications')
+        parser.add_argument('--unread-max-age-days', type=int, help='Override the policy for unread notifications')
+        parser.add_argument('--max-per-user', type=int, help='Override the per-user quota')
+        archive = parser.add_mutually_exclusive_group()
+        archive.add_argument('--archive', action='store_true', dest='archive', default=None)
+        archive.add_argument('--no-archive', action='store_false', dest='archive')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        overrides = {
+            key: options[key]
+            for key in ('read_max_age_days', 'unread_max_age_days', 'max_per_user', 'archive')
+            if options[key] is not None
+        }
+        policy = retention_policy(**overrides)
+
+        total = 0
+        for total in purge(policy, options['batch_size'], options['pause'], options['dry_run']):
+            if not options['dry_run']:
+                self.stdout.write(f'{total} removed', ending='\r')
+        if options['dry_run']:
+            self.stdout.write(f'{total} notifications would be removed')
+        else:
+            action = 'Archived' if policy['archive'] else 'Deleted'
+            self.stdout.write(self.style.SUCCESS(f'{action} {total} notifications'))
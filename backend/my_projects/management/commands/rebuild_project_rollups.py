@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from my_projects.models import Project
+from my_projects.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the task rollups of every project, or only report drift with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Report mismatched rollups without writing')
+        parser.add_argument('--batch-size', type=int, default=500, help='Projects aggregated per query')
+
+    def handle(self, *args, **options):
+        verify = options['verify']
+        batch_size = options['batch_size']
+        today = timezone.localdate()
+        project_ids = Project.objects.order_by('pk').values_list('pk', flat=True)
+
+        total, mismatched = 0, []
+        batch = []
+        for project_id in project_ids.iterator(chunk_size=batch_size):
+            batch.append(project_id)
+            if len(batch) == batch_size:
+                mismatched += self.process(batch, today, verify)
+                total += len(batch)
+                batch = []
+        if batch:
+            mismatched += self.process(batch, today, verify)
+            total += len(batch)
+
+        if verify:
+            for project_id in mismatched:
+                self.stdout.write(f'Project {project_id}: rollup out of date')
+            style = self.style.WARNING if mismatched else self.style.SUCCESS
+            self.stdout.write(style(f'Verified {total} projects, {len(mismatched)} mismatched'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} project rollups ({len(mismatched)} corrected)'))
+
+    def process(self, project_ids, today, verify):
+        with transaction.atomic():
+            _, mismatched = rebuild_rollups(project_ids, today, commit=not verify)
+        return mismatched
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from my_projects.search import KINDS, reindex, search_available
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for projects, tasks and comments in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*', help=f"Only rebuild these kinds ({', '.join(KINDS)})")
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows indexed per transaction')
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('Full-text search requires the SQLite database backend')
+        unknown = set(options['kinds']) - set(KINDS)
+        if unknown:
+            raise CommandError(f"Unknown kinds: {', '.join(sorted(unknown))}")
+        for kind in options['kinds'] or KINDS:
+            total = 0
+            for total in reindex(kind, options['chunk_size']):
+                self.stdout.write(f'{kind}: {total} indexed', ending='\r')
+            self.stdout.write(self.style.SUCCESS(f'{kind}: {total} indexed'))
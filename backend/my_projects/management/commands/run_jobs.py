@@ -0,0 +1,60 @@
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from my_projects.jobs import run_once
+from my_projects.realtime import get_broadcast
+from my_projects.stats import stats_cache
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs until stopped (or until drained with --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help='Queue to work on; repeat for several (default: every queue in JOB_QUEUES)',
+        )
+        parser.add_argument('--batch-size', type=int, default=100, help='Jobs claimed per queue per round')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when no job is due')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due')
+
+    def handle(self, *args, **options):
+        self.check_shared_backends()
+        queues = options['queues'] or list(getattr(settings, 'JOB_QUEUES', {'default': {}}))
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        total = failures = 0
+        self.stdout.write(f"Worker {worker_id} on {', '.join(queues)}")
+        while not self.stopping:
+            ran, failed = run_once(queues, worker_id, options['batch_size'])
+            total += ran
+            failures += failed
+            if not ran:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Ran {total} jobs ({failures} failed)'))
+
+    def check_shared_backends(self):
+        # Handlers invalidate dashboard stats and publish notifications for
+        # the web processes; from here, process-local backends reach no one
+        problems = []
+        if isinstance(stats_cache(), LocMemCache):
+            problems.append('DASHBOARD_STATS_CACHE_ALIAS is a local-memory cache')
+        if not get_broadcast().shared:
+            problems.append('NOTIFICATIONS_BROADCAST_BACKEND only reaches subscribers of the publishing process')
+        if problems:
+            raise CommandError(f"Backends must be shared with the web processes: {'; '.join(problems)}")
+
+    def stop(self, signum, frame):
+        # Finish the round in progress, then exit
+        self.stopping = True
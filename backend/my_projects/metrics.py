@@ -0,0 +1,291 @@
+"""
+Per-endpoint request metrics.
+
+``MetricsMiddleware`` times every request and, through a database execute
+wrapper installed on every connection, counts its SQL statements and the
+time spent in them. Figures are kept per route (the URL name, e.g.
+``task-list``) and method and served in the Prometheus text format by
+``metrics_view`` at ``/metrics``.
+
+Requests over ``METRICS_QUERY_BUDGET`` statements or ``METRICS_LATENCY_BUDGET``
+seconds are logged with their slowest and most repeated statements.
+
+The registry lives in process memory: each worker process reports its own
+figures and is scraped on its own.
+"""
+import hmac
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DEFAULT_QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = '<unmatched>'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket', {**labels, 'le': format_value(bound)}, cumulative
+        yield f'{name}_bucket', {**labels, 'le': '+Inf'}, self.count
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, self.count
+
+
+class Series:
+    """Everything recorded for one route and method."""
+
+    def __init__(self, latency_buckets, query_buckets):
+        self.duration = Histogram(latency_buckets)
+        self.queries = Histogram(query_buckets)
+        self.sql_seconds = 0
+        self.response_bytes = 0
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_labels(labels):
+    return ','.join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+class MetricsRegistry:
+    METRICS = (
+        ('http_request_duration_seconds', 'histogram', 'Request latency.'),
+        ('http_request_queries', 'histogram', 'SQL statements run per request.'),
+        ('http_request_sql_seconds_total', 'counter', 'Time spent in SQL statements.'),
+        ('http_response_size_bytes_total', 'counter', 'Response body bytes sent.'),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, route, method, duration, queries, sql_seconds, response_bytes):
+        with self._lock:
+            series = self._series.get((route, method))
+            if series is None:
+                series = self._series[(route, method)] = Series(
+                    getattr(settings, 'METRICS_LATENCY_BUCKETS', DEFAULT_LATENCY_BUCKETS),
+                    getattr(settings, 'METRICS_QUERY_BUCKETS', DEFAULT_QUERY_BUCKETS),
+                )
+            series.duration.observe(duration)
+            series.queries.observe(queries)
+            series.sql_seconds += sql_seconds
+            series.response_bytes += response_bytes or 0
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def samples(self, name, series, labels):
+        if name == 'http_request_duration_seconds':
+            return series.duration.samples(name, labels)
+        if name == 'http_request_queries':
+            return series.queries.samples(name, labels)
+        if name == 'http_request_sql_seconds_total':
+            return [(name, labels, series.sql_seconds)]
+        return [(name, labels, series.response_bytes)]
+
+    def render(self):
+        lines = []
+        with self._lock:
+            items = sorted(self._series.items())
+            for name, kind, help_text in self.METRICS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for (route, method), series in items:
+                    for sample, labels, value in self.samples(name, series, {'route': route, 'method': method}):
+                        lines.append(f'{sample}{{{format_labels(labels)}}} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class QueryRecorder:
+    """Collects ``(sql, seconds)`` for each statement run while it is ``active()``."""
+
+    def __init__(self):
+        self.queries = []
+
+    @contextmanager
+    def active(self):
+        token = _recorder.set(self)
+        try:
+            yield self
+        finally:
+            _recorder.reset(token)
+
+    @property
+    def sql_seconds(self):
+        return sum(seconds for _, seconds in self.queries)
+
+
+# A context variable rather than a per-request execute_wrapper(): it follows
+# the request into the threads that run async ORM calls
+_recorder = ContextVar('metrics_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.queries.append((sql, time.perf_counter() - start))
+
+
+def install(connection):
+    """Record the statements of ``connection``; called for every new connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.view_name or match.route or UNMATCHED_ROUTE
+
+
+def over_budget(queries, duration):
+    query_budget = getattr(settings, 'METRICS_QUERY_BUDGET', None)
+    latency_budget = getattr(settings, 'METRICS_LATENCY_BUDGET', None)
+    return (
+        (query_budget is not None and queries > query_budget) or
+        (latency_budget is not None and duration > latency_budget)
+    )
+
+
+def log_over_budget(request, route, duration, recorder):
+    limit = getattr(settings, 'METRICS_LOG_STATEMENTS', 5)
+    slowest = sorted(recorder.queries, key=lambda query: query[1], reverse=True)[:limit]
+    repeated = Counter(sql for sql, _ in recorder.queries).most_common(limit)
+    lines = [f'  {seconds * 1000:.1f}ms  {sql}' for sql, seconds in slowest]
+    lines += [f'  {count}x  {sql}' for sql, count in repeated if count > 1]
+    logger.warning(
+        'Request over budget: %s %s (%s) took %.3fs with %d queries (%.3fs in SQL)\n%s',
+        request.method, request.path, route, duration, len(recorder.queries), recorder.sql_seconds,
+        '\n'.join(lines),
+    )
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recorder.active():
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recorder.active():
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, start)
+
+    def finish(self, request, response, recorder, start):
+        if response.streaming:
+            # Exports run their queries while the body is sent: measure that too
+            stream = self.astream if response.is_async else self.stream
+            response.streaming_content = stream(request, response.streaming_content, recorder, start)
+        else:
+            self.record(request, recorder, start, len(response.content))
+        return response
+
+    def stream(self, request, content, recorder, start):
+        size = 0
+        content = iter(content)
+        try:
+            while True:
+                # Only while a chunk is produced: the context is the server's
+                with recorder.active():
+                    chunk = next(content, None)
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.record(request, recorder, start, size)
+
+    async def astream(self, request, content, recorder, start):
+        size = 0
+        content = aiter(content)
+        try:
+            while True:
+                # Queries run in worker threads that copy the context from here
+                with recorder.active():
+                    chunk = await anext(content, None)
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.record(request, recorder, start, size)
+
+    def record(self, request, recorder, start, size):
+        duration = time.perf_counter() - start
+        route = route_of(request)
+        registry.observe(route, request.method, duration, len(recorder.queries), recorder.sql_seconds, size)
+        if over_budget(len(recorder.queries), duration):
+            log_over_budget(request, route, duration, recorder)
+
+
+def metrics_view(request):
+    """Serve the registry to holders of ``METRICS_TOKEN``; to nobody when it is unset."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    given = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(given.encode(), f'Bearer {token}'.encode()):
+        raise Http404
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+def build_rollups(apps, schema_editor):
+    Project = apps.get_model('my_projects', 'Project')
+    ProjectRollup = apps.get_model('my_projects', 'ProjectRollup')
+    today = timezone.localdate()
+    projects = Project.objects.annotate(
+        todo_count=Count('tasks', filter=Q(tasks__status='todo')),
+        in_progress_count=Count('tasks', filter=Q(tasks__status='in_progress')),
+        completed_count=Count('tasks', filter=Q(tasks__status='completed')),
+        overdue_count=Count('tasks', filter=Q(tasks__due_date__lt=today) & ~Q(tasks__status='completed')),
+    ).values('id', 'todo_count', 'in_progress_count', 'completed_count', 'overdue_count')
+    ProjectRollup.objects.bulk_create(
+        [ProjectRollup(project_id=row.pop('id'), overdue_as_of=today, **row) for row in projects.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_projects', '0002_team_created_by'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectRollup',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='my_projects.project')),
+                ('todo_count', models.PositiveIntegerField(default=0)),
+                ('in_progress_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('overdue_count', models.PositiveIntegerField(default=0)),
+                ('overdue_as_of', models.DateField()),
+            ],
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS my_projects_search USING fts5("
+        "title, body, audience, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS my_projects_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_projects', '0004_access_pattern_indexes'),
+    ]
+
+    operations = [
+        # Filled by manage.py rebuild_search_index, then kept in sync by signals
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
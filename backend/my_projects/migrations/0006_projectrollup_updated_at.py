@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_projects', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectrollup',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
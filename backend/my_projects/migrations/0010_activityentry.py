@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_projects', '0009_archivednotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verb', models.CharField(max_length=20)),
+                ('target_type', models.CharField(choices=[('project', 'Project'), ('task', 'Task'), ('team', 'Team')], max_length=10)),
+                ('target_id', models.PositiveBigIntegerField()),
+                ('summary', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='activity_user_created_idx')],
+            },
+        ),
+    ]
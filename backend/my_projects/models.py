@@ -1,12 +1,19 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+
 class User(AbstractUser):
     email = models.EmailField(_('email address'), unique=True)
     first_name = models.CharField(_('first name'), max_length=30)
     last_name = models.CharField(_('last name'), max_length=30)
     profile_image = models.ImageField(upload_to='profile_images/', null=True, blank=True)
+    # Resized copies written by my_projects.images: {'source': <image name>, <variant>: <path>}
+    profile_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     phone = models.CharField(max_length=20, null=True, blank=True)
     location = models.CharField(max_length=100, null=True, blank=True)
     bio = models.TextField(null=True, blank=True)
@@ -19,6 +26,7 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+
 class Project(models.Model):
     STATUS_CHOICES = [
         ('not_started', 'Not Started'),
@@ -37,9 +45,25 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='project_user_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+
+class TaskQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        # IN over the owner's projects rather than a join keeps both arms of
+        # the OR indexable
+        return self.filter(
+            Q(project__in=Project.objects.filter(user=user).values('pk')) |
+            Q(assigned_to=user)
+        )
+
+
 class Task(models.Model):
     PRIORITY_CHOICES = [
         ('low', 'Low'),
@@ -63,9 +87,65 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'status'], name='task_project_status_idx'),
+            models.Index(fields=['assigned_to', 'status'], name='task_assignee_status_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so signal handlers can tell what changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def tracked_values(self):
+        return {
+            'project_id': self.project_id,
+            'assigned_to_id': self.assigned_to_id,
+            'status': self.status,
+            'due_date': self.due_date,
+        }
+
+    def loaded_values(self):
+        """The tracked fields as last read from or written to the database, if known."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or not all(name in loaded for name in self.tracked_values()):
+            return None
+        return {name: loaded[name] for name in self.tracked_values()}
+
+
+class ProjectRollup(models.Model):
+    """Task counters for a project, maintained incrementally from Task writes."""
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='rollup')
+    todo_count = models.PositiveIntegerField(default=0)
+    in_progress_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    overdue_count = models.PositiveIntegerField(default=0)
+    # overdue_count is only exact on this day; older rows are recomputed on read
+    overdue_as_of = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Rollup for {self.project_id}"
+
+    @property
+    def total_tasks(self):
+        return self.todo_count + self.in_progress_count + self.completed_count
+
+    @property
+    def completion_percent(self):
+        if not self.total_tasks:
+            return 0
+        return round(100 * self.completed_count / self.total_tasks)
+
+
 class Comment(models.Model):
     content = models.TextField()
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments')
@@ -73,10 +153,45 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['task', '-created_at', '-id'], name='comment_task_created_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user} on {self.task}"
 
+
+class TeamQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        # A semi-join on the membership table cannot duplicate team rows
+        return self.filter(
+            Q(pk__in=Team.members.through.objects.filter(user=user).values('team_id')) |
+            Q(created_by=user)
+        )
+
+    def with_member_count(self):
+        # Correlated count on the membership table's team_id index, one per team row
+        memberships = Team.members.through.objects.filter(team_id=OuterRef('pk')).order_by().values(
+            'team_id'
+        ).annotate(count=Count('*')).values('count')
+        return self.annotate(member_count=Coalesce(Subquery(memberships), 0))
+
+    def touch(self):
+        """Move ``updated_at`` on for changes kept outside the team row: membership, members' profiles."""
+        return self.update(updated_at=timezone.now())
+
+    def with_members_preview(self, size=None):
+        # Sliced prefetch: at most ``size`` users per team, fetched in one query
+        size = size or Team.MEMBERS_PREVIEW_SIZE
+        return self.prefetch_related(
+            Prefetch('members', queryset=User.objects.order_by('id')[:size], to_attr='preview_members')
+        )
+
+
 class Team(models.Model):
+    MEMBERS_PREVIEW_SIZE = 5
+
     name = models.CharField(max_length=100)
     description = models.TextField()
     members = models.ManyToManyField(User, related_name='teams')
@@ -84,9 +199,12 @@ class Team(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TeamQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+
 class Notification(models.Model):
     message = models.TextField()
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
@@ -95,5 +213,119 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-id'], name='notif_user_timestamp_idx'),
+            # Unread notifications are a small, hot subset: count and list them
+            # without touching read history
+            models.Index(
+                fields=['user', '-timestamp', '-id'],
+                condition=Q(read=False),
+                name='notif_user_unread_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Notification for {self.user}: {self.message[:50]}"
+
+
+class Job(models.Model):
+    """A unit of background work, run by ``manage.py run_jobs`` (see my_projects/jobs.py)."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    ]
+
+    queue = models.CharField(max_length=50, default='default')
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due jobs of a queue
+            models.Index(fields=['queue', 'status', 'run_at', 'id'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class ArchivedNotification(models.Model):
+    """
+    Notifications moved out of the live table by the retention purge
+    (my_projects/retention.py). Rows keep their original id; ``created_at``
+    is not stored separately because it always equals ``timestamp``.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    message = models.TextField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    read = models.BooleanField(default=False)
+    timestamp = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-timestamp', '-id'], name='archnotif_user_timestamp_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived notification for {self.user}: {self.message[:50]}"
+
+
+class ActivityEntry(models.Model):
+    """
+    One event in one user's activity feed, written by the fan-out in
+    my_projects/activity.py. Entries are copied to every affected user and
+    carry their own summary, so a feed page is read from this table alone.
+    """
+    TARGET_CHOICES = [
+        ('project', 'Project'),
+        ('task', 'Task'),
+        ('team', 'Team'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity')
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    verb = models.CharField(max_length=20)
+    target_type = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    target_id = models.PositiveBigIntegerField()
+    summary = models.CharField(max_length=200)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='activity_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.verb} {self.target_type} #{self.target_id} for {self.user_id}"
+
+
+class BroadcastEvent(models.Model):
+    """
+    A notification stream event on its way to the processes holding the
+    user's streams, relayed by ``DatabaseBroadcast`` (my_projects/realtime.py)
+    and pruned once every poller has had time to read it.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    event = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='broadcast_created_idx'),
+        ]
+
     def __str__(self):
-        return f"Notification for {self.user}: {self.message[:50]}"
\ No newline at end of file
+        return f"{self.event.get('type')} for {self.user_id}"
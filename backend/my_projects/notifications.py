@@ -0,0 +1,51 @@
+"""
+Notifications generated by activity (assignments, comments, team changes).
+
+The request only queues a job; a ``run_jobs`` worker writes the rows. Fan-out
+jobs are batched, so a burst of activity, or one team addition with
+thousands of members, becomes a few ``bulk_create`` calls.
+
+The worker is not the process serving the users' dashboards and streams, so
+what it invalidates and publishes goes through backends shared with the web
+processes: the ``DASHBOARD_STATS_CACHE_ALIAS`` cache and a broadcast backend
+that reaches other processes. ``run_jobs`` refuses to start without them.
+"""
+from django.db import transaction
+
+from .jobs import enqueue, handler
+from .models import User, Notification
+from .realtime import get_broadcast, publish_notification
+from .stats import invalidate_dashboard_stats
+
+NOTIFICATION_BATCH_SIZE = 500
+
+
+def notify(user_ids, message):
+    """Queue ``message`` as a notification for each of ``user_ids``."""
+    user_ids = sorted({user_id for user_id in user_ids if user_id is not None})
+    if user_ids:
+        enqueue('notifications.fan_out', {'user_ids': user_ids, 'message': message})
+
+
+@handler('notifications.fan_out', queue='notifications', batch=True)
+def fan_out(payloads):
+    requested = {user_id for payload in payloads for user_id in payload['user_ids']}
+    # Users deleted since the job was queued are skipped
+    existing = set(User.objects.filter(pk__in=requested).values_list('pk', flat=True))
+    notifications = Notification.objects.bulk_create(
+        [
+            Notification(user_id=user_id, message=payload['message'])
+            for payload in payloads for user_id in payload['user_ids'] if user_id in existing
+        ],
+        batch_size=NOTIFICATION_BATCH_SIZE,
+    )
+
+    # bulk_create skips the Notification signal handlers
+    invalidate_dashboard_stats(*existing)
+    subscribed = get_broadcast().subscribed({notification.user_id for notification in notifications})
+    listening = [n for n in notifications if n.user_id in subscribed]
+    if listening:
+        def publish():
+            for notification in listening:
+                publish_notification(notification)
+        transaction.on_commit(publish)
@@ -0,0 +1,179 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over ``(<ordering field>, id)``, newest first.
+
+    The cursor carries the key of the last row sent, and the next page is
+    fetched with ``WHERE (field, id) < (value, pk)``, so page N costs the same
+    index range scan as page 1 and no ``COUNT(*)`` is issued.
+
+    Views choose the ordering field through ``cursor_ordering_field``
+    (``created_at`` by default).
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering_field = 'created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.seek(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([row async for row in self.seek(queryset, request, view)])
+
+    def seek(self, queryset, request, view):
+        """The queryset of the requested page, plus one row to tell whether there is more."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.field = getattr(view, 'cursor_ordering_field', self.ordering_field)
+        self.position, self.reverse = self.decode_cursor(queryset, request)
+
+        # Walk backwards by flipping the comparison and the ordering, then
+        # restore newest-first order on the page itself.
+        if self.reverse:
+            queryset = queryset.order_by(self.field, 'id')
+            lookup = 'gt'
+        else:
+            queryset = queryset.order_by(f'-{self.field}', '-id')
+            lookup = 'lt'
+        if self.position is not None:
+            value, pk = self.position
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{lookup}': value}) |
+                Q(**{self.field: value, f'id__{lookup}': pk})
+            )
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+
+        self.page = rows
+        return rows
+
+    def decode_cursor(self, queryset, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            query = parse.parse_qs(b64decode(encoded.encode('ascii')).decode('ascii'), strict_parsing=True)
+            model_field = queryset.model._meta.get_field(self.field)
+            value = model_field.to_python(query['v'][0])
+            pk = int(query['i'][0])
+            reverse = bool(int(query.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return (value, pk), reverse
+
+    def row_key(self, row):
+        # Pages hold model instances or, for values() querysets, dicts
+        if isinstance(row, dict):
+            return row[self.field], row['id']
+        return getattr(row, self.field), row.pk
+
+    def encode_cursor(self, row, reverse):
+        value, pk = self.row_key(row)
+        tokens = {'v': value.isoformat() if hasattr(value, 'isoformat') else str(value), 'i': pk}
+        if reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens, doseq=True).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class StandardPagination(PageNumberPagination):
+    """
+    Page-number pagination by default; keyset pagination on request.
+
+    Clients opt in with ``?pagination=cursor`` and then follow the ``next`` /
+    ``previous`` links, which carry a ``cursor`` parameter.
+    """
+    mode_query_param = 'pagination'
+    keyset_class = KeysetPagination
+
+    def cursor_requested(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor' or
+            self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.cursor_requested(request):
+            self.keyset = self.keyset_class()
+            self.display_page_controls = False
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset()`` for async views, with the count and the page read by the async ORM."""
+        self.keyset = None
+        if self.cursor_requested(request):
+            self.keyset = self.keyset_class()
+            self.display_page_controls = False
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property: fill it in so page() needs no query
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [row async for row in self.page.object_list]
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
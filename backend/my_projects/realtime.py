@@ -0,0 +1,378 @@
+"""
+Push delivery of notifications to connected clients over Server-Sent Events.
+
+``NotificationStreamApp`` is a plain ASGI application mounted by
+``config/asgi.py``. Events reach it through a broadcast backend chosen by the
+``NOTIFICATIONS_BROADCAST_BACKEND`` setting. Notifications are written by
+``run_jobs`` workers, not by the processes serving the streams, so the
+default relays events through the database; ``InProcessBroadcast`` only
+serves a single process that also runs no jobs.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connections
+from django.db.models import Max
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .authentication import CachedJWTAuthentication
+from .models import BroadcastEvent, Notification
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """A client's queue of pending events, owned by the event loop that created it."""
+    max_pending = 100
+
+    def __init__(self, backend, user_id):
+        self.backend = backend
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+
+    def deliver(self, event):
+        # May be called from any thread, e.g. a sync view handling a write
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop has shut down; the client is gone
+            self.close()
+
+    def _put(self, event):
+        if self.queue.full():
+            # A slow client loses the oldest event rather than blocking writers
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class BroadcastBackend(ABC):
+    """Interface for fanning events out to the subscribers of a user."""
+    # Whether events published by one process reach the subscribers of others
+    shared = True
+
+    @abstractmethod
+    def subscribe(self, user_id):
+        """A new ``Subscription`` to the events of ``user_id``."""
+
+    @abstractmethod
+    def unsubscribe(self, subscription):
+        pass
+
+    @abstractmethod
+    def publish(self, user_id, event):
+        """Deliver ``event`` to every subscription of ``user_id``; callable from any thread."""
+
+    def has_subscribers(self, user_id):
+        # Backends that cannot tell locally must assume someone is listening
+        return True
+
+    def subscribed(self, user_ids):
+        """Those of ``user_ids`` with subscribers."""
+        return {user_id for user_id in user_ids if self.has_subscribers(user_id)}
+
+
+class InProcessBroadcast(BroadcastBackend):
+    """
+    Subscribers kept in this process's memory. Only events published by the
+    same process reach them, so it suits a single ASGI process only.
+    """
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+
+class DatabaseBroadcast(InProcessBroadcast):
+    """
+    Events relayed through the ``BroadcastEvent`` table, so that they reach
+    the subscribers of every process, whichever process publishes them.
+
+    A process with subscribers runs one poller thread, which reads the new
+    events every ``NOTIFICATIONS_BROADCAST_POLL_INTERVAL`` seconds, hands
+    them to the local subscribers and deletes the events older than
+    ``NOTIFICATIONS_BROADCAST_RETENTION`` seconds. It also marks the users
+    it serves as present in the ``NOTIFICATIONS_BROADCAST_CACHE_ALIAS``
+    cache, which ``has_subscribers()`` reads, so nothing is written for
+    users without an open stream.
+    """
+    shared = True
+    # Seconds a user stays present after the last poll that served them
+    presence_timeout = 30
+
+    def __init__(self):
+        super().__init__()
+        self._poller = None
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'NOTIFICATIONS_BROADCAST_CACHE_ALIAS', 'default')]
+
+    @property
+    def interval(self):
+        return getattr(settings, 'NOTIFICATIONS_BROADCAST_POLL_INTERVAL', 0.5)
+
+    @property
+    def retention(self):
+        return getattr(settings, 'NOTIFICATIONS_BROADCAST_RETENTION', 60)
+
+    def presence_key(self, user_id):
+        return f'broadcast_listening:{user_id}'
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self.poll, name='broadcast-poller', daemon=True)
+                self._poller.start()
+        return subscription
+
+    def publish(self, user_id, event):
+        BroadcastEvent.objects.create(user_id=user_id, event=event)
+
+    def has_subscribers(self, user_id):
+        return self.cache.get(self.presence_key(user_id)) is not None
+
+    def subscribed(self, user_ids):
+        present = self.cache.get_many([self.presence_key(user_id) for user_id in user_ids])
+        return {user_id for user_id in user_ids if self.presence_key(user_id) in present}
+
+    def poll(self):
+        """The poller thread: runs until this process has no subscribers left."""
+        last_id = None
+        marked = {}
+        pruned = 0
+        try:
+            while True:
+                with self._lock:
+                    user_ids = set(self._subscribers)
+                    if not user_ids:
+                        self._poller = None
+                        return
+                try:
+                    if last_id is None:
+                        # Events from before the poller started have no subscriber here
+                        last_id = BroadcastEvent.objects.aggregate(last=Max('id'))['last'] or 0
+                    last_id = self.deliver(last_id)
+                    marked = self.mark_present(user_ids, marked)
+                    if time.monotonic() - pruned > self.retention:
+                        BroadcastEvent.objects.filter(
+                            created_at__lt=timezone.now() - timedelta(seconds=self.retention)
+                        ).delete()
+                        pruned = time.monotonic()
+                except Exception:
+                    logger.exception('Polling broadcast events failed')
+                time.sleep(self.interval)
+        finally:
+            connections.close_all()
+
+    def deliver(self, last_id):
+        """Hand the events after ``last_id`` to the local subscribers; returns the last id read."""
+        events = BroadcastEvent.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'user_id', 'event')
+        for last_id, user_id, event in events:
+            super().publish(user_id, event)
+        return last_id
+
+    def mark_present(self, user_ids, marked):
+        """
+        Set the presence of those of ``user_ids`` not marked in the last third
+        of ``presence_timeout``; ``marked`` maps users to when they were.
+        """
+        now = time.monotonic()
+        due = [user_id for user_id in user_ids if now - marked.get(user_id, float('-inf')) > self.presence_timeout / 3]
+        if due:
+            self.cache.set_many({self.presence_key(user_id): True for user_id in due}, self.presence_timeout)
+        # Users who left are forgotten, and their presence left to expire
+        return {user_id: now if user_id in due else marked[user_id] for user_id in user_ids}
+
+
+_broadcast = None
+_broadcast_lock = threading.Lock()
+
+
+def get_broadcast():
+    global _broadcast
+    if _broadcast is None:
+        with _broadcast_lock:
+            if _broadcast is None:
+                backend = getattr(
+                    settings, 'NOTIFICATIONS_BROADCAST_BACKEND', 'my_projects.realtime.InProcessBroadcast'
+                )
+                _broadcast = import_string(backend)()
+    return _broadcast
+
+
+@receiver(setting_changed)
+def broadcast_setting_changed(setting, **kwargs):
+    global _broadcast
+    if setting == 'NOTIFICATIONS_BROADCAST_BACKEND':
+        _broadcast = None
+
+
+def unread_count(user_id):
+    return Notification.objects.filter(user_id=user_id, read=False).count()
+
+
+def publish_notification(notification):
+    from .serializers import NotificationSerializer
+
+    broadcast = get_broadcast()
+    if broadcast.has_subscribers(notification.user_id):
+        broadcast.publish(notification.user_id, {
+            'type': 'notification',
+            'notification': NotificationSerializer(notification).data,
+            'unread_count': unread_count(notification.user_id),
+        })
+
+
+def publish_unread_count(user_id):
+    broadcast = get_broadcast()
+    if broadcast.has_subscribers(user_id):
+        broadcast.publish(user_id, {'type': 'unread_count', 'unread_count': unread_count(user_id)})
+
+
+@sync_to_async
+def authenticate(raw_token):
+    authentication = CachedJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def encode_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n".encode()
+
+
+class NotificationStreamApp:
+    """
+    ASGI endpoint streaming a user's notification events as Server-Sent Events.
+
+    The access token is read from the ``Authorization: Bearer`` header or,
+    because ``EventSource`` cannot set headers, from ``?token=``.
+    """
+
+    def __init__(self, heartbeat=None):
+        self.heartbeat = heartbeat or getattr(settings, 'NOTIFICATIONS_STREAM_HEARTBEAT', 15)
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get('headers', ()))
+        token = self.get_token(scope, headers)
+        user = await authenticate(token) if token else None
+        if user is None:
+            await self.reject(send, headers)
+            return
+
+        subscription = get_broadcast().subscribe(user.pk)
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        pending = None
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                    *self.cors_headers(headers),
+                ],
+            })
+            count = await sync_to_async(unread_count)(user.pk)
+            await self.send_chunk(send, encode_event({'type': 'unread_count', 'unread_count': count}))
+
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    {pending, disconnected}, timeout=self.heartbeat, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnected in done:
+                    break
+                if pending in done:
+                    await self.send_chunk(send, encode_event(pending.result()))
+                    pending = None
+                else:
+                    await self.send_chunk(send, b': keep-alive\n\n')
+        finally:
+            subscription.close()
+            for task in (pending, disconnected):
+                if task is not None:
+                    task.cancel()
+
+    def get_token(self, scope, headers):
+        header = headers.get(b'authorization', b'').decode('latin-1').split()
+        if len(header) == 2 and header[0] in settings.SIMPLE_JWT.get('AUTH_HEADER_TYPES', ('Bearer',)):
+            return header[1]
+        tokens = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+        return tokens[0] if tokens else None
+
+    def cors_headers(self, headers):
+        origin = headers.get(b'origin', b'').decode('latin-1')
+        if origin and origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', ()):
+            return [
+                (b'access-control-allow-origin', origin.encode('latin-1')),
+                (b'access-control-allow-credentials', b'true'),
+            ]
+        return []
+
+    async def reject(self, send, headers):
+        body = json.dumps({'detail': 'Authentication credentials were not provided or are invalid.'}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': 401,
+            'headers': [(b'content-type', b'application/json'), *self.cors_headers(headers)],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def send_chunk(self, send, chunk):
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    async def wait_for_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
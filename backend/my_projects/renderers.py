@@ -0,0 +1,12 @@
+from rest_framework.renderers import JSONRenderer
+
+
+def render_json(response):
+    """
+    Prepare a DRF ``Response`` returned outside a DRF view for rendering as
+    JSON, which content negotiation would do in a view.
+    """
+    response.accepted_renderer = JSONRenderer()
+    response.accepted_media_type = JSONRenderer.media_type
+    response.renderer_context = {}
+    return response
@@ -0,0 +1,279 @@
+"""
+Per-user cache of API read responses.
+
+``GET`` responses of the routes in ``RESPONSE_CACHE_ROUTES`` are kept in the
+``RESPONSE_CACHE_ALIAS`` cache, keyed on the user, the route, the full path
+with its query string and the user's *data version*. A hit is served
+without running the view: no queries, no serialization.
+
+The data version is a per-user value in the same cache. ``bump()`` moves it
+on whenever something the user can see changes (``invalidate_dashboard_stats``
+and the signal handlers call it, see ``signals.py``), which makes every
+response cached for them unreachable; they are never deleted, only left to
+expire after ``RESPONSE_CACHE_TIMEOUT``. Versions are nanosecond timestamps
+rather than counters, so one lost to eviction is never reissued.
+
+Bumps come from every process that writes, ``run_jobs`` included, so the
+cache must be one they all share: file-based for the processes of one host,
+Redis or Memcached for several. On a local-memory cache, where a process
+would keep serving responses another one has invalidated, response caching
+is off. ``stats()`` reports the entries and bytes held by the local-memory
+and file-based backends.
+"""
+import hashlib
+import os
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .authentication import CachedJWTAuthentication
+from .db import in_transaction
+from .renderers import render_json
+
+DEFAULT_ROUTES = ('project-list', 'team-list', 'user-profile', 'notification-unread-count')
+# Per-request headers that must not be replayed from the cache
+SKIPPED_HEADERS = {'content-type', 'content-length'}
+
+
+def usage(cache):
+    """``(entries, bytes)`` held by a local-memory or file-based cache, else None."""
+    if isinstance(cache, LocMemCache):
+        with cache._lock:
+            return len(cache._cache), sum(len(value) for value in cache._cache.values())
+    if isinstance(cache, FileBasedCache):
+        files = cache._list_cache_files()
+        size = 0
+        for name in files:
+            try:
+                size += os.path.getsize(name)
+            except OSError:
+                # Expired and removed meanwhile
+                pass
+        return len(files), size
+    return None
+
+
+class ResponseCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'RESPONSE_CACHE_ENABLED', True) and self.shared
+
+    @property
+    def shared(self):
+        """False when the cache is local to this process, where other processes' bumps go unseen."""
+        return not isinstance(self.cache, LocMemCache)
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+    def routes(self):
+        return getattr(settings, 'RESPONSE_CACHE_ROUTES', DEFAULT_ROUTES)
+
+    def version_key(self, user_id):
+        return f'data_version:{user_id}'
+
+    def key(self, user_id, route, path, version):
+        digest = hashlib.md5(path.encode()).hexdigest()
+        return f'response:{user_id}:{route}:{version}:{digest}'
+
+    def bump(self, *user_ids):
+        """Move the data version of ``user_ids`` on, now and once the current transaction commits."""
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        if not user_ids:
+            return
+        self._bump(user_ids)
+        if in_transaction():
+            # A response built from the state before the commit may have
+            # been stored under the version set above
+            transaction.on_commit(lambda: self._bump(user_ids))
+
+    def _bump(self, user_ids):
+        version = time.time_ns()
+        self.cache.set_many({self.version_key(user_id): version for user_id in user_ids}, None)
+        with self._lock:
+            self.bumps += len(user_ids)
+
+    def version(self, user_id):
+        key = self.version_key(user_id)
+        version = self.cache.get(key)
+        if version is None:
+            # add() so that concurrent first requests agree on one version
+            self.cache.add(key, time.time_ns(), None)
+            version = self.cache.get(key)
+        return version
+
+    def lookup(self, user, route, request):
+        """``(key, entry)``: where the response to ``request`` is cached, and the entry if present."""
+        key = self.key(user.pk, route, request.get_full_path(), self.version(user.pk))
+        entry = self.cache.get(key)
+        self.count(entry is not None)
+        return key, entry
+
+    async def aversion(self, user_id):
+        key = self.version_key(user_id)
+        version = await self.cache.aget(key)
+        if version is None:
+            await self.cache.aadd(key, time.time_ns(), None)
+            version = await self.cache.aget(key)
+        return version
+
+    async def alookup(self, user, route, request):
+        key = self.key(user.pk, route, request.get_full_path(), await self.aversion(user.pk))
+        entry = await self.cache.aget(key)
+        self.count(entry is not None)
+        return key, entry
+
+    def count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def entry(self, response):
+        """What is stored of ``response``, or None when it must not be cached."""
+        if (
+            not isinstance(response, Response) or response.status_code != 200 or
+            getattr(response.accepted_renderer, 'format', None) != 'json'
+        ):
+            return None
+        headers = {name: value for name, value in response.items() if name.lower() not in SKIPPED_HEADERS}
+        with self._lock:
+            self.stores += 1
+        return {'data': response.data, 'headers': headers}
+
+    def respond(self, request, entry):
+        """The response for a cache hit; a 304 when the client's copy is current."""
+        headers = entry['headers']
+        if 'ETag' in headers:
+            last_modified = parse_http_date_safe(headers.get('Last-Modified', ''))
+            response = get_conditional_response(request, etag=headers['ETag'], last_modified=last_modified)
+            if response is not None:
+                for name in ('ETag', 'Last-Modified', 'Cache-Control', 'Vary'):
+                    if name in headers:
+                        response[name] = headers[name]
+                return response
+        return render_json(Response(entry['data'], headers=headers))
+
+    def reset_stats(self):
+        self.hits = self.misses = self.stores = self.bumps = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'bumps': self.bumps,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
+        held = usage(self.cache)
+        stats['entries'], stats['bytes'] = held if held is not None else (None, None)
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def bump(*user_ids):
+    response_cache.bump(*user_ids)
+
+
+def cacheable(request):
+    # Browsers asking for the browsable API get it from the view
+    return (
+        request.method == 'GET' and response_cache.enabled and
+        request.GET.get('format', 'json') == 'json' and 'text/html' not in request.headers.get('Accept', '')
+    )
+
+
+def authenticated(request, result):
+    """
+    The user of an ``authenticate()`` result, handed on to the view through
+    the attributes behind APIClient.force_authenticate(), which DRF's Request
+    honours, so that the view does not authenticate the request again.
+    """
+    if result is None:
+        return None
+    request._force_auth_user, request._force_auth_token = result
+    return result[0]
+
+
+def request_user(request):
+    """The user making ``request``, or None to leave it to the view."""
+    forced = getattr(request, '_force_auth_user', None)
+    if forced is not None:
+        return forced
+    try:
+        return authenticated(request, CachedJWTAuthentication().authenticate(request))
+    except APIException:
+        # The view answers with the error
+        return None
+
+
+async def arequest_user(request):
+    forced = getattr(request, '_force_auth_user', None)
+    if forced is not None:
+        return forced
+    try:
+        return authenticated(request, await CachedJWTAuthentication().aauthenticate(request))
+    except APIException:
+        return None
+
+
+def cached(view, route):
+    """``view`` behind the response cache, if ``route`` is one of ``RESPONSE_CACHE_ROUTES``."""
+    if route not in response_cache.routes():
+        return view
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_cached_view(request, *args, **kwargs):
+            user = await arequest_user(request) if cacheable(request) else None
+            if user is None:
+                return await view(request, *args, **kwargs)
+            key, entry = await response_cache.alookup(user, route, request)
+            if entry is not None:
+                return response_cache.respond(request, entry)
+            response = await view(request, *args, **kwargs)
+            entry = response_cache.entry(response)
+            if entry is not None:
+                await response_cache.cache.aset(key, entry, response_cache.timeout)
+            return response
+        return async_cached_view
+
+    @wraps(view)
+    def cached_view(request, *args, **kwargs):
+        user = request_user(request) if cacheable(request) else None
+        if user is None:
+            return view(request, *args, **kwargs)
+        key, entry = response_cache.lookup(user, route, request)
+        if entry is not None:
+            return response_cache.respond(request, entry)
+        response = view(request, *args, **kwargs)
+        entry = response_cache.entry(response)
+        if entry is not None:
+            response_cache.cache.set(key, entry, response_cache.timeout)
+        return response
+    return cached_view
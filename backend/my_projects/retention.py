@@ -0,0 +1,119 @@
+"""
+Retention for the Notification table.
+
+Policies come from the ``NOTIFICATION_RETENTION`` setting:
+
+``read_max_age_days`` / ``unread_max_age_days``
+    Drop read (unread) notifications older than this many days.
+``max_per_user``
+    Keep only the newest N notifications of each user.
+``archive``
+    Move dropped rows to ``ArchivedNotification`` instead of deleting them.
+
+Any of them may be None to disable it. ``purge()`` works in small batches,
+each in its own short transaction, so on SQLite no write lock is held for
+long. The rows are removed with plain ``DELETE ... WHERE id IN (...)``
+statements, which skip the per-row Notification signals. The side effects
+(stats, unread counts) are applied once per batch.
+"""
+import time
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+from .realtime import publish_unread_count
+from .stats import invalidate_dashboard_stats
+
+DEFAULT_POLICY = {
+    'read_max_age_days': 90,
+    'unread_max_age_days': None,
+    'max_per_user': None,
+    'archive': False,
+}
+
+
+def retention_policy(**overrides):
+    return {**DEFAULT_POLICY, **getattr(settings, 'NOTIFICATION_RETENTION', {}), **overrides}
+
+
+def expired(policy, now=None):
+    """One queryset per enabled rule, each selecting the notifications it drops."""
+    now = now or timezone.now()
+    rules = []
+    for read, key in ((True, 'read_max_age_days'), (False, 'unread_max_age_days')):
+        if policy[key] is not None:
+            rules.append(Notification.objects.filter(read=read, timestamp__lt=now - timedelta(days=policy[key])))
+
+    keep = policy['max_per_user']
+    if keep is not None:
+        crowded = (
+            Notification.objects.order_by().values('user_id')
+            .annotate(total=Count('id')).filter(total__gt=keep).values_list('user_id', flat=True)
+        )
+        for user_id in crowded:
+            # The newest row past the quota: it and everything older goes
+            boundary = Notification.objects.filter(user_id=user_id).order_by('-timestamp', '-id').values(
+                'timestamp', 'id'
+            )[keep]
+            rules.append(
+                Notification.objects.filter(user_id=user_id, timestamp__lt=boundary['timestamp']) |
+                Notification.objects.filter(user_id=user_id, timestamp=boundary['timestamp'], id__lte=boundary['id'])
+            )
+    return rules
+
+
+def purge_batch(ids, archive):
+    """Archive (optionally) and delete the notifications ``ids``; returns how many went."""
+    with transaction.atomic():
+        rows = list(
+            Notification.objects.filter(pk__in=ids)
+            .values('id', 'message', 'user_id', 'read', 'timestamp', 'updated_at')
+        )
+        if not rows:
+            return 0
+        if archive:
+            ArchivedNotification.objects.bulk_create(
+                [ArchivedNotification(**row) for row in rows], ignore_conflicts=True
+            )
+        placeholders = ', '.join(['%s'] * len(rows))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {Notification._meta.db_table} WHERE id IN ({placeholders})',
+                [row['id'] for row in rows],
+            )
+
+        # What the skipped post_delete handlers would have done
+        invalidate_dashboard_stats(*{row['user_id'] for row in rows})
+        for user_id in {row['user_id'] for row in rows if not row['read']}:
+            transaction.on_commit(lambda user_id=user_id: publish_unread_count(user_id))
+    return len(rows)
+
+
+def purge(policy=None, batch_size=500, pause=0, dry_run=False):
+    """
+    Apply ``policy`` (the configured one by default). Yields the running
+    total of rows removed (or, with ``dry_run``, that would be) after each batch.
+    """
+    policy = policy or retention_policy()
+    rules = expired(policy)
+    if dry_run:
+        # Rules may overlap; count each row once
+        yield reduce(or_, rules).count() if rules else 0
+        return
+    total = 0
+    for queryset in rules:
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            total += purge_batch(ids, policy['archive'])
+            yield total
+            if pause:
+                # Let other writers in between batches
+                time.sleep(pause)
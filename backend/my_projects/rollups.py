@@ -0,0 +1,127 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Project, ProjectRollup, Task
+
+STATUS_COUNT_FIELDS = {value: f'{value}_count' for value, _ in Task.STATUS_CHOICES}
+COUNT_FIELDS = (*STATUS_COUNT_FIELDS.values(), 'overdue_count')
+
+
+def is_overdue(status, due_date, today):
+    return status != 'completed' and due_date is not None and due_date < today
+
+
+def compute_rollups(project_ids, today):
+    """Aggregate the counters for ``project_ids`` straight from the Task table."""
+    annotations = {
+        field: Count('id', filter=Q(status=value))
+        for value, field in STATUS_COUNT_FIELDS.items()
+    }
+    annotations['overdue_count'] = Count(
+        'id', filter=Q(due_date__lt=today) & ~Q(status='completed')
+    )
+    rows = (
+        Task.objects.filter(project_id__in=project_ids)
+        .order_by()
+        .values('project_id')
+        .annotate(**annotations)
+    )
+    computed = {project_id: dict.fromkeys(COUNT_FIELDS, 0) for project_id in project_ids}
+    for row in rows:
+        computed[row.pop('project_id')] = row
+    return computed
+
+
+def rebuild_rollups(project_ids, today=None, commit=True):
+    """
+    Recompute the rollups of ``project_ids`` in one aggregate query.
+
+    Returns ``(rollups, mismatched)``: the up-to-date rollup objects keyed by
+    project id, and the ids whose stored counters (if any) were wrong. With
+    ``commit=False`` nothing is written, which is how rollups are verified.
+    """
+    today = today or timezone.localdate()
+    now = timezone.now()
+    project_ids = list(project_ids)
+    computed = compute_rollups(project_ids, today)
+    existing = ProjectRollup.objects.in_bulk(project_ids)
+
+    rollups, to_create, to_update, mismatched = {}, [], [], []
+    for project_id in project_ids:
+        values = computed[project_id]
+        rollup = existing.get(project_id)
+        if rollup is None:
+            rollup = ProjectRollup(project_id=project_id, overdue_as_of=today, **values)
+            to_create.append(rollup)
+            mismatched.append(project_id)
+        else:
+            # A stale overdue_count is expected, not corruption
+            compared = COUNT_FIELDS if rollup.overdue_as_of == today else STATUS_COUNT_FIELDS.values()
+            if any(getattr(rollup, field) != values[field] for field in compared):
+                mismatched.append(project_id)
+            for field, value in values.items():
+                setattr(rollup, field, value)
+            rollup.overdue_as_of = today
+            rollup.updated_at = now
+            to_update.append(rollup)
+        rollups[project_id] = rollup
+
+    if commit:
+        ProjectRollup.objects.bulk_create(to_create, ignore_conflicts=True)
+        ProjectRollup.objects.bulk_update(to_update, [*COUNT_FIELDS, 'overdue_as_of', 'updated_at'])
+    return rollups, mismatched
+
+
+def apply_task_change(old, new):
+    """
+    Move a task's contribution from ``old`` to ``new`` (tracked-value dicts,
+    either may be None for create/delete) with one UPDATE per project touched.
+    """
+    today = timezone.localdate()
+    deltas = defaultdict(Counter)
+    for values, sign in ((old, -1), (new, 1)):
+        if values is None:
+            continue
+        project_deltas = deltas[values['project_id']]
+        field = STATUS_COUNT_FIELDS.get(values['status'])
+        if field:
+            project_deltas[field] += sign
+        if is_overdue(values['status'], values['due_date'], today):
+            project_deltas['overdue_count'] += sign
+
+    stale = []
+    for project_id, project_deltas in deltas.items():
+        changes = {field: F(field) + delta for field, delta in project_deltas.items() if delta}
+        if not changes:
+            continue
+        # Only rows whose overdue count is current can be adjusted in place
+        updated = ProjectRollup.objects.filter(
+            project_id=project_id, overdue_as_of=today
+        ).update(updated_at=timezone.now(), **changes)
+        if not updated:
+            stale.append(project_id)
+    if stale:
+        # Missing rollups are left to refresh_stale_rollups(); recreating one
+        # here could race the cascade delete of its project.
+        stale = ProjectRollup.objects.filter(project_id__in=stale).values_list('project_id', flat=True)
+        rebuild_rollups(stale, today)
+
+
+def refresh_stale_rollups(projects):
+    """Rebuild missing or day-old rollups for already-fetched ``projects``."""
+    today = timezone.localdate()
+    stale = {}
+    for project in projects:
+        if not Project.rollup.is_cached(project):
+            # Not part of this response (e.g. excluded by ?fields=)
+            continue
+        rollup = getattr(project, 'rollup', None)
+        if rollup is None or rollup.overdue_as_of < today:
+            stale[project.pk] = project
+    if stale:
+        rollups, _ = rebuild_rollups(stale, today)
+        for project_id, project in stale.items():
+            project.rollup = rollups[project_id]
+    return projects
@@ -0,0 +1,153 @@
+"""
+Full-text search over projects, tasks and comments, backed by an SQLite FTS5 table.
+
+Each searchable row is one FTS document whose rowid encodes the object
+(``pk * 4 + kind``), so writes replace a document by rowid without scanning
+the index. The ``audience`` column holds a ``u<id>`` token for every user
+allowed to see the row, which lets visibility be checked inside the same
+MATCH instead of joining back to the model tables.
+"""
+from django.db import connection, transaction
+
+from .models import Project, Task, Comment
+
+SEARCH_TABLE = 'my_projects_search'
+KINDS = {'project': 1, 'task': 2, 'comment': 3}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+# bm25() column weights: title, body, audience
+RANK_WEIGHTS = (10.0, 1.0, 0.0)
+
+
+def search_available():
+    return connection.vendor == 'sqlite'
+
+
+def document_rowid(kind, pk):
+    return pk * 4 + KINDS[kind]
+
+
+def audience(*user_ids):
+    return ' '.join(f'u{user_id}' for user_id in sorted(set(user_ids)) if user_id is not None)
+
+
+def project_document(row):
+    return (document_rowid('project', row['id']), row['title'], row['description'], audience(row['user_id']))
+
+
+def task_document(row):
+    return (
+        document_rowid('task', row['id']), row['title'], row['description'],
+        audience(row['project__user_id'], row['assigned_to_id']),
+    )
+
+
+def comment_document(row):
+    return (document_rowid('comment', row['id']), '', row['content'], audience(row['task__project__user_id']))
+
+
+# kind -> (model, values() fields, document builder)
+SOURCES = {
+    'project': (Project, ('id', 'title', 'description', 'user_id'), project_document),
+    'task': (Task, ('id', 'title', 'description', 'project__user_id', 'assigned_to_id'), task_document),
+    'comment': (Comment, ('id', 'content', 'task__project__user_id'), comment_document),
+}
+
+
+def write_documents(documents):
+    if not search_available() or not documents:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(doc[0],) for doc in documents])
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, title, body, audience) VALUES (%s, %s, %s, %s)',
+            documents,
+        )
+
+
+def index_objects(kind, queryset):
+    """(Re)index the ``kind`` rows selected by ``queryset``."""
+    model, fields, build = SOURCES[kind]
+    write_documents([build(row) for row in queryset.values(*fields)])
+
+
+def remove_object(kind, pk):
+    if not search_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [document_rowid(kind, pk)])
+
+
+def remove_range(kind, after_pk, last_pk=None):
+    """Drop the ``kind`` documents of primary keys above ``after_pk``, up to ``last_pk`` if given."""
+    if not search_available():
+        return
+    sql = f'DELETE FROM {SEARCH_TABLE} WHERE rowid > %s AND rowid %% 4 = %s'
+    params = [document_rowid(kind, after_pk), KINDS[kind]]
+    if last_pk is not None:
+        sql += ' AND rowid <= %s'
+        params.append(document_rowid(kind, last_pk))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def reindex(kind, chunk_size=2000):
+    """
+    Rebuild every document of ``kind``, walking the table by primary key in
+    chunks of ``chunk_size``. Yields the running total after each chunk.
+    """
+    model, fields, build = SOURCES[kind]
+    last_pk, total = 0, 0
+    while True:
+        rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values(*fields)[:chunk_size])
+        with transaction.atomic():
+            # The documents of the chunk's key range go with it, including
+            # those of rows deleted since, so the rest of the index stays
+            # searchable during the rebuild
+            remove_range(kind, last_pk, rows[-1]['id'] if rows else None)
+            if not rows:
+                return
+            write_documents([build(row) for row in rows])
+        last_pk = rows[-1]['id']
+        total += len(rows)
+        yield total
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 expression: every term must match, last one as a prefix."""
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in query.split()]
+    if not terms:
+        return None
+    terms[-1] += '*'
+    return '{title body} : (' + ' AND '.join(terms) + ')'
+
+
+def search(user, query, kinds=None, limit=20, offset=0):
+    """Ranked documents visible to ``user``; returns ``limit + 1`` rows at most so callers can page."""
+    expression = match_expression(query)
+    if not search_available() or expression is None:
+        return []
+    expression = f'({expression}) AND audience : "u{user.pk}"'
+    sql = (
+        f'SELECT rowid, title, snippet({SEARCH_TABLE}, 1, \'[\', \']\', \'…\', 12), '
+        f'bm25({SEARCH_TABLE}, %s, %s, %s) AS rank '
+        f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+    )
+    params = [*RANK_WEIGHTS, expression]
+    if kinds:
+        sql += ' AND rowid %% 4 IN ({})'.format(', '.join('%s' for _ in kinds))
+        params += [KINDS[kind] for kind in kinds]
+    sql += ' ORDER BY rank LIMIT %s OFFSET %s'
+    params += [limit + 1, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {
+                'type': KIND_NAMES[rowid % 4],
+                'id': rowid // 4,
+                'title': title,
+                'snippet': snippet,
+                'rank': rank,
+            }
+            for rowid, title, snippet, rank in cursor.fetchall()
+        ]
@@ -1,16 +1,151 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth import get_user_model
-from .models import Project, Task, Comment, Team, Notification
+from .images import variant_urls
+from .models import Project, ProjectRollup, Task, Comment, Team, Notification, ArchivedNotification, ActivityEntry
 
 User = get_user_model()
 
-class UserSerializer(serializers.ModelSerializer):
+def parse_field_paths(value):
+    """Parse ``a,b.c,b.d`` into ``{'a': {}, 'b': {'c': {}, 'd': {}}}``."""
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+def merge_field_paths(first, second):
+    merged = {name: dict(subtree) for name, subtree in first.items()}
+    for name, subtree in second.items():
+        merged[name] = merge_field_paths(merged.get(name, {}), subtree)
+    return merged
+
+def requested_shape(request):
+    """The ``(fields, expand)`` trees asked for by a read request; writes get the default shape."""
+    if request is None or request.method not in SAFE_METHODS:
+        return {}, {}
+    return (
+        parse_field_paths(request.query_params.get('fields')),
+        parse_field_paths(request.query_params.get('expand')),
+    )
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets and opt-in expansion of relations.
+
+    Relations in ``expandable_fields`` render as primary keys unless named in
+    ``?expand=`` (dotted for deeper levels, e.g. ``project.user``). ``?fields=``
+    keeps only the listed fields; a dotted name such as ``project.title``
+    selects inside a relation and implies expanding it.
+    """
+    # field name -> (serializer class, extra serializer kwargs)
+    expandable_fields = {}
+    # relations read by always-rendered fields, loaded when the field is kept
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    # fields left out unless named in ?fields= or ?expand=
+    deferred_fields = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            fields, expand = requested_shape(self.context.get('request'))
+        fields, expand = fields or {}, expand or {}
+
+        expanded = self.expanded(fields, expand)
+        for name, subtree in expanded.items():
+            serializer_class, options = self.expandable_fields[name]
+            self.fields[name] = serializer_class(
+                fields=fields.get(name, {}), expand=subtree, read_only=True, **options
+            )
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        else:
+            for name in set(self.deferred_fields) - set(expanded):
+                self.fields.pop(name, None)
+
+    @classmethod
+    def expanded(cls, fields, expand):
+        expand = merge_field_paths(expand, {name: {} for name, subtree in fields.items() if subtree})
+        return {
+            name: subtree for name, subtree in expand.items()
+            if name in cls.expandable_fields and (not fields or name in fields)
+        }
+
+    @classmethod
+    def renders(cls, name, fields):
+        """Whether unexpanded field ``name`` is part of the shape selected by ``fields``."""
+        return name in fields if fields else name not in cls.deferred_fields
+
+    @classmethod
+    def related_lookups(cls, model, fields, expand, prefix=''):
+        """``select_related`` and ``prefetch_related`` paths needed to render the requested shape."""
+        select = [prefix + name for name in cls.select_related_fields if cls.renders(name, fields)]
+        prefetch = [prefix + name for name in cls.prefetch_related_fields if cls.renders(name, fields)]
+        for name, subtree in cls.expanded(fields, expand).items():
+            serializer_class, _ = cls.expandable_fields[name]
+            field = model._meta.get_field(name)
+            path = prefix + name
+            nested_select, nested_prefetch = serializer_class.related_lookups(
+                field.related_model, fields.get(name, {}), subtree, path + '__'
+            )
+            if field.many_to_many or field.one_to_many:
+                prefetch += [path, *nested_select, *nested_prefetch]
+            else:
+                select += [path, *nested_select]
+                prefetch += nested_prefetch
+        return select, prefetch
+
+    @classmethod
+    def timestamp_lookups(cls, model, fields, expand, prefix=''):
+        """
+        ``updated_at`` lookups of the row and of every single-valued relation
+        rendered with it, expanded or always embedded, for validating the
+        response (see ConditionalGetMixin). Embedded collections are left to
+        their owner, which moves its own ``updated_at`` on (``Team.touch()``).
+        """
+        lookups = [prefix + 'updated_at'] if has_updated_at(model) else []
+        for name in cls.select_related_fields:
+            field = model._meta.get_field(name)
+            if cls.renders(name, fields) and has_updated_at(field.related_model):
+                lookups.append(f'{prefix}{name}__updated_at')
+        for name, subtree in cls.expanded(fields, expand).items():
+            serializer_class, _ = cls.expandable_fields[name]
+            field = model._meta.get_field(name)
+            if not (field.many_to_many or field.one_to_many):
+                lookups += serializer_class.timestamp_lookups(
+                    field.related_model, fields.get(name, {}), subtree, f'{prefix}{name}__'
+                )
+        return lookups
+
+def has_updated_at(model):
+    return any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+
+def with_requested_relations(queryset, serializer_class, request):
+    """Join or prefetch exactly the relations the response will render."""
+    select, prefetch = serializer_class.related_lookups(queryset.model, *requested_shape(request))
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    profile_image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ('id', 'email', 'first_name', 'last_name', 'profile_image', 
+        fields = ('id', 'email', 'first_name', 'last_name', 'profile_image', 'profile_image_variants',
                  'phone', 'location', 'bio', 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
+    def get_profile_image_variants(self, user):
+        # Empty until the resized copies of the current image exist
+        return variant_urls(user, self.context.get('request'))
+
 class UserCreateSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     username = serializers.CharField(required=True)
@@ -32,23 +167,42 @@ class UserCreateSerializer(serializers.ModelSerializer):
         except Exception as e:
             raise serializers.ValidationError(str(e))
 
-class ProjectSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class ProjectRollupSerializer(serializers.ModelSerializer):
+    total_tasks = serializers.IntegerField(read_only=True)
+    completion_percent = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ProjectRollup
+        fields = ('todo_count', 'in_progress_count', 'completed_count', 'overdue_count',
+                 'overdue_as_of', 'total_tasks', 'completion_percent')
+        read_only_fields = fields
+
+class ProjectSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    rollup = ProjectRollupSerializer(read_only=True)
+
+    expandable_fields = {'user': (UserSerializer, {})}
+    select_related_fields = ('rollup',)
 
     class Meta:
         model = Project
         fields = ('id', 'title', 'description', 'start_date', 'end_date',
-                 'status', 'progress', 'user', 'created_at', 'updated_at')
+                 'status', 'progress', 'rollup', 'user', 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
-class TaskSerializer(serializers.ModelSerializer):
-    project = ProjectSerializer(read_only=True)
+class TaskSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    project = serializers.PrimaryKeyRelatedField(read_only=True)
     project_id = serializers.PrimaryKeyRelatedField(
         queryset=Project.objects.all(),
         source='project',
         write_only=True
     )
-    assigned_to = UserSerializer(read_only=True)
+    assigned_to = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    expandable_fields = {
+        'project': (ProjectSerializer, {}),
+        'assigned_to': (UserSerializer, {}),
+    }
 
     class Meta:
         model = Task
@@ -56,26 +210,107 @@ class TaskSerializer(serializers.ModelSerializer):
                  'status', 'project', 'project_id', 'assigned_to', 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
-class CommentSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class CommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    expandable_fields = {
+        'task': (TaskSerializer, {}),
+        'user': (UserSerializer, {}),
+    }
 
     class Meta:
         model = Comment
         fields = ('id', 'content', 'task', 'user', 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
-class TeamSerializer(serializers.ModelSerializer):
-    members = UserSerializer(many=True, read_only=True)
+class TeamSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    PREVIEW_FIELDS = {
+        name: {} for name in ('id', 'email', 'first_name', 'last_name', 'profile_image', 'profile_image_variants')
+    }
+
+    members = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    member_count = serializers.SerializerMethodField()
+    members_preview = serializers.SerializerMethodField()
+
+    expandable_fields = {'members': (UserSerializer, {'many': True})}
+    prefetch_related_fields = ('members',)
+    # The full list can be huge; it is paged at /teams/<id>/members/
+    deferred_fields = ('members',)
 
     class Meta:
         model = Team
-        fields = ('id', 'name', 'description', 'members', 'created_at', 'updated_at')
+        fields = ('id', 'name', 'description', 'members', 'member_count', 'members_preview',
+                 'created_at', 'updated_at')
         read_only_fields = ('id', 'created_at', 'updated_at')
 
-class NotificationSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+    def get_member_count(self, team):
+        # Annotated by TeamQuerySet.with_member_count() on reads
+        count = getattr(team, 'member_count', None)
+        return team.members.count() if count is None else count
+
+    def get_members_preview(self, team):
+        users = getattr(team, 'preview_members', None)
+        if users is None:
+            users = team.members.order_by('id')[:Team.MEMBERS_PREVIEW_SIZE]
+        return UserSerializer(users, many=True, fields=self.PREVIEW_FIELDS, context=self.context).data
+
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    expandable_fields = {'user': (UserSerializer, {})}
 
     class Meta:
         model = Notification
         fields = ('id', 'message', 'user', 'read', 'timestamp', 'created_at', 'updated_at')
-        read_only_fields = ('id', 'created_at', 'updated_at')
\ No newline at end of file
+        read_only_fields = ('id', 'created_at', 'updated_at')
+
+class ArchivedNotificationSerializer(NotificationSerializer):
+    """Archived rows in the live shape; the archive keeps a single timestamp."""
+    created_at = serializers.DateTimeField(source='timestamp', read_only=True)
+
+    class Meta(NotificationSerializer.Meta):
+        model = ArchivedNotification
+        read_only_fields = NotificationSerializer.Meta.fields
+
+class ActivityEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ActivityEntry
+        fields = ('id', 'verb', 'target_type', 'target_id', 'summary', 'actor', 'created_at')
+        read_only_fields = fields
+
+BULK_MAX_IDS = 1000
+
+class NotificationBulkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), required=False, max_length=BULK_MAX_IDS
+    )
+
+class TaskBulkUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_IDS
+    )
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Task.PRIORITY_CHOICES, required=False)
+    assigned_to = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False)
+
+    def validate(self, attrs):
+        if len(attrs) < 2:
+            raise serializers.ValidationError('Provide at least one of status, priority or assigned_to.')
+        return attrs
+
+class TeamMembersSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=BULK_MAX_IDS
+    )
+
+BATCH_MAX_REQUESTS = 20
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE'), default='GET')
+    path = serializers.RegexField(r'^/', max_length=2000)
+    body = serializers.JSONField(required=False)
+
+class BatchSerializer(serializers.Serializer):
+    requests = serializers.ListField(
+        child=BatchItemSerializer(), allow_empty=False, max_length=BATCH_MAX_REQUESTS
+    )
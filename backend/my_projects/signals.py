@@ -0,0 +1,316 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import activity, db, images, metrics, response_cache, search
+from .authentication import user_cache
+from .models import User, Project, ProjectRollup, Task, Comment, Team, Notification
+from .notifications import notify
+from .realtime import publish_notification, publish_unread_count
+from .rollups import apply_task_change, rebuild_rollups
+from .stats import invalidate_dashboard_stats
+
+
+def _task_user_ids(*values):
+    """Owners and assignees for the given Task.tracked_values() dicts."""
+    values = [v for v in values if v is not None]
+    project_ids = {v['project_id'] for v in values}
+    owner_ids = Project.objects.filter(pk__in=project_ids).values_list('user_id', flat=True)
+    return [*owner_ids, *(v['assigned_to_id'] for v in values)]
+
+
+def _team_user_ids(team):
+    return [team.created_by_id, *team.members.values_list('id', flat=True)]
+
+
+def _deleted_directly(instance, origin):
+    """False when ``instance`` goes in the cascade of deleting something else."""
+    return origin is instance or (isinstance(origin, QuerySet) and origin.model is type(instance))
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    db.configure_connection(connection)
+    metrics.install(connection)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    invalidate_dashboard_stats(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_seen_changed(sender, instance, raw=False, **kwargs):
+    # Teammates list the user, owners of the projects they work on expand them
+    if not raw:
+        images.bump_viewers(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def user_teams_touched(sender, instance, created, raw=False, **kwargs):
+    # Teams embed their members, but validate on their own updated_at
+    if not created and not raw:
+        Team.objects.filter(members=instance).touch()
+
+
+@receiver(post_save, sender=User)
+def user_image_saved(sender, instance, raw=False, **kwargs):
+    if not raw and not images.is_current(instance):
+        images.schedule_profile_image(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Covers deactivation and password changes seen by authentication
+    user_cache.invalidate(getattr(instance, jwt_settings.USER_ID_FIELD))
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def project_changed(sender, instance, **kwargs):
+    invalidate_dashboard_stats(instance.user_id)
+
+
+@receiver(post_save, sender=Project)
+def project_seen_changed(sender, instance, created, **kwargs):
+    # Assignees see the project through their tasks
+    if not created:
+        response_cache.bump(
+            *Task.objects.filter(project=instance).values_list('assigned_to_id', flat=True).distinct()
+        )
+
+
+@receiver(post_save, sender=Project)
+def project_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProjectRollup.objects.get_or_create(project=instance, defaults={'overdue_as_of': timezone.localdate()})
+
+
+@receiver(post_save, sender=Project)
+def project_indexed(sender, instance, **kwargs):
+    search.index_objects('project', Project.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Project)
+def project_unindexed(sender, instance, **kwargs):
+    search.remove_object('project', instance.pk)
+
+
+@receiver(post_save, sender=Project)
+def project_activity(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        activity.record(
+            'created', 'project', instance.pk, instance.title, [instance.user_id], actor_id=instance.user_id
+        )
+    else:
+        activity.record(
+            'updated', 'project', instance.pk, instance.title, [instance.user_id], project_id=instance.pk
+        )
+
+
+@receiver(pre_delete, sender=Project)
+def project_deleting_activity(sender, instance, origin=None, **kwargs):
+    # Before the cascade, while the assignees of its tasks can still be found
+    if _deleted_directly(instance, origin):
+        assignees = Task.objects.filter(project=instance).values_list('assigned_to_id', flat=True).distinct()
+        activity.record('deleted', 'project', instance.pk, instance.title, [instance.user_id, *assignees])
+
+
+@receiver(post_save, sender=Task)
+def task_activity(sender, instance, created, raw=False, **kwargs):
+    # Connected ahead of task_saved, which moves the loaded values on
+    if raw:
+        return
+    old = None if created else instance.loaded_values()
+    new = instance.tracked_values()
+    verb = 'created' if created else activity.task_verb(old, new)
+    activity.record(verb, 'task', instance.pk, instance.title, _task_user_ids(old, new))
+
+
+@receiver(post_save, sender=Task)
+def task_assigned(sender, instance, created, raw=False, **kwargs):
+    # Also connected ahead of task_saved, for the assignee as loaded
+    if raw:
+        return
+    if not created:
+        # An instance whose assignee was never loaded may not have changed it
+        old = instance.loaded_values()
+        if old is None or old['assigned_to_id'] == instance.assigned_to_id:
+            return
+    # Owners assigning work to themselves are not told about it
+    if instance.assigned_to_id != instance.project.user_id:
+        notify([instance.assigned_to_id], f'You were assigned to the task "{instance.title}"')
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created, raw=False, **kwargs):
+    old = None if created else instance.loaded_values()
+    new = instance.tracked_values()
+    invalidate_dashboard_stats(*_task_user_ids(old, new))
+    if not raw:
+        if created or old is not None:
+            apply_task_change(old, new)
+        else:
+            # Saved without having been loaded: the previous project is unknown
+            rebuild_rollups([instance.project_id])
+    search.index_objects('task', Task.objects.filter(pk=instance.pk))
+    if old is not None and old['project_id'] != new['project_id']:
+        # Comment visibility follows the owner of the task's project
+        search.index_objects('comment', Comment.objects.filter(task=instance))
+    instance._loaded_values = new
+
+
+@receiver(pre_delete, sender=Task)
+def task_deleting(sender, instance, **kwargs):
+    invalidate_dashboard_stats(*_task_user_ids(instance.tracked_values()))
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, **kwargs):
+    apply_task_change(instance.loaded_values() or instance.tracked_values(), None)
+    search.remove_object('task', instance.pk)
+
+
+@receiver(pre_delete, sender=Task)
+def task_deleting_activity(sender, instance, origin=None, **kwargs):
+    # A deleted project is one feed entry, not one per task
+    if _deleted_directly(instance, origin):
+        activity.record('deleted', 'task', instance.pk, instance.title, _task_user_ids(instance.tracked_values()))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, **kwargs):
+    search.index_objects('comment', Comment.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if not created or raw:
+        return
+    task = Task.objects.filter(pk=instance.task_id).values('title', 'project__user_id', 'assigned_to_id').get()
+    recipients = {task['project__user_id'], task['assigned_to_id']} - {instance.user_id}
+    notify(recipients, f'New comment on the task "{task["title"]}"')
+    activity.record(
+        'commented', 'task', instance.task_id, task['title'], [*recipients, instance.user_id],
+        actor_id=instance.user_id
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # Comments are listed to the owner of the task's project
+    response_cache.bump(*Project.objects.filter(tasks=instance.task_id).values_list('user_id', flat=True))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    search.remove_object('comment', instance.pk)
+
+
+@receiver(post_save, sender=Team)
+@receiver(pre_delete, sender=Team)
+def team_changed(sender, instance, **kwargs):
+    invalidate_dashboard_stats(*_team_user_ids(instance))
+
+
+@receiver(post_save, sender=Team)
+def team_activity(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        activity.record(
+            'created', 'team', instance.pk, instance.name, [instance.created_by_id], actor_id=instance.created_by_id
+        )
+    else:
+        activity.record('updated', 'team', instance.pk, instance.name, [instance.created_by_id], team_id=instance.pk)
+
+
+@receiver(pre_delete, sender=Team)
+def team_deleting_activity(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(instance, origin):
+        activity.record('deleted', 'team', instance.pk, instance.name, _team_user_ids(instance))
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def team_members_activity(sender, instance, action, reverse, pk_set, **kwargs):
+    # One entry per team and change, however many members it touched
+    verbs = {'post_add': 'members_added', 'post_remove': 'members_removed', 'pre_clear': 'members_removed'}
+    if action not in verbs or (action != 'pre_clear' and not pk_set):
+        return
+    if reverse:
+        teams = Team.objects.filter(pk__in=pk_set) if pk_set else instance.teams.all()
+        user_ids = [instance.pk]
+    else:
+        teams = [instance]
+        # team_id reaches whoever is a member when the job runs; the removed are named
+        user_ids = list(pk_set) if pk_set else list(instance.members.values_list('id', flat=True))
+    for team in teams:
+        activity.record(verbs[action], 'team', team.pk, team.name, [*user_ids, team.created_by_id], team_id=team.pk)
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def team_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # user.teams.add(...): every member of the touched teams is affected
+        teams = Team.objects.filter(pk__in=pk_set) if pk_set else instance.teams.all()
+        user_ids = [instance.pk]
+        for team in teams:
+            user_ids.extend(_team_user_ids(team))
+    else:
+        user_ids = [*_team_user_ids(instance), *(pk_set or ())]
+    invalidate_dashboard_stats(*user_ids)
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def team_members_added(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        for team in Team.objects.filter(pk__in=pk_set).exclude(created_by=instance):
+            notify([instance.pk], f'You were added to the team "{team.name}"')
+    else:
+        notify(pk_set - {instance.created_by_id}, f'You were added to the team "{instance.name}"')
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def team_membership_touched(sender, instance, action, reverse, pk_set, **kwargs):
+    # Membership lives outside the team row; bump updated_at so conditional
+    # GETs on teams notice
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            Team.objects.filter(pk=instance.pk).touch()
+    elif action == 'pre_clear':
+        instance.teams.touch()
+    elif pk_set:
+        Team.objects.filter(pk__in=pk_set).touch()
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def notification_changed(sender, instance, **kwargs):
+    invalidate_dashboard_stats(instance.user_id)
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_notification(instance))
+    else:
+        transaction.on_commit(lambda: publish_unread_count(instance.user_id))
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: publish_unread_count(instance.user_id))
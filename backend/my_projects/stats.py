@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import IntegerField, Subquery
+
+from .db import run_concurrently
+from .models import Project, Task, Team, Notification, User
+from .response_cache import bump
+from .serializers import NotificationSerializer
+
+PENDING_TASK_STATUSES = ('todo', 'in_progress')
+RECENT_ACTIVITIES_LIMIT = 5
+
+
+class SubqueryCount(Subquery):
+    """Scalar ``COUNT(*)`` over an arbitrary queryset, usable in annotate()."""
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) _count)'
+    output_field = IntegerField()
+
+
+def stats_cache():
+    """Where snapshots are kept; shared with ``run_jobs``, whose writes invalidate them too."""
+    return caches[getattr(settings, 'DASHBOARD_STATS_CACHE_ALIAS', 'default')]
+
+
+def stats_cache_key(user_id):
+    return f'dashboard_stats:{user_id}'
+
+
+def dashboard_counters(user):
+    """
+    All counters come back from a single statement: each total is a scalar
+    subquery evaluated against the user's row.
+    """
+    tasks = Task.objects.visible_to(user).order_by().values('id')
+    team_members = Team.members.through.objects.filter(
+        team__in=Team.objects.visible_to(user).values('id')
+    ).order_by().values('user_id').distinct()
+
+    return User.objects.filter(pk=user.pk).annotate(
+        total_projects=SubqueryCount(Project.objects.filter(user=user).order_by().values('id')),
+        total_tasks=SubqueryCount(tasks),
+        pending_tasks=SubqueryCount(tasks.filter(status__in=PENDING_TASK_STATUSES)),
+        total_team_members=SubqueryCount(team_members),
+    ).values('total_projects', 'total_tasks', 'pending_tasks', 'total_team_members').get()
+
+
+def recent_activities(user):
+    notifications = Notification.objects.filter(user=user).order_by('-timestamp')[:RECENT_ACTIVITIES_LIMIT]
+    return NotificationSerializer(notifications, many=True).data
+
+
+def compute_dashboard_stats(user):
+    """
+    Build the dashboard snapshot for ``user``: the database is hit once for
+    the numbers and once for the recent activities.
+    """
+    return {**dashboard_counters(user), 'recent_activities': recent_activities(user)}
+
+
+async def acompute_dashboard_stats(user):
+    """``compute_dashboard_stats()`` with both queries running at once."""
+    counters, activities = await run_concurrently((dashboard_counters, user), (recent_activities, user))
+    return {**counters, 'recent_activities': activities}
+
+
+def get_dashboard_stats(user):
+    """Return the cached snapshot for ``user``, computing it on a miss."""
+    key = stats_cache_key(user.pk)
+    data = stats_cache().get(key)
+    if data is None:
+        data = compute_dashboard_stats(user)
+        stats_cache().set(key, data, getattr(settings, 'DASHBOARD_STATS_CACHE_TIMEOUT', 300))
+    return data
+
+
+async def aget_dashboard_stats(user):
+    key = stats_cache_key(user.pk)
+    data = await stats_cache().aget(key)
+    if data is None:
+        data = await acompute_dashboard_stats(user)
+        await stats_cache().aset(key, data, getattr(settings, 'DASHBOARD_STATS_CACHE_TIMEOUT', 300))
+    return data
+
+
+def invalidate_dashboard_stats(*user_ids):
+    """
+    Drop the snapshots of ``user_ids``; called wherever their data changes,
+    so their cached responses are made stale along with them.
+    """
+    bump(*user_ids)
+    keys = [stats_cache_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if keys:
+        stats_cache().delete_many(keys)
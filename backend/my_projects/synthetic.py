@@ -0,0 +1,275 @@
+"""
+Synthetic datasets for load testing, written with ``bulk_create``.
+
+The shape follows production: a few very large teams and many small ones,
+task counts per project that vary widely, and mostly read notifications.
+Rows are generated lazily and inserted ``batch_size`` at a time, so millions
+of tasks never sit in memory at once. Each batch commits on its own, so the
+write lock is released between batches and a failure keeps what was written
+before it. ``bulk_create`` skips the model signals; the search documents
+they would have maintained are written with each batch, the rollups and
+cached stats at the end, failure or not.
+"""
+import random
+import re
+import time
+from array import array
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import BigIntegerField, Max
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+from . import search
+from .models import User, Project, Task, Comment, Team, Notification
+from .rollups import rebuild_rollups
+from .stats import invalidate_dashboard_stats
+
+SCALES = {
+    'small': {
+        'users': 50, 'teams': 5, 'team_size': 20, 'projects_per_user': 2,
+        'tasks': 2_000, 'comments': 4_000, 'notifications': 5_000,
+    },
+    'medium': {
+        'users': 1_000, 'teams': 50, 'team_size': 200, 'projects_per_user': 3,
+        'tasks': 100_000, 'comments': 200_000, 'notifications': 200_000,
+    },
+    'large': {
+        'users': 10_000, 'teams': 200, 'team_size': 2_000, 'projects_per_user': 5,
+        'tasks': 2_000_000, 'comments': 4_000_000, 'notifications': 5_000_000,
+    },
+}
+
+FIRST_NAMES = ('Amina', 'Youssef', 'Sara', 'Omar', 'Lina', 'Karim', 'Nora', 'Adam', 'Salma', 'Mehdi')
+LAST_NAMES = ('Alaoui', 'Benali', 'Chraibi', 'Idrissi', 'Tazi', 'Fassi', 'Berrada', 'Naciri')
+WORDS = (
+    'api', 'billing', 'dashboard', 'migration', 'onboarding', 'report', 'search', 'mobile',
+    'invoice', 'release', 'audit', 'export', 'login', 'cache', 'schema', 'review',
+)
+# Relative frequency of each choice
+TASK_STATUSES = (('todo', 4), ('in_progress', 2), ('completed', 5))
+TASK_PRIORITIES = (('low', 3), ('medium', 5), ('high', 2))
+PROJECT_STATUSES = (('not_started', 1), ('in_progress', 4), ('completed', 2), ('on_hold', 1))
+READ_RATIO = 0.7
+ROLLUP_BATCH_SIZE = 500
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class DatasetGenerator:
+    """
+    Generate ``users`` users (named ``<prefix><n>``, all with ``password``)
+    and the teams, projects, tasks, comments and notifications around them.
+    ``run()`` returns the number of rows written per model.
+    """
+
+    def __init__(self, users, teams, team_size, projects_per_user, tasks, comments, notifications,
+                 batch_size=5000, seed=None, prefix='user', password='password', progress=None):
+        self.scale = {
+            'users': users, 'teams': teams, 'team_size': team_size, 'projects_per_user': projects_per_user,
+            'tasks': tasks, 'comments': comments, 'notifications': notifications,
+        }
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.password = password
+        self.progress = progress or (lambda model, written: None)
+        self.today = timezone.localdate()
+        self.counts = {}
+
+    def choice(self, weighted):
+        values, weights = zip(*weighted)
+        return self.rng.choices(values, weights)[0]
+
+    def words(self, count):
+        return ' '.join(self.rng.choices(WORDS, k=count))
+
+    def run(self):
+        # Filled as batches commit, so that a failed run can be tidied up
+        self.user_ids = array('q')
+        self.projects = {}
+        try:
+            self.create_users()
+            self.create_teams()
+            self.create_projects()
+            self.task_ids = self.create_tasks()
+            self.create_comments()
+            self.create_notifications()
+        finally:
+            self.refresh_rollups()
+            invalidate_dashboard_stats(*self.user_ids)
+        return self.counts
+
+    def insert(self, model, objects, label=None):
+        """
+        bulk_create ``objects`` in batches, yielding each batch once written.
+        A batch commits once the caller is done with it, along with what the
+        caller wrote for it (e.g. search documents).
+        """
+        label = label or model._meta.model_name
+        written = 0
+        for batch in batches(objects, self.batch_size):
+            with transaction.atomic():
+                created = model.objects.bulk_create(batch)
+                yield created
+            written += len(created)
+            self.progress(label, written)
+        self.counts[label] = written
+
+    def create_users(self):
+        # Numbered on from the highest existing <prefix><n>: a count would
+        # reuse a number when others with the prefix exist or some were deleted
+        numbered = User.objects.filter(username__regex=rf'^{re.escape(self.prefix)}[0-9]+$')
+        last = numbered.aggregate(
+            last=Max(Cast(Substr('username', len(self.prefix) + 1), BigIntegerField()))
+        )['last']
+        start = 0 if last is None else last + 1
+        # Hashing is deliberately slow; every generated user shares one hash
+        password = make_password(self.password)
+        users = (
+            User(
+                username=f'{self.prefix}{n}', email=f'{self.prefix}{n}@example.com', password=password,
+                first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES),
+            )
+            for n in range(start, start + self.scale['users'])
+        )
+        for created in self.insert(User, users):
+            self.user_ids.extend(user.pk for user in created)
+
+    def team_size(self):
+        # Pareto-distributed around the configured mean: most teams are
+        # small, a few hold a large share of the users
+        size = int(self.scale['team_size'] * self.rng.paretovariate(1.5) / 3) + 1
+        return min(size, len(self.user_ids))
+
+    def create_teams(self):
+        teams = (
+            Team(
+                name=f'{self.words(2).title()} team {n}', description=self.words(8),
+                created_by_id=self.rng.choice(self.user_ids),
+            )
+            for n in range(self.scale['teams'])
+        )
+        team_ids = [team.pk for created in self.insert(Team, teams) for team in created]
+        Membership = Team.members.through
+        memberships = (
+            Membership(team_id=team_id, user_id=user_id)
+            for team_id in team_ids
+            for user_id in self.rng.sample(self.user_ids, self.team_size())
+        )
+        for _ in self.insert(Membership, memberships, label='membership'):
+            pass
+
+    def create_projects(self):
+        def projects():
+            n = 0
+            for user_id in self.user_ids:
+                for _ in range(self.scale['projects_per_user']):
+                    start = self.today - timedelta(days=self.rng.randint(0, 365))
+                    yield Project(
+                        title=f'{self.words(2).title()} {n}', description=self.words(20),
+                        start_date=start, end_date=start + timedelta(days=self.rng.randint(14, 270)),
+                        status=self.choice(PROJECT_STATUSES), user_id=user_id,
+                    )
+                    n += 1
+
+        for created in self.insert(Project, projects()):
+            search.write_documents([
+                search.project_document({
+                    'id': project.pk, 'title': project.title, 'description': project.description,
+                    'user_id': project.user_id,
+                })
+                for project in created
+            ])
+            # Last, once nothing else can roll the batch back
+            self.projects.update((project.pk, project.user_id) for project in created)
+
+    def create_tasks(self):
+        project_ids = list(self.projects)
+        if not project_ids:
+            self.counts['task'] = 0
+            return array('q')
+        # Skewed: some projects get far more tasks than others
+        cum_weights = list(accumulate(self.rng.paretovariate(1.2) for _ in project_ids))
+
+        def tasks():
+            for n in range(self.scale['tasks']):
+                project_id = self.rng.choices(project_ids, cum_weights=cum_weights)[0]
+                owner_id = self.projects[project_id]
+                yield Task(
+                    title=f'{self.words(3).capitalize()} {n}', description=self.words(15),
+                    due_date=self.today + timedelta(days=self.rng.randint(-60, 120)),
+                    priority=self.choice(TASK_PRIORITIES), status=self.choice(TASK_STATUSES),
+                    project_id=project_id,
+                    assigned_to_id=owner_id if self.rng.random() < 0.5 else self.rng.choice(self.user_ids),
+                )
+
+        # Parallel arrays: a task's id and its project owner, for the comments
+        self.task_owners = array('q')
+        task_ids = array('q')
+        for created in self.insert(Task, tasks()):
+            task_ids.extend(task.pk for task in created)
+            self.task_owners.extend(self.projects[task.project_id] for task in created)
+            search.write_documents([
+                search.task_document({
+                    'id': task.pk, 'title': task.title, 'description': task.description,
+                    'project__user_id': self.projects[task.project_id], 'assigned_to_id': task.assigned_to_id,
+                })
+                for task in created
+            ])
+        return task_ids
+
+    def create_comments(self):
+        if not self.task_ids:
+            self.counts['comment'] = 0
+            return
+
+        def comments():
+            for _ in range(self.scale['comments']):
+                i = self.rng.randrange(len(self.task_ids))
+                comment = Comment(
+                    content=self.words(12).capitalize(), task_id=self.task_ids[i],
+                    user_id=self.rng.choice(self.user_ids),
+                )
+                comment._project_owner_id = self.task_owners[i]
+                yield comment
+
+        for created in self.insert(Comment, comments()):
+            search.write_documents([
+                search.comment_document({
+                    'id': comment.pk, 'content': comment.content,
+                    'task__project__user_id': comment._project_owner_id,
+                })
+                for comment in created
+            ])
+
+    def create_notifications(self):
+        notifications = (
+            Notification(
+                user_id=self.rng.choice(self.user_ids), message=f'Task "{self.words(3)}" was updated',
+                read=self.rng.random() < READ_RATIO,
+            )
+            for _ in range(self.scale['notifications'])
+        )
+        for _ in self.insert(Notification, notifications):
+            pass
+
+    def refresh_rollups(self):
+        for project_ids in batches(self.projects, ROLLUP_BATCH_SIZE):
+            with transaction.atomic():
+                rebuild_rollups(project_ids, self.today)
+
+
+def generate(scale='small', **overrides):
+    """Generate a dataset of a named ``scale``, with any of its sizes overridden; returns the row counts."""
+    options = {**SCALES[scale], **{key: value for key, value in overrides.items() if value is not None}}
+    started = time.perf_counter()
+    counts = DatasetGenerator(**options).run()
+    return counts, time.perf_counter() - started
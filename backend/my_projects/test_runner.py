@@ -0,0 +1,30 @@
+"""
+Test runner that moves the file-based caches into a directory of the run's
+own, so tests neither see nor leave entries in the ``shared`` cache that the
+development server and ``run_jobs`` use. The directory is removed afterwards.
+"""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class IsolatedCacheRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='my_projects_test_cache_')
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, config in caches.items():
+            if config['BACKEND'].endswith('.FileBasedCache'):
+                config['LOCATION'] = os.path.join(self.cache_dir, alias)
+        self.cache_settings = override_settings(CACHES=caches)
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
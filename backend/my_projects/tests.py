@@ -1,29 +1,1840 @@
-from django.test import TestCase
-from .models import Project, Task
-from datetime import date
+import asyncio
+import json
+import re
+from io import BytesIO, StringIO
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+from . import views
+from .models import (
+    User, Project, ProjectRollup, Task, Comment, Team, Notification, Job, ArchivedNotification, ActivityEntry
+)
+from .realtime import NotificationStreamApp, get_broadcast
+from .stats import stats_cache
+from datetime import date, timedelta
+
+def create_user(name='owner', **fields):
+    """A user called ``name``, signing in as ``<name>@example.com`` with password ``pass``."""
+    return User.objects.create_user(**{
+        'email': f'{name}@example.com', 'username': name, 'password': 'pass',
+        'first_name': name.capitalize(), 'last_name': 'User', **fields,
+    })
+
+class OwnerMixin:
+    """
+    Sets up ``self.user`` and ``self.client`` signed in as them, with a JWT
+    when ``authenticate_with_token`` is set and forced otherwise.
+    """
+    authenticate_with_token = False
+
+    def setUp(self):
+        super().setUp()
+        # Earlier tests' entries are keyed on the same user ids
+        caches['shared'].clear()
+        self.user = create_user()
+        self.client = APIClient()
+        if self.authenticate_with_token:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        else:
+            self.client.force_authenticate(self.user)
+
+class OwnerTestCase(OwnerMixin, TestCase):
+    pass
 
 class ProjectModelTest(TestCase):
     def test_create_project(self):
+        user = create_user()
         project = Project.objects.create(
-            name='Test Project',
+            title='Test Project',
             description='Test description',
             start_date=date.today(),
-            status='Not Started'
+            end_date=date.today(),
+            status='not_started',
+            user=user
         )
         self.assertEqual(str(project), 'Test Project')
 
 class TaskModelTest(TestCase):
     def test_create_task(self):
+        user = create_user()
         project = Project.objects.create(
-            name='Test Project',
+            title='Test Project',
             description='Test description',
             start_date=date.today(),
-            status='Not Started'
+            end_date=date.today(),
+            status='not_started',
+            user=user
         )
         task = Task.objects.create(
             project=project,
             title='Test Task',
             description='Task details',
-            due_date=date.today()
+            due_date=date.today(),
+            assigned_to=user
         )
         self.assertEqual(str(task), 'Test Task')
+
+class DashboardStatsTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = create_user('other')
+        self.project = Project.objects.create(
+            title='Test Project', description='Test description',
+            start_date=date.today(), end_date=date.today(), user=self.user
+        )
+        for task_status in ('todo', 'in_progress', 'completed'):
+            Task.objects.create(
+                title=task_status, description='', due_date=date.today(),
+                status=task_status, project=self.project, assigned_to=self.other
+            )
+        team = Team.objects.create(name='Team', description='', created_by=self.user)
+        team.members.add(self.user, self.other)
+        Notification.objects.create(user=self.user, message='Hello')
+        stats_cache().clear()
+        self.url = reverse('user-dashboard-stats')
+
+    def test_counts(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_projects'], 1)
+        self.assertEqual(response.data['total_tasks'], 3)
+        self.assertEqual(response.data['pending_tasks'], 2)
+        self.assertEqual(response.data['total_team_members'], 2)
+        self.assertEqual(len(response.data['recent_activities']), 1)
+
+    def test_warm_load_is_served_from_snapshot(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['total_tasks'], 3)
+
+    def test_snapshot_invalidated_on_write(self):
+        self.client.get(self.url)
+        Task.objects.create(
+            title='new', description='', due_date=date.today(),
+            project=self.project, assigned_to=self.other
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['total_tasks'], 4)
+        self.assertEqual(response.data['pending_tasks'], 3)
+
+class QueryBudgetTest(OwnerTestCase):
+    """List endpoints must cost a fixed number of queries, whatever the page holds."""
+
+    # endpoint -> queries allowed for one (authenticated) list request,
+    # including the ETag validator aggregate
+    BUDGETS = {
+        'project-list': 3,
+        'task-list': 3,
+        'comment-list': 3,
+        'team-list': 4,
+        'notification-list': 3,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.created = 0
+
+    def add_rows(self, count):
+        for _ in range(count):
+            self.created += 1
+            n = self.created
+            assignee = User.objects.create_user(
+                email=f'member{n}@example.com', username=f'member{n}', password='pass',
+                first_name='Member', last_name=str(n)
+            )
+            project = Project.objects.create(
+                title=f'Project {n}', description='', start_date=date.today(),
+                end_date=date.today(), user=self.user
+            )
+            task = Task.objects.create(
+                title=f'Task {n}', description='', due_date=date.today(),
+                project=project, assigned_to=assignee
+            )
+            Comment.objects.create(task=task, user=assignee, content='Looks good')
+            team = Team.objects.create(name=f'Team {n}', description='', created_by=self.user)
+            team.members.add(assignee)
+            Notification.objects.create(user=self.user, message=f'Notification {n}')
+
+    def count_queries(self, url_name):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_list_endpoints_stay_within_budget(self):
+        self.add_rows(2)
+        small = {name: self.count_queries(name) for name in self.BUDGETS}
+        self.add_rows(8)
+        full = {name: self.count_queries(name) for name in self.BUDGETS}
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(endpoint=name):
+                self.assertLessEqual(full[name], budget)
+                self.assertEqual(small[name], full[name])
+
+class KeysetPaginationTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        Notification.objects.bulk_create(
+            Notification(user=self.user, message=f'Notification {n}') for n in range(25)
+        )
+
+    def test_walks_every_row_once_newest_first(self):
+        url = reverse('notification-list') + '?pagination=cursor'
+        seen, query_counts = [], []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            query_counts.append(len(ctx))
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        expected = list(
+            Notification.objects.order_by('-timestamp', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        # ETag validator + page
+        self.assertEqual(query_counts, [2, 2, 2])
+
+    def test_previous_link_returns_the_prior_page(self):
+        first = self.client.get(reverse('notification-list') + '?pagination=cursor')
+        self.assertIsNone(first.data['previous'])
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [row['id'] for row in back.data['results']],
+            [row['id'] for row in first.data['results']]
+        )
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('notification-list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_project_list_is_paginated(self):
+        response = self.client.get(reverse('project-list'))
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(response.data['results'], [])
+
+    def test_project_and_team_pages_are_newest_first(self):
+        for n in range(3):
+            Project.objects.create(
+                title=f'Project {n}', description='', start_date=date.today(),
+                end_date=date.today(), user=self.user
+            )
+            Team.objects.create(name=f'Team {n}', description='', created_by=self.user)
+        for url_name, model in (('project-list', Project), ('team-list', Team)):
+            with self.subTest(url_name=url_name):
+                response = self.client.get(reverse(url_name))
+                self.assertEqual(
+                    [row['id'] for row in response.data['results']],
+                    list(model.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+                )
+
+class ProjectRollupTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = self.make_project('First')
+        self.other_project = self.make_project('Second')
+
+    def make_project(self, title):
+        return Project.objects.create(
+            title=title, description='', start_date=date.today(),
+            end_date=date.today(), user=self.user
+        )
+
+    def make_task(self, **kwargs):
+        fields = {
+            'title': 'Task', 'description': '', 'due_date': date.today(),
+            'project': self.project, 'assigned_to': self.user,
+        }
+        fields.update(kwargs)
+        return Task.objects.create(**fields)
+
+    def counts(self, project):
+        rollup = ProjectRollup.objects.get(project=project)
+        return (rollup.todo_count, rollup.in_progress_count, rollup.completed_count, rollup.overdue_count)
+
+    def test_incremental_updates(self):
+        overdue = self.make_task(due_date=date.today() - timedelta(days=1))
+        self.make_task(status='completed')
+        self.assertEqual(self.counts(self.project), (1, 0, 1, 1))
+
+        task = Task.objects.get(pk=overdue.pk)
+        task.status = 'completed'
+        task.save()
+        self.assertEqual(self.counts(self.project), (0, 0, 2, 0))
+
+        task.project = self.other_project
+        task.save()
+        self.assertEqual(self.counts(self.project), (0, 0, 1, 0))
+        self.assertEqual(self.counts(self.other_project), (0, 0, 1, 0))
+
+        Task.objects.get(pk=task.pk).delete()
+        self.assertEqual(self.counts(self.other_project), (0, 0, 0, 0))
+        self.assertEqual(ProjectRollup.objects.get(project=self.project).completion_percent, 100)
+
+    def test_stale_overdue_count_is_refreshed_on_read(self):
+        self.make_task(due_date=date.today() - timedelta(days=1))
+        ProjectRollup.objects.filter(project=self.project).update(
+            overdue_count=0, overdue_as_of=date.today() - timedelta(days=1)
+        )
+        response = self.client.get(reverse('project-detail', args=[self.project.pk]))
+        self.assertEqual(response.data['rollup']['overdue_count'], 1)
+        self.assertEqual(response.data['rollup']['total_tasks'], 1)
+
+    def test_rebuild_command_repairs_drift(self):
+        self.make_task()
+        ProjectRollup.objects.filter(project=self.project).update(todo_count=7)
+        out = StringIO()
+        call_command('rebuild_project_rollups', '--verify', stdout=out)
+        self.assertIn('1 mismatched', out.getvalue())
+        self.assertEqual(self.counts(self.project)[0], 7)
+        call_command('rebuild_project_rollups', stdout=StringIO())
+        self.assertEqual(self.counts(self.project)[0], 1)
+
+class BulkActionsTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stranger = create_user('stranger')
+
+    def test_mark_all_read(self):
+        Notification.objects.bulk_create(
+            Notification(user=user, message='Hi') for user in (self.user, self.user, self.user, self.stranger)
+        )
+        first = Notification.objects.filter(user=self.user).first()
+        response = self.client.post(reverse('notification-mark-all-read'), {'ids': [first.pk]}, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('notification-mark-all-read'), {}, format='json')
+        statements = [q['sql'] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('UPDATE'))
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(Notification.objects.filter(read=False).count(), 1)
+
+    def test_bulk_task_update(self):
+        project = Project.objects.create(
+            title='Mine', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+        foreign = Project.objects.create(
+            title='Theirs', description='', start_date=date.today(), end_date=date.today(), user=self.stranger
+        )
+        tasks = [
+            Task.objects.create(title='Task', description='', due_date=date.today(), project=p, assigned_to=p.user)
+            for p in (project, project, foreign)
+        ]
+        response = self.client.post(reverse('task-bulk-update'), {
+            'ids': [task.pk for task in tasks], 'status': 'completed', 'priority': 'high',
+        }, format='json')
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(Task.objects.filter(status='completed', priority='high').count(), 2)
+        self.assertEqual(ProjectRollup.objects.get(project=project).completed_count, 2)
+        self.assertEqual(ProjectRollup.objects.get(project=foreign).completed_count, 0)
+
+        response = self.client.post(reverse('task-bulk-update'), {'ids': [tasks[0].pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_team_members(self):
+        team = Team.objects.create(name='Team', description='', created_by=self.user)
+        members = [
+            User.objects.create(email=f'm{n}@example.com', username=f'm{n}', first_name='M', last_name=str(n))
+            for n in range(3)
+        ]
+        url = reverse('team-add-members', args=[team.pk])
+        response = self.client.post(url, {'user_ids': [m.pk for m in members] + [999999]}, format='json')
+        self.assertEqual(response.data, {'added': 3, 'not_found': [999999]})
+        response = self.client.post(url, {'user_ids': [members[0].pk]}, format='json')
+        self.assertEqual(response.data['added'], 0)
+
+        url = reverse('team-remove-members', args=[team.pk])
+        response = self.client.post(url, {'user_ids': [members[0].pk, members[1].pk]}, format='json')
+        self.assertEqual(response.data, {'removed': 2})
+        self.assertEqual(list(team.members.all()), [members[2]])
+
+@override_settings(NOTIFICATIONS_BROADCAST_BACKEND='my_projects.realtime.InProcessBroadcast')
+class NotificationStreamTest(TestCase):
+    scope = {'type': 'http', 'method': 'GET', 'path': '/api/notifications/stream/', 'headers': []}
+
+    def create_notification(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=user, message='Task assigned')
+
+    async def test_pushes_new_notifications(self):
+        user = await sync_to_async(create_user)()
+        scope = {**self.scope, 'query_string': f'token={AccessToken.for_user(user)}'.encode()}
+        communicator = ApplicationCommunicator(NotificationStreamApp(), scope)
+        await communicator.send_input({'type': 'http.request'})
+
+        start = await communicator.receive_output(timeout=5)
+        self.assertEqual(start['status'], 200)
+        initial = await communicator.receive_output(timeout=5)
+        self.assertTrue(initial['body'].startswith(b'event: unread_count\n'))
+
+        await sync_to_async(self.create_notification)(user)
+        message = await communicator.receive_output(timeout=5)
+        event = json.loads(message['body'].decode().split('data: ', 1)[1])
+        self.assertEqual(event['type'], 'notification')
+        self.assertEqual(event['notification']['message'], 'Task assigned')
+        self.assertEqual(event['unread_count'], 1)
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(timeout=5)
+        self.assertFalse(get_broadcast().has_subscribers(user.pk))
+
+    def test_backends_must_implement_the_interface(self):
+        from .realtime import BroadcastBackend
+
+        class Incomplete(BroadcastBackend):
+            def publish(self, user_id, event):
+                pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    async def test_rejects_missing_token(self):
+        communicator = ApplicationCommunicator(NotificationStreamApp(), {**self.scope, 'query_string': b''})
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(timeout=5)
+        self.assertEqual(start['status'], 401)
+
+
+@override_settings(
+    NOTIFICATIONS_BROADCAST_BACKEND='my_projects.realtime.DatabaseBroadcast', NOTIFICATIONS_BROADCAST_POLL_INTERVAL=0.01
+)
+class DatabaseBroadcastTest(TransactionTestCase):
+    # The poller thread reads committed events on its own connection
+
+    async def test_relays_events_between_processes(self):
+        from .realtime import DatabaseBroadcast
+
+        user = await sync_to_async(create_user)()
+        subscription = get_broadcast().subscribe(user.pk)
+        # run_jobs, or another web worker, with a broadcast of its own
+        worker = DatabaseBroadcast()
+        for _ in range(100):
+            if await sync_to_async(worker.has_subscribers)(user.pk):
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(await sync_to_async(worker.subscribed)({user.pk, user.pk + 1}), {user.pk})
+
+        await sync_to_async(worker.publish)(user.pk, {'type': 'unread_count', 'unread_count': 1})
+        event = await asyncio.wait_for(subscription.get(), timeout=5)
+        self.assertEqual(event, {'type': 'unread_count', 'unread_count': 1})
+
+        subscription.close()
+        poller = get_broadcast()._poller
+        if poller is not None:
+            await sync_to_async(poller.join)(5)
+        self.assertIsNone(get_broadcast()._poller)
+
+class QueryPlanTest(OwnerTestCase):
+    """Every viewset's main query must be answered from indexes, never a full table scan."""
+
+    VIEWSETS = {
+        views.ProjectViewSet: 'created_at',
+        views.TaskViewSet: 'created_at',
+        views.CommentViewSet: 'created_at',
+        views.TeamViewSet: 'created_at',
+        views.NotificationViewSet: 'timestamp',
+        views.ActivityViewSet: 'created_at',
+    }
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        scans = [
+            line for line in plan.splitlines()
+            if re.search(r'\bSCAN\b', line) and 'CONSTANT ROW' not in line
+        ]
+        self.assertEqual(scans, [], f'Full scan in query plan:\n{plan}')
+
+    def test_viewset_queries_use_indexes(self):
+        for viewset, ordering_field in self.VIEWSETS.items():
+            request = Request(APIRequestFactory().get('/'))
+            request.user = self.user
+            queryset = viewset(request=request, action='list').get_queryset()
+            with self.subTest(viewset=viewset.__name__):
+                self.assertNoFullScan(queryset)
+                self.assertNoFullScan(queryset.order_by(f'-{ordering_field}', '-id'))
+
+    def test_unread_notifications_use_partial_index(self):
+        queryset = Notification.objects.filter(user=self.user, read=False)
+        self.assertNoFullScan(queryset)
+        self.assertIn('notif_user_unread_idx', queryset.explain())
+
+class SearchTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stranger = create_user('stranger')
+        self.project = Project.objects.create(
+            title='Website redesign', description='New landing page',
+            start_date=date.today(), end_date=date.today(), user=self.user
+        )
+        self.task = Task.objects.create(
+            title='Draft landing copy', description='Hero section text', due_date=date.today(),
+            project=self.project, assigned_to=self.user
+        )
+        Comment.objects.create(task=self.task, user=self.user, content='Landing looks great')
+        hidden = Project.objects.create(
+            title='Landing secrets', description='', start_date=date.today(),
+            end_date=date.today(), user=self.stranger
+        )
+        Task.objects.create(
+            title='Hidden landing task', description='', due_date=date.today(),
+            project=hidden, assigned_to=self.stranger
+        )
+
+    def search(self, **params):
+        return self.client.get(reverse('search-list'), params)
+
+    def test_ranked_and_scoped_to_user(self):
+        response = self.search(q='landing')
+        self.assertEqual(response.status_code, 200)
+        found = [(row['type'], row['id']) for row in response.data['results']]
+        self.assertEqual(len(found), 3)
+        self.assertIn(('project', self.project.pk), found)
+        self.assertIn(('task', self.task.pk), found)
+        # The only title match outranks the body-only matches
+        self.assertEqual(found[0], ('task', self.task.pk))
+
+    def test_prefix_type_filter_and_sync_on_write(self):
+        response = self.search(q='redes', type='project')
+        self.assertEqual([row['id'] for row in response.data['results']], [self.project.pk])
+
+        self.task.title = 'Write onboarding email'
+        self.task.save()
+        self.assertEqual(self.search(q='onboarding').data['results'][0]['id'], self.task.pk)
+        self.task.delete()
+        self.assertEqual(self.search(q='onboarding').data['results'], [])
+
+    def test_bulk_reassignment_moves_the_audience(self):
+        from .search import search
+
+        previous, current = create_user('previous'), create_user('current')
+        task = Task.objects.create(
+            title='Secretplan', description='', due_date=date.today(), project=self.project, assigned_to=previous
+        )
+        self.assertEqual([hit['id'] for hit in search(previous, 'Secretplan')], [task.pk])
+        response = self.client.post(
+            reverse('task-bulk-update'), {'ids': [task.pk], 'assigned_to': current.pk}, format='json'
+        )
+        self.assertEqual(response.data, {'updated': 1})
+        self.assertEqual(search(previous, 'Secretplan'), [])
+        self.assertEqual([hit['id'] for hit in search(current, 'Secretplan')], [task.pk])
+
+    def test_punctuation_only_query(self):
+        self.assertEqual(self.search(q='- "').status_code, 200)
+        self.assertEqual(self.search().status_code, 400)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM my_projects_search')
+        call_command('rebuild_search_index', '--chunk-size', '1', stdout=StringIO())
+        self.assertEqual(len(self.search(q='landing').data['results']), 3)
+
+    def test_rebuild_replaces_one_chunk_at_a_time(self):
+        from .search import document_rowid, reindex, write_documents
+
+        later = Task.objects.create(
+            title='Follow-up', description='', due_date=date.today(), project=self.project, assigned_to=self.user
+        )
+        # Left behind by a row deleted without its signal handlers
+        write_documents([(document_rowid('task', later.pk + 1), 'Orphan', '', f'u{self.user.pk}')])
+        rebuild = reindex('task', chunk_size=1)
+        next(rebuild)
+        self.assertEqual([row['id'] for row in self.search(q='follow').data['results']], [later.pk])
+        list(rebuild)
+        self.assertEqual([row['id'] for row in self.search(q='follow').data['results']], [later.pk])
+        self.assertEqual(self.search(q='orphan').data['results'], [])
+
+# The validators themselves, not the response cache in front of them
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class ConditionalGetTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(
+            title='Project', description='', start_date=date.today(),
+            end_date=date.today(), user=self.user
+        )
+
+    def test_list_not_modified_until_a_write(self):
+        url = reverse('project-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A task write changes the embedded rollup, and so the validator
+        Task.objects.create(
+            title='Task', description='', due_date=date.today(),
+            project=self.project, assigned_to=self.user
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_expanded_relations_invalidate(self):
+        task = Task.objects.create(
+            title='Task', description='', due_date=date.today(), project=self.project, assigned_to=self.user
+        )
+        Comment.objects.create(task=task, user=self.user, content='Hello')
+        url = reverse('comment-list')
+        etag = self.client.get(url, {'expand': 'task.project'})['ETag']
+        self.assertEqual(self.client.get(url, {'expand': 'task.project'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        task.title = 'Renamed'
+        task.save()
+        response = self.client.get(url, {'expand': 'task.project'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['task']['title'], 'Renamed')
+
+        self.project.title = 'Renamed'
+        self.project.save()
+        response = self.client.get(url, {'expand': 'task.project'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_validators_follow_the_requested_shape(self):
+        view = views.CommentViewSet(request=Request(APIRequestFactory().get('/', {'expand': 'task'})), action='list')
+        self.assertEqual(view.get_validator_fields(), ['updated_at', 'task__updated_at'])
+        view = views.ProjectViewSet(request=Request(APIRequestFactory().get('/')), action='list')
+        self.assertEqual(view.get_validator_fields(), ['updated_at', 'rollup__updated_at'])
+
+    def test_detail_and_if_modified_since(self):
+        url = reverse('project-detail', args=[self.project.pk])
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_deletion_from_a_list_is_not_hidden_by_if_modified_since(self):
+        from django.utils.http import http_date
+
+        Project.objects.create(
+            title='Other', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+        url = reverse('project-list')
+        self.client.get(url)
+        self.project.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_team_membership_and_member_changes_invalidate(self):
+        team = Team.objects.create(name='Team', description='', created_by=self.user)
+        url = reverse('team-list')
+        etag = self.client.get(url)['ETag']
+        team.members.add(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # Members show in the preview
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        # The validator aggregate does not grow with the team
+        self.assertNotIn('JOIN', ctx.captured_queries[0]['sql'])
+
+class SparseFieldsetTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(
+            title='Project', description='', start_date=date.today(),
+            end_date=date.today(), user=self.user
+        )
+        for n in range(3):
+            Task.objects.create(
+                title=f'Task {n}', description='', due_date=date.today(),
+                project=self.project, assigned_to=self.user
+            )
+
+    def get_tasks(self, **params):
+        return self.client.get(reverse('task-list'), params).data['results'][0]
+
+    def test_relations_default_to_ids(self):
+        task = self.get_tasks()
+        self.assertEqual(task['project'], self.project.pk)
+        self.assertEqual(task['assigned_to'], self.user.pk)
+
+    def test_expand_nests_requested_relations(self):
+        task = self.get_tasks(expand='project.user,assigned_to')
+        self.assertEqual(task['project']['title'], 'Project')
+        self.assertEqual(task['project']['user']['email'], 'owner@example.com')
+        self.assertEqual(task['assigned_to']['first_name'], 'Owner')
+
+    def test_fields_trims_payload_and_nested_fields_imply_expansion(self):
+        self.assertEqual(set(self.get_tasks(fields='id,title,status')), {'id', 'title', 'status'})
+        task = self.get_tasks(fields='id,project.title')
+        self.assertEqual(task, {'id': task['id'], 'project': {'title': 'Project'}})
+
+    def test_queryset_follows_requested_shape(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('task-list'), {'fields': 'id,title', 'pagination': 'cursor'})
+        page_sql = ctx.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', page_sql)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('task-list'), {'expand': 'project.user', 'pagination': 'cursor'})
+        self.assertEqual(len(ctx), 2)
+        self.assertIn('my_projects_user', ctx.captured_queries[-1]['sql'])
+
+    def test_writes_ignore_shape_parameters(self):
+        response = self.client.post(reverse('task-list') + '?fields=id', {
+            'title': 'New', 'description': 'Details', 'due_date': date.today(), 'project_id': self.project.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['title'], 'New')
+
+class FastPathTest(OwnerTestCase):
+    """The values() read path must render exactly what the serializers render."""
+
+    def setUp(self):
+        super().setUp()
+        self.project = Project.objects.create(
+            title='Project', description='', start_date=date.today(),
+            end_date=date.today(), user=self.user
+        )
+        for n, status in enumerate(['todo', 'in_progress', 'completed']):
+            Task.objects.create(
+                title=f'Task {n}', description='Details', due_date=date.today() + timedelta(days=n),
+                status=status, project=self.project, assigned_to=self.user
+            )
+            Notification.objects.create(user=self.user, message=f'Message {n}', read=bool(n))
+
+    def assertParity(self, url_name, serializer_class, queryset, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        ids = [row['id'] for row in response.data['results']]
+        instances = sorted(queryset.filter(pk__in=ids), key=lambda obj: ids.index(obj.pk))
+        request = Request(APIRequestFactory().get('/', params))
+        expected = serializer_class(instances, many=True, context={'request': request}).data
+        self.assertEqual(json.loads(json.dumps(response.data['results'])), json.loads(json.dumps(expected)))
+
+    def test_list_parity(self):
+        from .serializers import TaskSerializer, NotificationSerializer
+
+        for params in ({}, {'fields': 'id,due_date,assigned_to'}, {'pagination': 'cursor'}):
+            with self.subTest(**params):
+                self.assertParity('task-list', TaskSerializer, Task.objects.all(), **params)
+                self.assertParity('notification-list', NotificationSerializer, Notification.objects.all(), **params)
+
+    def test_list_parity_in_local_time_zone(self):
+        from .serializers import NotificationSerializer
+
+        with self.settings(TIME_ZONE='Asia/Kolkata'):
+            self.assertParity('notification-list', NotificationSerializer, Notification.objects.all())
+
+    def test_retrieve_and_expand_fallback(self):
+        from .serializers import TaskSerializer
+
+        task = Task.objects.first()
+        response = self.client.get(reverse('task-detail', args=[task.pk]))
+        self.assertEqual(response.data, TaskSerializer(task).data)
+        self.assertEqual(self.client.get(reverse('task-detail', args=[0])).status_code, 404)
+
+        response = self.client.get(reverse('task-detail', args=[task.pk]), {'expand': 'project'})
+        self.assertEqual(response.data['project']['title'], 'Project')
+
+    def test_reads_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('task-list'), {'fields': 'id,title', 'pagination': 'cursor'})
+        page_sql = ctx.captured_queries[-1]['sql']
+        self.assertIn('"title"', page_sql)
+        self.assertNotIn('"description"', page_sql)
+
+    def test_cursor_links_follow_values_rows(self):
+        for _ in range(10):
+            Notification.objects.create(user=self.user, message='More')
+        first = self.client.get(reverse('notification-list'), {'pagination': 'cursor'}).data
+        second = self.client.get(first['next']).data
+        seen = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), Notification.objects.count())
+
+class ExportTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        other = create_user('other')
+        for owner in (self.user, other):
+            project = Project.objects.create(
+                title=f'{owner.username} project', description='Line one\nline "two"',
+                start_date=date.today(), end_date=date.today(), user=owner
+            )
+            for n in range(5):
+                task = Task.objects.create(
+                    title=f'Task {n}', description='', due_date=date.today(),
+                    project=project, assigned_to=owner
+                )
+                Comment.objects.create(task=task, user=owner, content=f'Comment {n}')
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(f'{name}-export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_is_scoped_to_user(self):
+        import csv
+
+        response, body = self.export('project')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('filename="projects.csv"', response['Content-Disposition'])
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'owner project')
+        self.assertEqual(rows[0]['description'], 'Line one\nline "two"')
+        self.assertNotIn('rollup', rows[0])
+
+        _, body = self.export('task', fields='id,title')
+        rows = list(csv.DictReader(StringIO(body)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(set(rows[0]), {'id', 'title'})
+
+    def test_ndjson_matches_api_shape(self):
+        response, body = self.export('comment', format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['content'] for row in rows], [f'Comment {n}' for n in range(5)])
+        detail = self.client.get(reverse('comment-detail', args=[rows[0]['id']])).data
+        self.assertEqual(rows[0], json.loads(json.dumps(detail)))
+
+        response = self.client.get(reverse('task-export'), HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 5)
+
+    async def test_streams_asynchronously_under_asgi(self):
+        response = await AsyncClient().get(
+            reverse('task-export'), {'format': 'ndjson'},
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        # A sync iterator would be read whole into memory before sending
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], [f'Task {n}' for n in range(5)])
+
+    def test_requires_authentication(self):
+        response = APIClient().get(reverse('task-export'))
+        self.assertEqual(response.status_code, 401)
+
+class TaskImportTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = create_user('other')
+        self.project = Project.objects.create(
+            title='Project', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+        self.foreign = Project.objects.create(
+            title='Foreign', description='', start_date=date.today(), end_date=date.today(), user=self.other
+        )
+
+    def test_csv_upload_updates_derived_data(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        rows = ['title,description,due_date,priority,status,project,assigned_to']
+        rows += [f'Imported {n},Row {n},2030-01-01,high,completed,{self.project.pk},' for n in range(25)]
+        rows.append(f'Overdue,,2000-01-01,,,{self.project.pk},{self.other.pk}')
+        upload = SimpleUploadedFile('tasks.csv', '\n'.join(rows).encode())
+        stats_cache().set('dashboard_stats:%d' % self.user.pk, {'stale': True})
+
+        response = self.client.post(reverse('task-import-tasks'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data, {'created': 26, 'errors': []})
+
+        rollup = ProjectRollup.objects.get(project=self.project)
+        self.assertEqual((rollup.completed_count, rollup.todo_count, rollup.overdue_count), (25, 1, 1))
+        self.assertEqual(Task.objects.get(title='Overdue').assigned_to, self.other)
+        self.assertEqual(Task.objects.get(title='Imported 3').assigned_to, self.user)
+        self.assertIsNone(stats_cache().get('dashboard_stats:%d' % self.user.pk))
+        results = self.client.get(reverse('search-list'), {'q': 'imported'}).data['results']
+        self.assertEqual(len(results), 10)
+
+    def test_invalid_rows_are_reported_and_roll_back(self):
+        records = [
+            {'title': 'Good', 'due_date': '2030-01-01', 'project_id': self.project.pk},
+            {'title': '', 'due_date': '2030-02-30', 'project_id': self.project.pk},
+            {'title': 'Theirs', 'due_date': '2030-01-01', 'project': self.foreign.pk, 'status': 'done'},
+            'not an object',
+        ]
+        response = self.client.post(reverse('task-import-tasks'), records, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+        errors = {error['row']: set(error['errors']) for error in response.data['errors']}
+        self.assertEqual(errors, {2: {'title', 'due_date'}, 3: {'project', 'status'}, 4: {'non_field_errors'}})
+        self.assertFalse(Task.objects.exists())
+
+        response = self.client.post(reverse('task-import-tasks') + '?partial=true', records, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(ProjectRollup.objects.get(project=self.project).todo_count, 1)
+
+    def test_undecodable_csv_is_rejected(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        rows = f'title,due_date,project\nCaf\xe9,2030-01-01,{self.project.pk}\n'
+        upload = SimpleUploadedFile('tasks.csv', rows.encode('latin-1'))
+        response = self.client.post(reverse('task-import-tasks'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'CSV files must be UTF-8 encoded'})
+        self.assertFalse(Task.objects.exists())
+
+    def test_assignees_are_notified(self):
+        records = [
+            {'title': f'Task {n}', 'due_date': '2030-01-01', 'project': self.project.pk, 'assigned_to': assignee}
+            for n, assignee in enumerate([self.other.pk, self.other.pk, self.user.pk])
+        ]
+        self.assertEqual(self.client.post(reverse('task-import-tasks'), records, format='json').status_code, 201)
+        payloads = list(Job.objects.filter(kind='notifications.fan_out').values_list('payload', flat=True))
+        self.assertEqual(payloads, [{'user_ids': [self.other.pk], 'message': 'You were assigned 2 tasks'}])
+
+    def test_management_command(self):
+        import tempfile
+
+        records = [
+            {'title': f'Task {n}', 'due_date': '2030-01-01', 'project': self.project.pk} for n in range(30)
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as file:
+            json.dump(records, file)
+            file.flush()
+            out = StringIO()
+            call_command('import_tasks', file.name, user=self.user.email, batch_size=7, stdout=out)
+        self.assertIn('Imported 30 tasks', out.getvalue())
+        self.assertEqual(ProjectRollup.objects.get(project=self.project).todo_count, 30)
+
+class CachedAuthenticationTest(OwnerTestCase):
+    authenticate_with_token = True
+
+    def setUp(self):
+        from .authentication import user_cache
+
+        self.user_cache = user_cache
+        user_cache.clear()
+        user_cache.reset_stats()
+        super().setUp()
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('user-profile'))
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'FROM "my_projects_user"' in q['sql']]
+
+    def test_user_is_loaded_once(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+        stats = self.user_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_save_and_deactivation_invalidate(self):
+        self.user_queries()
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('user-profile')).data['first_name'], 'Renamed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+
+    def test_shared_tier(self):
+        with self.settings(AUTH_USER_CACHE_ALIAS='default'):
+            self.user_queries()
+            self.user_cache.clear()
+            self.assertEqual(self.user_queries(), [])
+            self.assertEqual(self.user_cache.stats()['shared_hits'], 1)
+            self.user.save()
+            self.assertIsNone(cache.get(f'auth_user:{self.user.pk}'))
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get(reverse('user-auth-cache')).status_code, 403)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.user_cache.invalidate(self.user.pk)
+        response = self.client.get(reverse('user-auth-cache'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_rate', response.data)
+
+class TeamMembershipTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = User.objects.bulk_create(
+            User(
+                email=f'member{n}@example.com', username=f'member{n}',
+                first_name='Alice' if n % 4 == 0 else 'Bob', last_name=f'Member{n}'
+            )
+            for n in range(24)
+        )
+        self.big = Team.objects.create(name='Big', description='', created_by=self.user)
+        self.big.members.add(self.user, *self.users)
+        self.small = Team.objects.create(name='Small', description='', created_by=self.user)
+        self.small.members.add(self.users[0])
+
+    def test_list_carries_count_and_preview(self):
+        with CaptureQueriesContext(connection) as ctx:
+            teams = {team['name']: team for team in self.client.get(reverse('team-list')).data['results']}
+        # ETag, COUNT(*), page with member counts, preview prefetch
+        self.assertEqual(len(ctx), 4)
+        self.assertEqual(len(teams), 2)
+        self.assertEqual(teams['Big']['member_count'], 25)
+        self.assertEqual(len(teams['Big']['members_preview']), Team.MEMBERS_PREVIEW_SIZE)
+        self.assertEqual(
+            set(teams['Big']['members_preview'][0]),
+            {'id', 'email', 'first_name', 'last_name', 'profile_image', 'profile_image_variants'}
+        )
+        self.assertEqual(teams['Small']['member_count'], 1)
+        self.assertNotIn('members', teams['Big'])
+
+        team = self.client.get(reverse('team-detail', args=[self.big.pk]), {'expand': 'members'}).data
+        self.assertEqual(len(team['members']), 25)
+        team = self.client.get(reverse('team-detail', args=[self.big.pk]), {'fields': 'id,members'}).data
+        self.assertEqual(set(team), {'id', 'members'})
+
+    def test_members_are_paginated_and_searchable(self):
+        url = reverse('team-members', args=[self.big.pk])
+        page = self.client.get(url).data
+        self.assertEqual(page['count'], 25)
+        self.assertEqual(len(page['results']), 10)
+        page = self.client.get(url, {'search': 'alice'}).data
+        self.assertEqual(page['count'], 6)
+        self.assertTrue(all(user['first_name'] == 'Alice' for user in page['results']))
+
+        outsider = APIClient()
+        outsider.force_authenticate(create_user('outsider'))
+        self.assertEqual(outsider.get(url).status_code, 404)
+
+    def test_create_response_has_summary(self):
+        response = self.client.post(reverse('team-list'), {'name': 'New', 'description': 'Team'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['member_count'], response.data['members_preview']), (0, []))
+
+class ProfileImageTest(OwnerTestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root, PROFILE_IMAGE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        super().setUp()
+
+    def upload(self, name='avatar.png', size=(640, 480)):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('user-update-profile'),
+                {'profile_image': SimpleUploadedFile(name, buffer.getvalue(), 'image/png')},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        # The upload response predates processing
+        self.assertEqual(response.data['profile_image_variants'], {})
+        self.user.refresh_from_db()
+
+    def test_upload_generates_variants(self):
+        from django.core.files.storage import default_storage
+        from PIL import Image
+
+        self.upload()
+        variants = self.user.profile_image_variants
+        self.assertEqual(variants['source'], self.user.profile_image.name)
+        for name, size in (('small', 64), ('medium', 256)):
+            with default_storage.open(variants[name]) as file:
+                image = Image.open(file)
+                self.assertEqual((image.format, image.size), ('WEBP', (size, size)))
+
+        urls = self.client.get(reverse('user-profile')).data['profile_image_variants']
+        self.assertEqual(set(urls), {'small', 'medium'})
+        self.assertTrue(urls['small'].startswith('http://testserver/media/profile_images/variants/'))
+
+        old = variants['small']
+        self.upload('other.png', (100, 300))
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(self.user.profile_image_variants['small']))
+
+    def test_backfill_command(self):
+        self.upload()
+        User.objects.filter(pk=self.user.pk).update(profile_image_variants={})
+
+        out = StringIO()
+        call_command('process_profile_images', workers=1, stdout=out)
+        self.assertIn('Processed 1 profile images (0 failed)', out.getvalue())
+        self.user.refresh_from_db()
+        self.assertEqual(set(self.user.profile_image_variants), {'source', 'small', 'medium'})
+
+    def test_processing_invalidates_cached_responses(self):
+        from .images import process_profile_image
+
+        creator = create_user('creator')
+        team = Team.objects.create(name='Team', description='', created_by=creator)
+        team.members.add(self.user)
+        self.upload()
+        User.objects.filter(pk=self.user.pk).update(profile_image_variants={})
+
+        reads = []
+        for user, url in ((self.user, reverse('user-profile')), (creator, reverse('team-list') + '?expand=members')):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+            client.get(url)
+            reads.append((client, url))
+
+        process_profile_image(self.user.pk)
+        (owner, profile_url), (teams, teams_url) = reads
+        self.assertEqual(set(owner.get(profile_url).data['profile_image_variants']), {'small', 'medium'})
+        member = teams.get(teams_url).data['results'][0]['members'][0]
+        self.assertEqual(set(member['profile_image_variants']), {'small', 'medium'})
+
+        out = StringIO()
+        call_command('process_profile_images', workers=1, stdout=out)
+        self.assertIn('Processed 0 profile images', out.getvalue())
+
+class JobQueueTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.members = User.objects.bulk_create(
+            User(email=f'member{n}@example.com', username=f'member{n}', first_name='M', last_name=str(n))
+            for n in range(30)
+        )
+        self.project = Project.objects.create(
+            title='Project', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+
+    def test_activity_fans_out_in_batches(self):
+        from .jobs import run_once
+
+        team = Team.objects.create(name='Team', description='', created_by=self.user)
+        team.members.add(self.user, *self.members)
+        task = Task.objects.create(
+            title='Write docs', description='', due_date=date.today(),
+            project=self.project, assigned_to=self.members[0]
+        )
+        Comment.objects.create(task=task, user=self.members[0], content='Done')
+        self.assertEqual(Notification.objects.count(), 0)
+        self.assertEqual(Job.objects.filter(queue='notifications').count(), 3)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(run_once(['notifications'], 'test-worker'), (3, 0))
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "my_projects_notification"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertFalse(Job.objects.filter(queue='notifications').exists())
+
+        messages = set(Notification.objects.filter(user=self.members[0]).values_list('message', flat=True))
+        self.assertEqual(messages, {'You were added to the team "Team"', 'You were assigned to the task "Write docs"'})
+        self.assertEqual(Notification.objects.filter(user=self.user).get().message, 'New comment on the task "Write docs"')
+        self.assertEqual(Notification.objects.count(), 32)
+
+    def test_reassignment_notifies_the_new_assignee(self):
+        task = Task.objects.create(
+            title='Write docs', description='', due_date=date.today(),
+            project=self.project, assigned_to=self.members[0]
+        )
+        Job.objects.all().delete()
+        task.assigned_to = self.members[1]
+        task.save()
+        task.title = 'Write more docs'
+        task.save()
+        self.assertEqual(
+            list(Job.objects.filter(queue='notifications').values_list('payload', flat=True)),
+            [{'user_ids': [self.members[1].pk], 'message': 'You were assigned to the task "Write docs"'}]
+        )
+
+    def test_saving_without_the_loaded_assignee_does_not_notify(self):
+        task = Task.objects.create(
+            title='Write docs', description='', due_date=date.today(),
+            project=self.project, assigned_to=self.members[0]
+        )
+        Job.objects.all().delete()
+        partial = Task.objects.only('title').get(pk=task.pk)
+        partial.title = 'Write more docs'
+        partial.save()
+        self.assertFalse(Job.objects.filter(queue='notifications').exists())
+
+    def test_retries_with_backoff_then_fails(self):
+        from .jobs import _handlers, enqueue, handler, run_once
+
+        @handler('tests.flaky', max_attempts=2)
+        def flaky(payload):
+            raise RuntimeError('boom')
+
+        self.addCleanup(_handlers.pop, 'tests.flaky')
+        job = enqueue('tests.flaky', {'n': 1})
+        with self.assertLogs('my_projects.jobs', 'ERROR'):
+            self.assertEqual(run_once(['default'], 'test-worker'), (1, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('pending', 1, ''))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(run_once(['default'], 'test-worker'), (0, 0))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('my_projects.jobs', 'ERROR'):
+            run_once(['default'], 'test-worker')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_failed_batch_is_retried_one_job_at_a_time(self):
+        from .jobs import _handlers, enqueue_many, handler, run_once
+
+        handled = []
+
+        @handler('tests.batch', batch=True)
+        def batch(payloads):
+            if any(payload['n'] == 2 for payload in payloads):
+                raise ValueError('poison')
+            handled.extend(payload['n'] for payload in payloads)
+
+        self.addCleanup(_handlers.pop, 'tests.batch')
+        enqueue_many('tests.batch', [{'n': n} for n in range(4)])
+        with self.assertLogs('my_projects.jobs', 'ERROR'):
+            self.assertEqual(run_once(['default'], 'test-worker'), (4, 1))
+        self.assertEqual(handled, [0, 1, 3])
+        job = Job.objects.get(kind='tests.batch')
+        self.assertEqual((job.payload, job.status, job.attempts), ({'n': 2}, 'pending', 1))
+        self.assertIn('poison', job.last_error)
+
+    def test_claims_respect_concurrency_and_reclaim_stale_locks(self):
+        from .jobs import _handlers, claim, enqueue, handler
+
+        handler('tests.noop', queue='notifications')(lambda payload: None)
+        self.addCleanup(_handlers.pop, 'tests.noop')
+        first, second = enqueue('tests.noop'), enqueue('tests.noop')
+        with self.settings(JOB_QUEUES={'notifications': {'concurrency': 1}}):
+            self.assertEqual(claim('notifications', 'worker-a', 1), [first])
+            self.assertEqual(claim('notifications', 'worker-b', 10), [])
+            self.assertEqual(claim('notifications', 'worker-a', 10), [second])
+
+            Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+            reclaimed = claim('notifications', 'worker-b', 10)
+            self.assertEqual([job.attempts for job in reclaimed], [2, 2])
+
+    def test_run_jobs_command(self):
+        team = Team.objects.create(name='Team', description='', created_by=self.user)
+        team.members.add(*self.members[:3])
+        out = StringIO()
+        call_command('run_jobs', queues=['notifications'], once=True, stdout=out)
+        self.assertIn('Ran 1 jobs (0 failed)', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_run_jobs_needs_shared_backends(self):
+        from django.core.management.base import CommandError
+
+        for overrides in (
+            {'DASHBOARD_STATS_CACHE_ALIAS': 'default'},
+            {'NOTIFICATIONS_BROADCAST_BACKEND': 'my_projects.realtime.InProcessBroadcast'},
+        ):
+            with self.subTest(**overrides), self.settings(**overrides), self.assertRaises(CommandError):
+                call_command('run_jobs', once=True, stdout=StringIO())
+
+class NotificationRetentionTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        # Ten notifications, one day apart, newest first; the even ones are read
+        for n in range(10):
+            notification = Notification.objects.create(user=self.user, message=f'Message {n}', read=n % 2 == 0)
+            Notification.objects.filter(pk=notification.pk).update(timestamp=now - timedelta(days=n))
+
+    def policy(self, **overrides):
+        from .retention import retention_policy
+
+        return retention_policy(**{
+            'read_max_age_days': None, 'unread_max_age_days': None, 'max_per_user': None, 'archive': False,
+            **overrides,
+        })
+
+    def messages(self, model=Notification):
+        return sorted(int(m.split()[1]) for m in model.objects.values_list('message', flat=True))
+
+    def test_policies(self):
+        from .retention import purge
+
+        self.assertEqual(list(purge(self.policy(read_max_age_days=3, max_per_user=6), dry_run=True)), [5])
+        self.assertEqual(Notification.objects.count(), 10)
+
+        totals = list(purge(self.policy(read_max_age_days=3), batch_size=2))
+        self.assertEqual(totals, [2, 3])
+        self.assertEqual(self.messages(), [0, 1, 2, 3, 5, 7, 9])
+
+        list(purge(self.policy(max_per_user=4)))
+        self.assertEqual(self.messages(), [0, 1, 2, 3])
+
+    def test_archive_is_pageable(self):
+        from .retention import purge
+
+        stats_cache().set('dashboard_stats:%d' % self.user.pk, {'stale': True})
+        list(purge(self.policy(unread_max_age_days=4, archive=True)))
+        self.assertEqual(self.messages(ArchivedNotification), [5, 7, 9])
+        self.assertIsNone(stats_cache().get('dashboard_stats:%d' % self.user.pk))
+
+        live = self.client.get(reverse('notification-list')).data
+        self.assertEqual(live['count'], 7)
+        archived = self.client.get(reverse('notification-list'), {'archived': 'true', 'pagination': 'cursor'}).data
+        self.assertEqual([row['message'] for row in archived['results']], ['Message 5', 'Message 7', 'Message 9'])
+        row = archived['results'][0]
+        self.assertEqual(set(row), set(live['results'][0]))
+        self.assertEqual(row['created_at'], row['timestamp'])
+
+        detail = self.client.get(reverse('notification-detail', args=[row['id']]), {'archived': 'true'})
+        self.assertEqual(detail.data, row)
+        self.assertEqual(self.client.get(reverse('notification-detail', args=[row['id']])).status_code, 404)
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'purge_notifications', read_max_age_days=0, max_per_user=100, unread_max_age_days=100,
+            archive=True, pause=0, stdout=out
+        )
+        self.assertIn('Archived 5 notifications', out.getvalue())
+        self.assertEqual(self.messages(), [1, 3, 5, 7, 9])
+
+class MetricsTest(OwnerTestCase):
+    def setUp(self):
+        from .metrics import registry
+
+        self.registry = registry
+        self.registry.reset()
+        super().setUp()
+        project = Project.objects.create(
+            title='Project', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+        for n in range(3):
+            Task.objects.create(
+                title=f'Task {n}', description='', due_date=date.today(), project=project, assigned_to=self.user
+            )
+
+    def sample(self, body, name, route, method='GET', **labels):
+        label_text = ','.join([f'route="{route}"', f'method="{method}"'] + [f'{k}="{v}"' for k, v in labels.items()])
+        match = re.search(rf'^{name}\{{{re.escape(label_text)}\}} (\S+)$', body, re.M)
+        self.assertIsNotNone(match, f'{name}{{{label_text}}} not exported')
+        return float(match.group(1))
+
+    def test_records_per_route(self):
+        for _ in range(2):
+            response = self.client.get(reverse('task-list'))
+        self.client.get(reverse('task-export'), {'format': 'csv'}).getvalue()
+
+        with self.settings(METRICS_TOKEN='secret'):
+            metrics = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(metrics.status_code, 200)
+        self.assertTrue(metrics['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = metrics.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertEqual(self.sample(body, 'http_request_duration_seconds_count', 'task-list'), 2)
+        self.assertEqual(self.sample(body, 'http_request_duration_seconds_bucket', 'task-list', le='+Inf'), 2)
+        self.assertGreater(self.sample(body, 'http_request_queries_sum', 'task-list'), 0)
+        self.assertEqual(
+            self.sample(body, 'http_response_size_bytes_total', 'task-list'), 2 * len(response.content)
+        )
+        # Streamed exports are measured once the body has been sent
+        self.assertGreater(self.sample(body, 'http_response_size_bytes_total', 'task-export'), 0)
+        self.assertGreater(self.sample(body, 'http_request_queries_sum', 'task-export'), 0)
+
+    def test_token_only(self):
+        # A local reverse proxy makes every client look local
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 404)
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 404)
+            wrong = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer guess')
+            self.assertEqual(wrong.status_code, 404)
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_over_budget_is_logged(self):
+        with self.settings(METRICS_QUERY_BUDGET=0, METRICS_LATENCY_BUDGET=None):
+            with self.assertLogs('my_projects.metrics', 'WARNING') as logs:
+                self.client.get(reverse('task-list'))
+        self.assertIn('GET /api/tasks/ (task-list)', logs.output[0])
+        self.assertIn('FROM "my_projects_task"', logs.output[0])
+
+        with self.settings(METRICS_QUERY_BUDGET=1000, METRICS_LATENCY_BUDGET=None):
+            with self.assertNoLogs('my_projects.metrics', 'WARNING'):
+                self.client.get(reverse('task-list'))
+
+class SyntheticDataTest(TestCase):
+    def test_generate_and_benchmark(self):
+        import tempfile
+        from .search import search
+
+        out = StringIO()
+        call_command(
+            'generate_data', users=6, teams=2, team_size=3, projects_per_user=2, tasks=40, comments=30,
+            notifications=25, batch_size=7, seed=1, stdout=out
+        )
+        self.assertIn('6 users, 2 teams', out.getvalue())
+        self.assertEqual(Project.objects.count(), 12)
+        self.assertEqual(Task.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertEqual(Notification.objects.count(), 25)
+        self.assertTrue(all(1 <= team.members.count() <= 6 for team in Team.objects.all()))
+        # The side effects bulk_create skips were applied
+        self.assertEqual(ProjectRollup.objects.count(), 12)
+        self.assertEqual(sum(r.total_tasks for r in ProjectRollup.objects.all()), 40)
+        task = Task.objects.select_related('project').first()
+        self.assertIn(task.pk, [hit['id'] for hit in search(task.project.user, task.title.split()[0], ['task'], limit=100)])
+        self.assertTrue(self.client.login(username='user0@example.com', password='password'))
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'benchmark_endpoints', requests=3, warmup=0, route=['task-', 'dashboard'], output=output.name,
+                stdout=StringIO(), stderr=StringIO()
+            )
+            results = json.load(open(output.name))
+        self.assertEqual(set(results['routes']), {'task-list', 'task-export', 'task-detail', 'user-dashboard-stats'})
+        for result in results['routes'].values():
+            self.assertEqual(result['status'], [200])
+            self.assertEqual(result['requests'], 3)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertGreater(results['routes']['task-list']['queries'], 0)
+
+    def test_failure_keeps_written_batches(self):
+        from .synthetic import DatasetGenerator
+
+        class FailingGenerator(DatasetGenerator):
+            def create_comments(self):
+                raise RuntimeError('Disk full')
+
+        generator = FailingGenerator(
+            users=4, teams=1, team_size=2, projects_per_user=1, tasks=20, comments=10, notifications=10,
+            batch_size=3, seed=1
+        )
+        with self.assertRaises(RuntimeError):
+            generator.run()
+        self.assertEqual(Task.objects.count(), 20)
+        self.assertEqual(Comment.objects.count(), 0)
+        # The rollups of what was written are still brought up to date
+        self.assertEqual(sum(r.total_tasks for r in ProjectRollup.objects.all()), 20)
+
+    def test_tasks_need_projects(self):
+        from django.core.management.base import CommandError
+        from .synthetic import DatasetGenerator
+
+        with self.assertRaisesMessage(CommandError, 'Tasks need projects'):
+            call_command('generate_data', users=2, projects_per_user=0, stdout=StringIO())
+        counts = DatasetGenerator(
+            users=2, teams=0, team_size=0, projects_per_user=0, tasks=5, comments=5, notifications=0, seed=1
+        ).run()
+        self.assertEqual((counts['task'], counts['comment']), (0, 0))
+
+    def test_users_are_numbered_after_the_highest_existing(self):
+        from .synthetic import DatasetGenerator
+
+        for username in ('user3', 'username'):
+            create_user(username)
+        DatasetGenerator(
+            users=2, teams=0, team_size=0, projects_per_user=0, tasks=0, comments=0, notifications=0, seed=1
+        ).run()
+        self.assertEqual(
+            set(User.objects.values_list('username', flat=True)), {'user3', 'username', 'user4', 'user5'}
+        )
+
+class DatabaseRoutingTest(OwnerMixin, TransactionTestCase):
+    # Replica reads need committed rows, so no wrapping test transaction
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.project = Project.objects.create(
+            title='Project', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+
+    def test_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_router(self):
+        from .db import routing
+
+        self.assertEqual(Task.objects.all().db, 'default')
+        with routing('replica1') as state:
+            self.assertEqual(Task.objects.all().db, 'replica1')
+            with transaction.atomic():
+                self.assertEqual(Task.objects.all().db, 'default')
+            Task.objects.create(
+                title='Task', description='', due_date=date.today(), project=self.project, assigned_to=self.user
+            )
+            self.assertTrue(state.wrote)
+            # Read your own writes
+            self.assertEqual(Task.objects.all().db, 'default')
+
+    def test_reads_follow_writes(self):
+        with self.settings(DATABASE_REPLICAS=['replica1']):
+            with CaptureQueriesContext(connections['replica1']) as replica:
+                self.assertEqual(self.client.get(reverse('project-list')).status_code, 200)
+            self.assertGreater(len(replica), 0)
+
+            response = self.client.post(reverse('task-list'), {
+                'title': 'Task', 'description': 'Details', 'due_date': date.today(), 'project_id': self.project.pk,
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+
+            # The writer is pinned to the primary for a while
+            with CaptureQueriesContext(connections['replica1']) as replica:
+                self.assertEqual(len(self.client.get(reverse('task-list')).data['results']), 1)
+            self.assertEqual(len(replica), 0)
+
+    def test_benchmark_counts_replica_queries(self):
+        from .management.commands.benchmark_endpoints import InProcessDriver
+
+        driver = InProcessDriver(AccessToken.for_user(self.user))
+        with self.settings(DATABASE_REPLICAS=['replica1']):
+            with CaptureQueriesContext(connections['replica1']) as replica:
+                status, _, _, count = driver.request(reverse('project-list'))
+        self.assertEqual(status, 200)
+        self.assertGreater(len(replica), 0)
+        self.assertGreaterEqual(count, len(replica))
+
+
+class AsyncViewsTest(OwnerTestCase):
+    authenticate_with_token = True
+
+    def setUp(self):
+        stats_cache().clear()
+        super().setUp()
+        project = Project.objects.create(
+            title='Project', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+        Task.objects.create(
+            title='Task', description='', due_date=date.today(), project=project, assigned_to=self.user
+        )
+        for n in range(3):
+            Notification.objects.create(user=self.user, message=f'Message {n}', read=n == 0)
+
+    def test_same_responses_as_sync_views(self):
+        for name in ('user-dashboard-stats', 'notification-list', 'notification-unread-count'):
+            stats_cache().clear()
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            with self.settings(ASYNC_API_VIEWS=False):
+                stats_cache().clear()
+                expected = self.client.get(reverse(name))
+            self.assertEqual(response.json(), expected.json(), name)
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data, {'count': 2})
+
+    def test_unauthenticated(self):
+        response = APIClient().get(reverse('notification-list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+    def test_conditional_get(self):
+        response = self.client.get(reverse('notification-list'))
+        self.assertIn('ETag', response)
+        response = self.client.get(reverse('notification-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_requests_use_sync_views(self):
+        response = self.client.post(reverse('notification-unread-count'))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response.data['detail'].code, 'method_not_allowed')
+        response = self.client.get(reverse('notification-list'), {'expand': 'user'})
+        self.assertEqual(response.status_code, 200)
+        # A dotted field expands its relation, which only the sync view does
+        response = self.client.get(reverse('notification-list'), {'fields': 'id,user.email'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['user']['email'], 'owner@example.com')
+
+    def test_dashboard_queries_run_concurrently(self):
+        from .db import run_concurrently
+
+        async def gather():
+            return await run_concurrently((Task.objects.count,), (Notification.objects.count,))
+
+        # In a transaction (as here) they share its connection, and see its rows
+        self.assertEqual(async_to_sync(gather)(), [1, 3])
+
+
+class ActivityFeedTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.members = User.objects.bulk_create(
+            User(email=f'member{n}@example.com', username=f'member{n}', first_name='M', last_name=str(n))
+            for n in range(3)
+        )
+        self.project = Project.objects.create(
+            title='Project', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+
+    def run_jobs(self):
+        from .jobs import run_once
+
+        run_once(['activity'], 'test-worker')
+
+    def feed(self, user):
+        return list(ActivityEntry.objects.filter(user=user).order_by('-created_at', '-id').values_list(
+            'verb', 'target_type', 'summary'
+        ))
+
+    def test_fans_out_to_affected_users(self):
+        team = Team.objects.create(name='Team', description='', created_by=self.user)
+        team.members.add(*self.members)
+        task = Task.objects.create(
+            title='Write docs', description='', due_date=date.today(),
+            project=self.project, assigned_to=self.members[0]
+        )
+        Comment.objects.create(task=task, user=self.members[1], content='Looks good')
+        task.status = 'completed'
+        task.save()
+        self.assertFalse(ActivityEntry.objects.exists())
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_jobs()
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "my_projects_activityentry"')]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertEqual(self.feed(self.members[0]), [
+            ('completed', 'task', 'Write docs'),
+            ('commented', 'task', 'Write docs'),
+            ('created', 'task', 'Write docs'),
+            ('members_added', 'team', 'Team'),
+        ])
+        # Commenting on a task that is not theirs: only their own comment
+        self.assertEqual(self.feed(self.members[1]), [
+            ('commented', 'task', 'Write docs'), ('members_added', 'team', 'Team'),
+        ])
+        self.assertEqual(len(self.feed(self.user)), 6)
+
+    def test_cascades_are_one_entry(self):
+        for n in range(3):
+            Task.objects.create(
+                title=f'Task {n}', description='', due_date=date.today(),
+                project=self.project, assigned_to=self.members[n]
+            )
+        self.project.delete()
+        self.run_jobs()
+        self.assertEqual(self.feed(self.members[2])[0], ('deleted', 'project', 'Project'))
+        self.assertEqual(ActivityEntry.objects.filter(verb='deleted').count(), 4)
+
+    def test_bulk_writes_are_recorded(self):
+        response = self.client.post(reverse('task-import-tasks'), [
+            {'title': f'Imported {n}', 'due_date': '2030-01-01', 'project_id': self.project.pk,
+             'assigned_to': self.members[0].pk}
+            for n in range(2)
+        ], format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        ids = list(Task.objects.order_by('pk').values_list('pk', flat=True))
+        response = self.client.post(
+            reverse('task-bulk-update'), {'ids': ids, 'status': 'completed', 'assigned_to': self.members[1].pk},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.run_jobs()
+
+        self.assertEqual(sorted(self.feed(self.members[0])), [
+            ('completed', 'task', 'Imported 0'), ('completed', 'task', 'Imported 1'),
+            ('created', 'task', 'Imported 0'), ('created', 'task', 'Imported 1'),
+        ])
+        self.assertEqual(sorted(self.feed(self.members[1])), [
+            ('completed', 'task', 'Imported 0'), ('completed', 'task', 'Imported 1'),
+        ])
+        # And the project's creation
+        self.assertEqual(len(self.feed(self.user)), 5)
+
+    def test_cap_per_user(self):
+        with self.settings(ACTIVITY_FEED_MAX_PER_USER=5):
+            for n in range(8):
+                Task.objects.create(
+                    title=f'Task {n}', description='', due_date=date.today(),
+                    project=self.project, assigned_to=self.user
+                )
+            self.run_jobs()
+        self.assertEqual(
+            [summary for _, _, summary in self.feed(self.user)], [f'Task {n}' for n in range(7, 2, -1)]
+        )
+
+    def test_cursor_pagination(self):
+        ActivityEntry.objects.bulk_create(
+            ActivityEntry(user=self.user, verb='updated', target_type='task', target_id=n, summary=f'Task {n}')
+            for n in range(25)
+        )
+        ActivityEntry.objects.create(user=self.members[0], verb='updated', target_type='task', target_id=1, summary='')
+        url, seen = reverse('activity-list'), []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            seen.extend(row['target_id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, list(range(24, -1, -1)))
+        response = self.client.get(reverse('activity-list'), {'type': 'team'})
+        self.assertEqual(response.data['results'], [])
+
+
+class ResponseCacheTest(OwnerTestCase):
+    authenticate_with_token = True
+
+    def setUp(self):
+        from .response_cache import response_cache
+
+        self.response_cache = response_cache
+        self.response_cache.reset_stats()
+        super().setUp()
+        self.member = create_user('member')
+        self.project = Project.objects.create(
+            title='Project', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+        self.team = Team.objects.create(name='Team', description='', created_by=self.user)
+        self.team.members.add(self.user, self.member)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        for name in ('project-list', 'team-list', 'user-profile', 'notification-unread-count'):
+            with self.subTest(route=name):
+                first = self.client.get(reverse(name))
+                with self.assertNumQueries(0):
+                    second = self.client.get(reverse(name))
+                self.assertEqual(second.status_code, 200)
+                self.assertEqual(second.json(), first.json())
+        # Other query strings are other entries
+        self.assertEqual(len(self.client.get(reverse('project-list'), {'page': 1}).data['results']), 1)
+
+        stats = self.response_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stores']), (4, 5, 5))
+        self.assertEqual(stats['hit_rate'], 4 / 9)
+        self.assertGreater(stats['bytes'], 0)
+
+    def test_writes_the_user_can_see_invalidate(self):
+        self.client.get(reverse('project-list'))
+        Task.objects.create(
+            title='Task', description='', due_date=date.today(), project=self.project, assigned_to=self.member
+        )
+        rollup = self.client.get(reverse('project-list')).data['results'][0]['rollup']
+        self.assertEqual(rollup['todo_count'], 1)
+
+        self.client.get(reverse('notification-unread-count'))
+        Notification.objects.create(user=self.user, message='Hello')
+        self.assertEqual(self.client.get(reverse('notification-unread-count')).data, {'count': 1})
+
+        # A teammate's profile shows in the team list
+        self.client.get(reverse('team-list'), {'expand': 'members'})
+        self.member.first_name = 'Renamed'
+        self.member.save()
+        members = self.client.get(reverse('team-list'), {'expand': 'members'}).data['results'][0]['members']
+        self.assertIn('Renamed', [member['first_name'] for member in members])
+
+    def test_not_modified_from_cache(self):
+        etag = self.client.get(reverse('project-list'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('project-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_users_and_errors_are_kept_apart(self):
+        self.client.get(reverse('user-profile'))
+        other = APIClient()
+        other.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.member)}')
+        self.assertEqual(other.get(reverse('user-profile')).data['email'], 'member@example.com')
+        self.assertEqual(APIClient().get(reverse('user-profile')).status_code, 401)
+
+    def test_file_based_backend(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            caches = {
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+            }
+            with self.settings(CACHES=caches):
+                self.client.get(reverse('project-list'))
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(reverse('project-list')).status_code, 200)
+                stats = self.response_cache.stats()
+        # The data version and the response
+        self.assertEqual(stats['entries'], 2)
+        self.assertGreater(stats['bytes'], 0)
+
+    def test_off_on_a_process_local_cache(self):
+        caches = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'},
+        }
+        with self.settings(CACHES=caches):
+            self.assertFalse(self.response_cache.enabled)
+            self.client.get(reverse('project-list'))
+            self.client.get(reverse('project-list'))
+            stats = self.response_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['stores']), (0, 0, 0))
+
+    def test_bumps_from_other_processes_are_seen(self):
+        from django.core.cache.backends.filebased import FileBasedCache
+
+        self.client.get(reverse('project-list'))
+        # What run_jobs or another web worker holds: the same files, its own cache object
+        other = FileBasedCache(self.response_cache.cache._dir, {})
+        other.set(self.response_cache.version_key(self.user.pk), 'elsewhere', None)
+        self.client.get(reverse('project-list'))
+        self.assertEqual(self.response_cache.stats()['hits'], 0)
+
+
+class BatchTest(OwnerTestCase):
+    authenticate_with_token = True
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.project = Project.objects.create(
+            title='Project', description='', start_date=date.today(), end_date=date.today(), user=self.user
+        )
+        self.task = Task.objects.create(
+            title='Task', description='', due_date=date.today(), project=self.project, assigned_to=self.user
+        )
+        Notification.objects.create(user=self.user, message='Hello')
+
+    def batch(self, *requests, client=None):
+        return (client or self.client).post(reverse('batch'), {'requests': list(requests)}, format='json')
+
+    def test_dashboard_first_paint(self):
+        paths = [
+            '/api/users/profile/', '/api/users/dashboard_stats/', '/api/projects/', '/api/tasks/?page=1',
+            '/api/notifications/', '/api/notifications/unread_count/',
+        ]
+        response = self.batch(*({'path': path} for path in paths))
+        self.assertEqual(response.status_code, 200)
+        results = response.data['responses']
+        self.assertEqual([item['status'] for item in results], [200] * len(paths))
+        for path, item in zip(paths, results):
+            with self.subTest(path=path):
+                self.assertEqual(item['body'], self.client.get(path).json())
+
+    def test_writes_run_in_order(self):
+        response = self.batch(
+            {'method': 'PATCH', 'path': f'/api/tasks/{self.task.pk}/', 'body': {'status': 'completed'}},
+            {'path': f'/api/tasks/{self.task.pk}/'},
+            {'path': '/api/nowhere/'},
+            {'method': 'DELETE', 'path': f'/api/projects/{self.project.pk + 1}/'},
+        )
+        results = response.data['responses']
+        self.assertEqual([item['status'] for item in results], [200, 200, 404, 404])
+        self.assertEqual(results[1]['body']['status'], 'completed')
+
+    def test_authenticates_once(self):
+        from .authentication import user_cache
+
+        self.client.get(reverse('user-profile'))
+        user_cache.reset_stats()
+        self.batch({'path': '/api/users/profile/'}, {'path': '/api/projects/'}, {'path': '/api/teams/'})
+        self.assertEqual(user_cache.stats()['hits'], 1)
+
+        self.assertEqual(self.batch({'path': '/api/projects/'}, client=APIClient()).status_code, 401)
+
+    def test_rejected_requests(self):
+        self.assertEqual(self.client.get(reverse('batch')).status_code, 405)
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch(*({'path': '/api/projects/'} for _ in range(21))).status_code, 400)
+        results = self.batch(
+            {'path': '/api/batch/'}, {'path': '/admin/'}, {'path': '/api/tasks/export/?format=csv'}
+        ).data['responses']
+        self.assertEqual([item['status'] for item in results], [400, 404, 400])
@@ -1,6 +1,7 @@
-from django.urls import path, include
+from django.urls import URLPattern, path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, batch, views
+from .response_cache import cached
 
 router = DefaultRouter()
 router.register(r'auth', views.AuthViewSet, basename='auth')
@@ -10,7 +11,33 @@ router.register(r'tasks', views.TaskViewSet, basename='task')
 router.register(r'comments', views.CommentViewSet, basename='comment')
 router.register(r'teams', views.TeamViewSet, basename='team')
 router.register(r'notifications', views.NotificationViewSet, basename='notification')
+router.register(r'search', views.SearchViewSet, basename='search')
+router.register(r'activity', views.ActivityViewSet, basename='activity')
+
+
+def routed(name):
+    """The router's view for the URL ``name``."""
+    return next(pattern.callback for pattern in router.urls if getattr(pattern, 'name', None) == name)
+
+
+# Async GET handlers in front of the router's routes of the same name; they
+# hand everything else to those routes (see async_views.py)
+async_routes = [
+    ('users/dashboard_stats/', async_views.dashboard_stats, 'user-dashboard-stats'),
+    ('notifications/', async_views.notification_list, 'notification-list'),
+    ('notifications/unread_count/', async_views.unread_count, 'notification-unread-count'),
+]
+
+
+# Routes in RESPONSE_CACHE_ROUTES answer GETs from the response cache
+def with_response_cache(pattern):
+    if not isinstance(pattern, URLPattern):
+        return pattern
+    return URLPattern(pattern.pattern, cached(pattern.callback, pattern.name), pattern.default_args, pattern.name)
+
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('batch/', batch.batch, name='batch'),
+    *(path(route, cached(view(routed(name)), name), name=name) for route, view, name in async_routes),
+    path('', include([with_response_cache(pattern) for pattern in router.urls])),
 ]
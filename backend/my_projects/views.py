@@ -1,14 +1,37 @@
-from rest_framework import viewsets, status, permissions
+import logging
+
+from rest_framework import mixins, viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import Count, Q
-from .models import Project, Task, Comment, Team, Notification
+from django.utils import timezone
+from .models import Project, Task, Comment, Team, Notification, ArchivedNotification, ActivityEntry
 from .serializers import (
     UserSerializer, UserCreateSerializer, ProjectSerializer,
-    TaskSerializer, CommentSerializer, TeamSerializer, NotificationSerializer
+    TaskSerializer, CommentSerializer, TeamSerializer, NotificationSerializer, ArchivedNotificationSerializer,
+    ActivityEntrySerializer, NotificationBulkReadSerializer, TaskBulkUpdateSerializer, TeamMembersSerializer,
+    requested_shape, with_requested_relations
 )
+from . import activity, search
+from .authentication import user_cache
+from .conditional import ConditionalGetMixin
+from .db import ReplicaReadMixin
+from .export import ExportMixin
+from .fastpath import FastReadMixin
+from .imports import ImportFormatError, TaskImport, detect_format, read_records
+from .pagination import KeysetPagination
+from .notifications import notify
+from .realtime import publish_unread_count
+from .response_cache import response_cache
+from .rollups import rebuild_rollups, refresh_stale_rollups
+from .stats import get_dashboard_stats, invalidate_dashboard_stats
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
@@ -53,7 +76,7 @@ class AuthViewSet(viewsets.ViewSet):
             status=status.HTTP_401_UNAUTHORIZED
         )
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -73,122 +96,182 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def auth_cache(self, request):
+        """Counters of this process's authenticated-user cache."""
+        return Response(user_cache.stats())
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def response_cache(self, request):
+        """Counters of this process's response cache, and what the cache holds."""
+        return Response(response_cache.stats())
+
     @action(detail=False, methods=['get'])
     def dashboard_stats(self, request):
         try:
-            print("Fetching dashboard stats for user:", request.user.id)
-            
-            # Get total projects
-            total_projects = Project.objects.filter(user=request.user).count()
-            print("Total projects:", total_projects)
-            
-            # Get total tasks
-            total_tasks = Task.objects.filter(
-                Q(project__user=request.user) | 
-                Q(assigned_to=request.user)
-            ).count()
-            print("Total tasks:", total_tasks)
-            
-            # Get pending tasks
-            pending_tasks = Task.objects.filter(
-                Q(project__user=request.user) | 
-                Q(assigned_to=request.user),
-                status__in=['not_started', 'in_progress']
-            ).count()
-            print("Pending tasks:", pending_tasks)
-            
-            # Get team members count
-            total_team_members = Team.objects.filter(
-                Q(created_by=request.user) | 
-                Q(members=request.user)
-            ).values('members').distinct().count()
-            print("Total team members:", total_team_members)
-            
-            # Get recent activities (notifications)
-            recent_activities = Notification.objects.filter(
-                user=request.user
-            ).order_by('-timestamp')[:5]
-            print("Recent activities count:", recent_activities.count())
-            
-            response_data = {
-                'total_projects': total_projects,
-                'total_tasks': total_tasks,
-                'total_team_members': total_team_members,
-                'pending_tasks': pending_tasks,
-                'recent_activities': NotificationSerializer(recent_activities, many=True).data
-            }
-            print("Response data:", response_data)
-            
-            return Response(response_data)
+            return Response(get_dashboard_stats(request.user))
         except Exception as e:
-            print("Error in dashboard_stats:", str(e))
-            import traceback
-            print("Traceback:", traceback.format_exc())
+            logger.exception("Error in dashboard_stats for user %s", request.user.id)
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(ReplicaReadMixin, ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         try:
-            return Project.objects.filter(user=self.request.user)
+            return with_requested_relations(
+                Project.objects.filter(user=self.request.user).order_by('-created_at', '-id'),
+                ProjectSerializer, self.request
+            )
         except Exception as e:
             return Project.objects.none()
 
+    def get_object(self):
+        project = super().get_object()
+        refresh_stale_rollups([project])
+        return project
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            refresh_stale_rollups(page)
+        return page
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-    def list(self, request, *args, **kwargs):
-        try:
-            queryset = self.get_queryset()
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
-        except Exception as e:
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ReplicaReadMixin, ConditionalGetMixin, FastReadMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Task.objects.filter(
-            Q(project__user=self.request.user) | 
-            Q(assigned_to=self.request.user)
+        return with_requested_relations(
+            Task.objects.visible_to(self.request.user), TaskSerializer, self.request
         )
 
     def perform_create(self, serializer):
         serializer.save(assigned_to=self.request.user)
 
-class CommentViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def bulk_update(self, request):
+        serializer = TaskBulkUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = dict(serializer.validated_data)
+        ids = changes.pop('ids')
+
+        with transaction.atomic():
+            tasks = self.get_queryset().filter(pk__in=ids)
+            affected = list(tasks.values_list(
+                'pk', 'project_id', 'project__user_id', 'assigned_to_id', 'title', 'status'
+            ))
+            updated = Task.objects.filter(pk__in=[row[0] for row in affected]).update(
+                updated_at=timezone.now(), **changes
+            )
+            # QuerySet.update() bypasses the Task signal handlers
+            if 'status' in changes:
+                rebuild_rollups({row[1] for row in affected})
+            if 'assigned_to' in changes:
+                # The search audience names the assignee
+                search.index_objects('task', Task.objects.filter(pk__in=[row[0] for row in affected]))
+            invalidate_dashboard_stats(
+                *(row[2] for row in affected), *(row[3] for row in affected),
+                getattr(changes.get('assigned_to'), 'pk', None)
+            )
+            assignee = changes.get('assigned_to')
+            # Recorded as the Task signal handlers would, one event per task
+            events = []
+            for pk, _, owner_id, assigned_to_id, title, old_status in affected:
+                old = {'status': old_status, 'assigned_to_id': assigned_to_id}
+                new = {
+                    'status': changes.get('status', old_status),
+                    'assigned_to_id': getattr(assignee, 'pk', assigned_to_id),
+                }
+                events.append(activity.event(
+                    activity.task_verb(old, new), 'task', pk, title, [owner_id, assigned_to_id, new['assigned_to_id']]
+                ))
+            activity.record_many(events)
+            if assignee is not None and assignee != request.user:
+                reassigned = sum(1 for row in affected if row[3] != assignee.pk)
+                if reassigned:
+                    notify([assignee.pk], f'You were assigned {reassigned} task{"s" if reassigned > 1 else ""}')
+        return Response({'updated': updated})
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_tasks(self, request):
+        """
+        Create tasks from an uploaded ``file`` (.csv or .json) or a JSON list
+        body. ``?partial=true`` keeps the valid rows when some are rejected.
+        """
+        upload = request.FILES.get('file')
+        partial = request.query_params.get('partial', '').lower() in ('1', 'true', 'yes')
+        try:
+            if upload is not None:
+                records = read_records(upload, detect_format(upload.name))
+            elif isinstance(request.data, list):
+                records = request.data
+            else:
+                raise ImportFormatError('Upload a CSV or JSON file as "file" or post a JSON list')
+            # CSV rows are decoded as the import reads them
+            result = TaskImport(request.user, partial=partial).run(records)
+        except ImportFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {'created': result.created, 'errors': result.errors},
+            status=status.HTTP_400_BAD_REQUEST if result.errors and not partial else status.HTTP_201_CREATED
+        )
+
+class CommentViewSet(ReplicaReadMixin, ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Comment.objects.filter(task__project__user=self.request.user)
+        return with_requested_relations(
+            Comment.objects.filter(task__project__user=self.request.user), CommentSerializer, self.request
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = TeamSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Team.objects.filter(
-            Q(members=self.request.user) | 
-            Q(created_by=self.request.user)
+        queryset = with_requested_relations(
+            Team.objects.visible_to(self.request.user).order_by('-created_at', '-id'),
+            TeamSerializer, self.request
         )
+        if self.action in ('list', 'retrieve'):
+            fields, _ = requested_shape(self.request)
+            if TeamSerializer.renders('member_count', fields):
+                queryset = queryset.with_member_count()
+            if TeamSerializer.renders('members_preview', fields):
+                queryset = queryset.with_members_preview()
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
+    @action(detail=True, methods=['get'])
+    def members(self, request, pk=None):
+        """The team's members, paginated; ``?search=`` matches name, email or username."""
+        team = self.get_object()
+        users = User.objects.filter(teams=team).order_by('first_name', 'last_name', 'id')
+        term = request.query_params.get('search', '').strip()
+        if term:
+            users = users.filter(
+                Q(first_name__icontains=term) | Q(last_name__icontains=term) |
+                Q(email__icontains=term) | Q(username__icontains=term)
+            )
+        page = self.paginate_queryset(users)
+        serializer = UserSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post'])
     def add_member(self, request, pk=None):
         team = self.get_object()
@@ -203,21 +286,131 @@ class TeamViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class NotificationViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'])
+    def add_members(self, request, pk=None):
+        team = self.get_object()
+        serializer = TeamMembersSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids = set(serializer.validated_data['user_ids'])
+
+        with transaction.atomic():
+            found = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+            existing = set(team.members.filter(pk__in=found).values_list('pk', flat=True))
+            added = found - existing
+            # One multi-row INSERT into the membership table
+            team.members.add(*added)
+        return Response({'added': len(added), 'not_found': sorted(user_ids - found)})
+
+    @action(detail=True, methods=['post'])
+    def remove_members(self, request, pk=None):
+        team = self.get_object()
+        serializer = TeamMembersSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            removed = list(team.members.filter(
+                pk__in=serializer.validated_data['user_ids']
+            ).values_list('pk', flat=True))
+            # One DELETE ... WHERE user_id IN (...)
+            team.members.remove(*removed)
+        return Response({'removed': len(removed)})
+
+class NotificationViewSet(ReplicaReadMixin, ConditionalGetMixin, FastReadMixin, viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering_field = 'timestamp'
+
+    def archived(self):
+        # ?archived=true reads the rows moved out by the retention purge
+        return (
+            self.action in ('list', 'retrieve') and
+            self.request.query_params.get('archived', '').lower() in ('1', 'true', 'yes')
+        )
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user)
+        if self.archived():
+            return with_requested_relations(
+                ArchivedNotification.objects.filter(user=self.request.user),
+                ArchivedNotificationSerializer, self.request
+            )
+        return with_requested_relations(
+            Notification.objects.filter(user=self.request.user), NotificationSerializer, self.request
+        )
+
+    def get_serializer_class(self):
+        return ArchivedNotificationSerializer if self.archived() else NotificationSerializer
 
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         notification = self.get_object()
         notification.read = True
-        notification.save()
+        notification.save(update_fields=['read', 'updated_at'])
         return Response({'status': 'marked as read'})
 
+    @action(detail=False, methods=['post'])
+    def mark_all_read(self, request):
+        serializer = NotificationBulkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        notifications = Notification.objects.filter(user=request.user, read=False)
+        if 'ids' in serializer.validated_data:
+            notifications = notifications.filter(pk__in=serializer.validated_data['ids'])
+        with transaction.atomic():
+            updated = notifications.update(read=True, updated_at=timezone.now())
+            invalidate_dashboard_stats(request.user.pk)
+            transaction.on_commit(lambda: publish_unread_count(request.user.pk))
+        return Response({'updated': updated})
+
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         count = self.get_queryset().filter(read=False).count()
         return Response({'count': count})
+
+class ActivityViewSet(ReplicaReadMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """The user's activity feed, newest first; ``?type=`` keeps one target type."""
+    serializer_class = ActivityEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering_field = 'created_at'
+
+    def get_queryset(self):
+        queryset = ActivityEntry.objects.filter(user=self.request.user)
+        target_type = self.request.query_params.get('type')
+        if target_type:
+            queryset = queryset.filter(target_type=target_type)
+        return queryset
+
+class SearchViewSet(ReplicaReadMixin, viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'The q parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+        if any(kind not in search.KINDS for kind in kinds):
+            return Response(
+                {'error': f"type must be one of: {', '.join(search.KINDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        page_size = api_settings.PAGE_SIZE
+        results = search.search(request.user, query, kinds, limit=page_size, offset=(page - 1) * page_size)
+        url = request.build_absolute_uri()
+        previous = None
+        if page == 2:
+            previous = remove_query_param(url, 'page')
+        elif page > 2:
+            previous = replace_query_param(url, 'page', page - 1)
+        return Response({
+            'next': replace_query_param(url, 'page', page + 1) if len(results) > page_size else None,
+            'previous': previous,
+            'results': results[:page_size],
+        })
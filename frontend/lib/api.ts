@@ -242,6 +242,7 @@ export const deleteProject = async (id: number): Promise<void> => {
 export const getTasks = async (params?: { limit?: number }): Promise<PaginatedResponse<Task>> => {
   const queryParams = new URLSearchParams()
   if (params?.limit) queryParams.append('limit', params.limit.toString())
+  queryParams.append('expand', 'project,assigned_to')
 
   try {
     const response = await fetch(`${API_URL}/api/tasks/?${queryParams}`, {
@@ -295,7 +296,7 @@ export const getTasks = async (params?: { limit?: number }): Promise<PaginatedRe
 }
 
 export const getTask = async (id: number): Promise<Task> => {
-  const response = await fetch(`${API_URL}/api/tasks/${id}/`, {
+  const response = await fetch(`${API_URL}/api/tasks/${id}/?expand=project,assigned_to`, {
     headers: getAuthHeaders(),
   })
 
@@ -421,6 +422,23 @@ export const getTeam = async (id: number): Promise<Team> => {
   return response.json()
 }
 
+export const getTeamMembers = async (
+  id: number,
+  { page = 1, search = '' }: { page?: number; search?: string } = {}
+): Promise<PaginatedResponse<User>> => {
+  const params = new URLSearchParams({ page: String(page) })
+  if (search) params.set('search', search)
+  const response = await fetch(`${API_URL}/api/teams/${id}/members/?${params}`, {
+    headers: getAuthHeaders(),
+  })
+
+  if (!response.ok) {
+    throw new Error('Failed to fetch team members')
+  }
+
+  return response.json()
+}
+
 export async function createTeam(team: {
   name: string
   description: string
@@ -4,6 +4,7 @@ export interface User {
   first_name: string
   last_name: string
   profile_image?: string
+  profile_image_variants?: { small?: string; medium?: string }
   phone?: string
   location?: string
   bio?: string
@@ -55,7 +56,8 @@ export interface Team {
   id: number
   name: string
   description: string
-  members: User[]
+  member_count: number
+  members_preview: Pick<User, 'id' | 'email' | 'first_name' | 'last_name' | 'profile_image' | 'profile_image_variants'>[]
   created_at: string
   updated_at: string
 }